@@ -1,10 +1,11 @@
 # File path: batch_brightness_extractor_rectangle.py
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
 import os
-import openpyxl
-from openpyxl.utils import get_column_letter
+import threading
+import multiprocessing
+from brightness_extraction import list_image_files, extract_rectangle_to_excel, extract_rectangle_to_cube, watch_rectangle_to_cube
+from run_metrics import RunRecorder, tk_status_callback
 
 def select_folder():
     folder_path = filedialog.askdirectory()
@@ -18,102 +19,165 @@ def extract_brightness_rectangle():
         y_coord = int(y_entry.get().strip())
         rect_width = int(width_entry.get().strip())
         rect_height = int(height_entry.get().strip())
+        workers = int(workers_entry.get().strip())
+        chunksize = int(chunksize_entry.get().strip())
+    except ValueError:
+        messagebox.showerror("Error", "座標、矩形のサイズ、ワーカー数およびチャンクサイズには有効な数値を入力してください。")
+        return
+
+    try:
         folder_path_val = image_folder_path.get()
 
         if not os.path.exists(folder_path_val):
             messagebox.showerror("Error", "選択されたフォルダが存在しません。")
             return
 
-        image_files = [f for f in os.listdir(folder_path_val) if f.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".tiff"))]
-        if not image_files:
+        if not list_image_files(folder_path_val):
             messagebox.showerror("Error", "選択されたフォルダに画像ファイルが見つかりません。")
             return
 
         save_path = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel Files", "*.xlsx")],
+            filetypes=[("Excel Files", "*.xlsx"), ("Brightness Cube (memory-mapped)", "*.npy")],
         )
         if not save_path:
             return
 
-        workbook = openpyxl.Workbook()
-        workbook.remove(workbook.active)  # デフォルトのシートを削除
-
-        for image_file in image_files:
-            image_path = os.path.join(folder_path_val, image_file)
-            img = Image.open(image_path).convert("L")  # グレースケールに変換
-            width, height = img.size
-
-            # 入力範囲が画像サイズを超えていないかチェック
-            if not (0 <= x_coord < width and 0 <= y_coord < height):
-                messagebox.showwarning("Warning", f"{image_file}をスキップ: 指定された座標が画像範囲外です。")
-                continue
-            if x_coord + rect_width > width or y_coord + rect_height > height:
-                messagebox.showwarning("Warning", f"{image_file}をスキップ: 矩形範囲が画像の範囲外です。")
-                continue
-
-            # 輝度値を切り出してExcelに保存
-            sheet = workbook.create_sheet(title=os.path.splitext(image_file)[0])
-            header = ["y\\x"]
-            for i in range(rect_width):
-                header.append(x_coord + i)  # ヘッダーは数値だけ
-            sheet.append(header)
-
-            for j in range(rect_height):
-                row = [y_coord + j]
-                for i in range(rect_width):
-                    brightness = img.getpixel((x_coord + i, y_coord + j))
-                    row.append(brightness)
-                sheet.append(row)
-
-            # 列幅の自動調整
-            for col_num, _ in enumerate(sheet.iter_cols(), 1):
-                column_width = max(len(str(cell.value)) for cell in sheet[get_column_letter(col_num)])
-                sheet.column_dimensions[get_column_letter(col_num)].width = column_width + 2
-
-        workbook.save(save_path)
+        # 拡張子が .npy の場合は輝度キューブ形式で保存
+        extract = extract_rectangle_to_cube if save_path.lower().endswith(".npy") else extract_rectangle_to_excel
+        params = {"folder": folder_path_val, "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height, "workers": workers, "chunksize": chunksize}
+        with RunRecorder("rectangle_extraction", save_path, params, on_update=tk_status_callback(root, run_status.set), profile=profile_var.get()):
+            skipped = extract(folder_path_val, x_coord, y_coord, rect_width, rect_height, save_path, workers, chunksize, incremental_var.get())
+        for image_file, reason in skipped:
+            messagebox.showwarning("Warning", f"{image_file}をスキップ: {reason}")
+
         messagebox.showinfo("Success", f"輝度値が{save_path}に保存されました")
 
-    except ValueError:
-        messagebox.showerror("Error", "座標および矩形のサイズには有効な数値を入力してください。")
+    except ValueError as e:
+        # 抽出処理からのエラー（すべての画像がスキップされた場合など）
+        messagebox.showerror("Error", str(e))
     except Exception as e:
         messagebox.showerror("Error", f"予期しないエラーが発生しました: {e}")
 
-# GUI Setup
-root = tk.Tk()
-root.title("Rectangle Brightness Extractor")
-
-image_folder_path = tk.StringVar()
-
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack(fill="both", expand=True)
-
-# フォルダ選択
-tk.Label(frame, text="Select Folder:").grid(row=0, column=0, sticky="e", pady=5)
-tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
-tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
-
-# X座標入力
-tk.Label(frame, text="X-Coordinate:").grid(row=1, column=0, sticky="e", pady=5)
-x_entry = tk.Entry(frame, width=30)
-x_entry.grid(row=1, column=1, padx=5, pady=5)
-
-# Y座標入力
-tk.Label(frame, text="Y-Coordinate:").grid(row=2, column=0, sticky="e", pady=5)
-y_entry = tk.Entry(frame, width=30)
-y_entry.grid(row=2, column=1, padx=5, pady=5)
+watch_stop_event = None
 
-# 幅入力
-tk.Label(frame, text="Rectangle Width:").grid(row=3, column=0, sticky="e", pady=5)
-width_entry = tk.Entry(frame, width=30)
-width_entry.grid(row=3, column=1, padx=5, pady=5)
-
-# 高さ入力
-tk.Label(frame, text="Rectangle Height:").grid(row=4, column=0, sticky="e", pady=5)
-height_entry = tk.Entry(frame, width=30)
-height_entry.grid(row=4, column=1, padx=5, pady=5)
-
-# 抽出と保存ボタン
-tk.Button(frame, text="Extract Brightness", command=extract_brightness_rectangle).grid(row=5, column=0, columnspan=3, pady=10)
-
-root.mainloop()
+def start_watch():
+    """撮影中のフォルダを監視し、新しいフレームの矩形領域を輝度キューブに追記し続ける"""
+    global watch_stop_event
+    if watch_stop_event and not watch_stop_event.is_set():
+        messagebox.showwarning("Warning", "すでにフォルダを監視しています。")
+        return
+    try:
+        x_coord = int(x_entry.get().strip())
+        y_coord = int(y_entry.get().strip())
+        rect_width = int(width_entry.get().strip())
+        rect_height = int(height_entry.get().strip())
+    except ValueError:
+        messagebox.showerror("Error", "座標および矩形のサイズには有効な数値を入力してください。")
+        return
+    folder_path_val = image_folder_path.get()
+    if not os.path.exists(folder_path_val):
+        messagebox.showerror("Error", "選択されたフォルダが存在しません。")
+        return
+
+    # 監視中はフレームごとに追記できる輝度キューブ形式で保存する
+    save_path = filedialog.asksaveasfilename(
+        defaultextension=".npy",
+        filetypes=[("Brightness Cube (memory-mapped)", "*.npy")],
+    )
+    if not save_path:
+        return
+
+    watch_stop_event = threading.Event()
+    processed = [0]
+
+    def on_frame(image_file, reason):
+        processed[0] += 1
+        message = f"Watching: {processed[0]} frames ({image_file}" + (f" skipped: {reason})" if reason else ")")
+        root.after(0, watch_status.set, message)
+
+    def run(stop_event):
+        try:
+            watch_rectangle_to_cube(folder_path_val, x_coord, y_coord, rect_width, rect_height, save_path, stop_event, on_frame=on_frame)
+        except Exception as e:
+            stop_event.set()
+            root.after(0, messagebox.showerror, "Error", f"監視中にエラーが発生しました: {e}")
+        root.after(0, watch_status.set, f"Watch stopped: {processed[0]} frames added to {save_path}")
+
+    threading.Thread(target=run, args=(watch_stop_event,), daemon=True).start()
+    watch_status.set("Watching...")
+
+def stop_watch():
+    if watch_stop_event:
+        watch_stop_event.set()
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Rectangle Brightness Extractor")
+
+    image_folder_path = tk.StringVar()
+
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack(fill="both", expand=True)
+
+    # フォルダ選択
+    tk.Label(frame, text="Select Folder:").grid(row=0, column=0, sticky="e", pady=5)
+    tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
+    tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
+
+    # X座標入力
+    tk.Label(frame, text="X-Coordinate:").grid(row=1, column=0, sticky="e", pady=5)
+    x_entry = tk.Entry(frame, width=30)
+    x_entry.grid(row=1, column=1, padx=5, pady=5)
+
+    # Y座標入力
+    tk.Label(frame, text="Y-Coordinate:").grid(row=2, column=0, sticky="e", pady=5)
+    y_entry = tk.Entry(frame, width=30)
+    y_entry.grid(row=2, column=1, padx=5, pady=5)
+
+    # 幅入力
+    tk.Label(frame, text="Rectangle Width:").grid(row=3, column=0, sticky="e", pady=5)
+    width_entry = tk.Entry(frame, width=30)
+    width_entry.grid(row=3, column=1, padx=5, pady=5)
+
+    # 高さ入力
+    tk.Label(frame, text="Rectangle Height:").grid(row=4, column=0, sticky="e", pady=5)
+    height_entry = tk.Entry(frame, width=30)
+    height_entry.grid(row=4, column=1, padx=5, pady=5)
+
+    # 並列処理のワーカー数とチャンクサイズ
+    tk.Label(frame, text="Workers:").grid(row=5, column=0, sticky="e", pady=5)
+    workers_entry = tk.Entry(frame, width=30)
+    workers_entry.insert(0, str(os.cpu_count() or 1))
+    workers_entry.grid(row=5, column=1, padx=5, pady=5)
+
+    tk.Label(frame, text="Chunk Size:").grid(row=6, column=0, sticky="e", pady=5)
+    chunksize_entry = tk.Entry(frame, width=30)
+    chunksize_entry.insert(0, "4")
+    chunksize_entry.grid(row=6, column=1, padx=5, pady=5)
+
+    # 増分処理（新規・変更された画像だけを処理して既存の出力に統合）
+    incremental_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(frame, text="Only process new or changed frames (resume)", variable=incremental_var).grid(row=7, column=0, columnspan=3, pady=5)
+
+    # 処理のプロファイル（出力の隣に .prof を保存）
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame, text="Profile run (save .prof next to output)", variable=profile_var).grid(row=8, column=0, columnspan=3, pady=5)
+
+    # 抽出と保存ボタン
+    tk.Button(frame, text="Extract Brightness", command=extract_brightness_rectangle).grid(row=9, column=0, columnspan=3, pady=10)
+
+    # 処理の段階ごとの時間とメモリ
+    run_status = tk.StringVar(value="")
+    tk.Label(frame, textvariable=run_status).grid(row=10, column=0, columnspan=3, pady=5)
+
+    # 撮影中のフォルダの監視
+    tk.Button(frame, text="Start Watch", command=start_watch).grid(row=11, column=0, pady=5)
+    tk.Button(frame, text="Stop Watch", command=stop_watch).grid(row=11, column=1, pady=5)
+    watch_status = tk.StringVar(value="Watch: idle")
+    tk.Label(frame, textvariable=watch_status).grid(row=12, column=0, columnspan=3, pady=5)
+
+    root.mainloop()
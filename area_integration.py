@@ -0,0 +1,319 @@
+# ファイル名: area_integration.py
+"""
+輝度値の格子の2次元台形積分をまとめて計算するエンジン。
+
+np.trapz は (x[i+1] - x[i]) / 2 を重みとした加重和なので、X方向とY方向の重みの外積を一度だけ作れば、
+同じ座標のシートは (シート数, 高さ×幅) の行列と重み行列の積1回で積分値と正の領域の面積が求まります。
+重み行列には格子全体の列に加えて部分矩形ごとの列を持たせ、部分矩形の積分も同じ積で計算します。
+
+格子全体の結果は従来の np.trapz による計算と一致させています。np.trapz に真偽値の配列を渡すと隣り合う値の和が
+論理和になるため、格子全体の平均輝度値に使う正の領域の面積は「X方向の隣り合う2点のどちらかが正である区間」の
+面積の半分として数えます（すべての値が正なら実際の面積の半分になり、平均輝度値は2倍になります）。
+従来の値と比べる必要のない部分矩形では、正の格子点の指示関数を同じ台形法で積分した実際の面積で割ります。
+
+Excelファイルの読み込みと結果の書き出しに使う openpyxl と pandas は、必要になったときに読み込みます。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from brightness_cube import load_cube
+import run_metrics
+
+BATCH_BYTES = 64 * 1024 * 1024
+
+
+def trapezoid_weights(coords):
+    """np.trapz(values, x=coords) == values @ trapezoid_weights(coords) となる重みを返す"""
+    coords = np.asarray(coords, dtype=np.float64)
+    weights = np.zeros(len(coords))
+    if len(coords) > 1:
+        steps = np.diff(coords) / 2
+        weights[:-1] += steps
+        weights[1:] += steps
+    return weights
+
+
+def parse_regions(text):
+    """ "x0,x1,y0,y1; ..." を部分矩形 (x0, x1, y0, y1) のリストに変換する"""
+    regions = []
+    for part in text.split(";"):
+        if part.strip():
+            values = [float(v.strip()) for v in part.split(",")]
+            if len(values) != 4:
+                raise ValueError(f"部分矩形は x0,x1,y0,y1 で指定してください: {part.strip()}")
+            regions.append(tuple(values))
+    return regions
+
+
+def _axis_weights(coords, low=-np.inf, high=np.inf):
+    """
+    座標が [low, high] に入る格子点だけで台形積分する重みを返す。
+
+    Returns:
+        tuple: (格子点ごとの重み, 隣り合う2点の区間ごとの重み (区間の幅 / 2), 範囲内の格子点の真偽値)。
+        範囲外の格子点と区間の重みは0です。
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    inside = (coords >= min(low, high)) & (coords <= max(low, high))
+    weights = np.zeros(len(coords))
+    weights[inside] = trapezoid_weights(coords[inside])
+    interval_weights = np.diff(coords) / 2 * (inside[:-1] & inside[1:])
+    return weights, interval_weights, inside
+
+
+class GridIntegrator:
+    """
+    1つの座標格子に対する積分の重み行列。
+
+    Args:
+        x_coords (array): 各列のX座標。
+        y_coords (array): 各行のY座標。
+        regions (list): 部分矩形 (x0, x1, y0, y1) のリスト。座標の範囲に入る格子点で積分します。
+    """
+
+    def __init__(self, x_coords, y_coords, regions=()):
+        self.shape = (len(y_coords), len(x_coords))
+        columns = [(_axis_weights(y_coords), _axis_weights(x_coords))]
+        for x0, x1, y0, y1 in regions:
+            columns.append((_axis_weights(y_coords, y0, y1), _axis_weights(x_coords, x0, x1)))
+        # 列ごとに Y と X の重みの外積を平坦化した、(格子点の数, 1 + 部分矩形の数) の行列
+        self.weights = np.stack([np.outer(wy, wx).ravel() for (wy, _, _), (wx, _, _) in columns], axis=1)
+        # 格子全体の正の領域の面積だけは従来の np.trapz と同じ区間ごとの重みで数える
+        (wy, _, _), (_, ix, _) = columns[0]
+        self.interval_weights = np.outer(wy, ix).ravel()
+        # NaN を含む格子点がどの積分に影響するか
+        self.support = np.stack([np.outer(iy, jx).ravel() for (_, _, iy), (_, _, jx) in columns], axis=1).astype(np.float64)
+
+    def integrate(self, stack):
+        """
+        (シート数, 高さ, 幅) の輝度値をまとめて積分する。
+
+        負の輝度値は0として扱います。NaN は np.trapz と同じく、その格子点を含む積分の結果を NaN にします。
+
+        Returns:
+            tuple: (積分値, 正の輝度値の面積)。どちらも (シート数, 1 + 部分矩形の数) の配列。
+            面積は、格子全体は従来の np.trapz の数え方、部分矩形は正の格子点の台形積分による実際の面積です。
+        """
+        values = np.asarray(stack, dtype=np.float64).reshape((len(stack),) + self.shape)
+        missing = np.isnan(values)
+        integrals = np.where(missing, 0, np.maximum(values, 0)).reshape(len(values), -1) @ self.weights
+        if missing.any():
+            integrals[missing.reshape(len(values), -1).astype(np.float64) @ self.support > 0] = np.nan
+        positive = values > 0
+        positive_areas = positive.reshape(len(values), -1).astype(np.float64) @ self.weights
+        positive_intervals = (positive[:, :, :-1] | positive[:, :, 1:]).reshape(len(values), -1)
+        positive_areas[:, 0] = positive_intervals.astype(np.float64) @ self.interval_weights
+        return integrals, positive_areas
+
+
+def average_brightness(integrals, positive_areas):
+    """単位面積当たりの平均輝度値（正の領域がなければ0）"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(positive_areas > 0, integrals / np.where(positive_areas > 0, positive_areas, 1), 0)
+
+
+def integrate_grids(grids, regions=(), batch_bytes=BATCH_BYTES):
+    """
+    (名前, X座標, Y座標, 輝度値) を順に受け取り、同じ座標格子のものをまとめて積分する。
+
+    座標が異なるシートは格子ごとにグループ分けし、グループごとの重み行列で計算します。
+    保持するのはバッチ分の輝度値だけなので、シート数が多くてもメモリ使用量は増えません。
+
+    Returns:
+        list: 入力と同じ順序の (名前, 積分値, 平均輝度値) のリスト。積分値・平均輝度値は
+        [格子全体, 部分矩形1, ...] の配列です。
+    """
+    integrators = {}
+    pending = {}
+    pending_bytes = 0
+    results = []
+
+    def flush(key):
+        names_positions, stacks = zip(*pending.pop(key))
+        integrals, positive_areas = integrators[key].integrate(np.stack(stacks))
+        averages = average_brightness(integrals, positive_areas)
+        for (name, position), integral, average in zip(names_positions, integrals, averages):
+            results[position] = (name, integral, average)
+
+    for name, x_coords, y_coords, values in grids:
+        x_coords = np.asarray(x_coords, dtype=np.float64)
+        y_coords = np.asarray(y_coords, dtype=np.float64)
+        key = (x_coords.tobytes(), y_coords.tobytes())
+        if key not in integrators:
+            integrators[key] = GridIntegrator(x_coords, y_coords, regions)
+        if np.shape(values) != integrators[key].shape:
+            raise ValueError(f"{name}: 輝度値の大きさ {np.shape(values)} が座標の数と一致しません。")
+        results.append(None)
+        pending.setdefault(key, []).append(((name, len(results) - 1), values))
+        pending_bytes += np.size(values) * 8
+        if pending_bytes >= batch_bytes:
+            for pending_key in list(pending):
+                flush(pending_key)
+            pending_bytes = 0
+    for pending_key in list(pending):
+        flush(pending_key)
+    return results
+
+
+def integrate_cube(cube_path, regions=(), batch_bytes=BATCH_BYTES):
+    """
+    輝度キューブの全フレームを、メモリマップからバッチ単位で切り出して積分する。
+
+    Returns:
+        list: (フレーム名, 積分値, 平均輝度値) のリスト。integrate_grids と同じ形式です。
+    """
+    cube, index = load_cube(cube_path)
+    integrator = GridIntegrator(index["x_coords"], index["y_coords"], regions)
+    frame_bytes = int(np.prod(cube.shape[1:])) * 8
+    batch = max(1, batch_bytes // max(frame_bytes, 1))
+    results = []
+    for start in range(0, len(cube), batch):
+        integrals, positive_areas = integrator.integrate(cube[start:start + batch])
+        averages = average_brightness(integrals, positive_areas)
+        names = [frame["name"] for frame in index["frames"][start:start + batch]]
+        results.extend(zip(names, integrals, averages))
+    return results
+
+
+def iter_excel_grids_pandas(input_file: str):
+    """Excelファイルの各シートから (シート名, X座標, Y座標, 輝度値) を返す（.xls 用）"""
+    import pandas as pd  # .xls を読む場合だけ読み込む
+
+    # Excelファイルを読み込み
+    excel_data = pd.ExcelFile(input_file)
+
+    # 各シートについて処理
+    for sheet_name in excel_data.sheet_names:
+        # シートデータをデータフレームとして取得
+        df = excel_data.parse(sheet_name, header=None)
+
+        # 1行目はX座標、1列目はY座標
+        x_coords = df.iloc[0, 1:].astype(float).values  # X座標を取得
+        y_coords = df.iloc[1:, 0].astype(float).values  # Y座標を取得
+        brightness_values = df.iloc[1:, 1:].astype(float).values  # 輝度値部分
+        yield sheet_name, x_coords, y_coords, brightness_values
+
+
+def read_sheet_values(sheet):
+    """
+    読み取り専用シートのセル値を float 配列に直接読み込む（空セルは NaN）。
+
+    1行目の先頭セル（"y\\x" などの見出し）は NaN として扱います。
+    pandas と同じく、末尾の空の行と列（書式だけが設定されたセルなど）は含めません。
+    """
+    # ファイルに記録された寸法は配列の大きさの見積もりにだけ使い、実際のセルを最後まで読む
+    n_rows = sheet.max_row or 256
+    n_cols = sheet.max_column or 0
+    sheet.reset_dimensions()
+    values = None
+    count = 0
+    for row in sheet.iter_rows(values_only=True):
+        if values is None:
+            n_cols = max(n_cols, len(row))
+            values = np.full((n_rows, n_cols), np.nan)
+            row = (None,) + row[1:]
+        if count == values.shape[0]:
+            # シートの大きさが記録されていない場合は領域を倍々に拡張する
+            values = np.vstack((values, np.full(values.shape, np.nan)))
+        if len(row) > values.shape[1]:
+            values = np.hstack((values, np.full((values.shape[0], len(row) - values.shape[1]), np.nan)))
+        values[count, :len(row)] = row
+        count += 1
+    if values is None:
+        return np.empty((0, 0))
+    filled = ~np.isnan(values[:count])
+    filled[0, 0] = True  # 見出しのセル
+    used_rows = np.flatnonzero(filled.any(axis=1))[-1] + 1
+    used_cols = np.flatnonzero(filled.any(axis=0))[-1] + 1
+    return values[:used_rows, :used_cols]
+
+
+def _read_sheet_grids(job):
+    """ワーカープロセスで担当シートを読み込み、(シート名, X座標, Y座標, 輝度値) のリストを返す"""
+    import openpyxl
+
+    input_file, sheet_names = job
+    workbook = openpyxl.load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        grids = []
+        for sheet_name in sheet_names:
+            values = read_sheet_values(workbook[sheet_name])
+            # 1行目はX座標、1列目はY座標
+            grids.append((sheet_name, values[0, 1:], values[1:, 0], values[1:, 1:]))
+        return grids
+    finally:
+        workbook.close()
+
+
+def iter_excel_grids(input_file: str, workers=None):
+    """
+    Excelファイルの各シートから (シート名, X座標, Y座標, 輝度値) をシート順に返す。
+
+    .xlsx はシートをプロセスプールで分担し、DataFrameを経由せずにセル値を配列へ読み込みます。
+    """
+    import openpyxl
+
+    if not input_file.lower().endswith((".xlsx", ".xlsm")):
+        yield from iter_excel_grids_pandas(input_file)
+        return
+
+    workbook = openpyxl.load_workbook(input_file, read_only=True)
+    sheet_names = workbook.sheetnames
+    workbook.close()
+
+    workers = workers or os.cpu_count() or 1
+    # 1つのジョブで複数シートを読み、ワーカーごとのブック読み込みの回数を抑える
+    chunk = max(1, len(sheet_names) // (workers * 4))
+    jobs = [(input_file, sheet_names[i:i + chunk]) for i in range(0, len(sheet_names), chunk)]
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield from _read_sheet_grids(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for grids in executor.map(_read_sheet_grids, jobs):
+            yield from grids
+
+
+def calculate_area_integral(input_file: str, output_file: str, workers=None, regions=()):
+    """
+    Excelファイルの各シート（または輝度キューブの各フレーム）を積分し、結果をExcelファイルに保存します。
+
+    Args:
+        input_file (str): 入力ファイル（.xlsx/.xls または輝度キューブの .npy）のパス。
+        output_file (str): 結果を保存するExcelファイルのパス。
+        workers (int): .xlsx のシートを読み込むプロセス数（省略時はCPU数）。
+        regions (list): 部分矩形 (x0, x1, y0, y1) のリスト。
+
+    Returns:
+        int: 積分したシート（フレーム）の数。
+    """
+    import pandas as pd  # 結果の書き出しにだけ使う
+
+    metrics = run_metrics.current()
+    metrics.add("read_sheets", bytes_read=os.path.getsize(input_file))
+    # 輝度キューブ (.npy) はメモリマップからまとめて、それ以外はExcelのシートを座標の格子ごとにまとめて積分する
+    # （"integrate" の時間にはシートの読み込み "read_sheets" を含まない）
+    with metrics.stage("integrate"):
+        if input_file.lower().endswith(".npy"):
+            integration_results = integrate_cube(input_file, regions)
+        else:
+            integration_results = integrate_grids(metrics.timed("read_sheets", iter_excel_grids(input_file, workers)), regions)
+    metrics.add("integrate", items=len(integration_results))
+
+    # 結果をデータフレームとして整形（部分矩形ごとの列を後ろに追加）
+    columns = ["Sheet Name", "Area Integral", "Average Brightness"]
+    for i, (x0, x1, y0, y1) in enumerate(regions, 1):
+        columns += [f"Region {i} Integral (x={x0:g}-{x1:g}, y={y0:g}-{y1:g})", f"Region {i} Average Brightness"]
+    rows = [
+        [sheet_name] + [value for pair in zip(integrals, averages) for value in pair]
+        for sheet_name, integrals, averages in integration_results
+    ]
+    result_df = pd.DataFrame(rows, columns=columns)
+
+    # 結果を新しいExcelファイルとして保存
+    with metrics.stage("excel_save"):
+        result_df.to_excel(output_file, index=False)
+    metrics.add("excel_save", bytes_written=os.path.getsize(output_file))
+    return len(rows)
@@ -1,9 +1,10 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
 import os
-import openpyxl
-from openpyxl.utils import get_column_letter
+import threading
+import multiprocessing
+from brightness_extraction import list_image_files, extract_columns_to_excel, extract_columns_to_cube, watch_columns_to_cube
+from run_metrics import RunRecorder, tk_status_callback
 
 def select_folder():
     folder_path = filedialog.askdirectory()
@@ -24,99 +25,162 @@ def extract_brightness():
         x_coords = [int(x.strip()) for x in x_coords]
         y_origins = [int(y.strip()) for y in y_origins]
         scales = [float(s.strip()) for s in scales]
+        workers = int(workers_entry.get().strip())
+        chunksize = int(chunksize_entry.get().strip())
+    except ValueError:
+        messagebox.showerror("Error", "X座標、Y座標、スケール、ワーカー数およびチャンクサイズには有効な数値を入力してください。")
+        return
+
+    try:
         folder_path_val = image_folder_path.get()
 
         if not os.path.exists(folder_path_val):
             messagebox.showerror("Error", "選択されたフォルダが存在しません。")
             return
 
-        image_files = [f for f in os.listdir(folder_path_val) if f.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".tiff"))]
-        if not image_files:
+        if not list_image_files(folder_path_val):
             messagebox.showerror("Error", "選択されたフォルダに画像ファイルが見つかりません。")
             return
 
         save_path = filedialog.asksaveasfilename(
             defaultextension=".xlsx",
-            filetypes=[("Excel Files", "*.xlsx")],
+            filetypes=[("Excel Files", "*.xlsx"), ("Brightness Cube (memory-mapped)", "*.npy")],
         )
         if not save_path:
             return
 
-        workbook = openpyxl.Workbook()
-        workbook.remove(workbook.active)  # デフォルトのシートを削除
-
-        for image_file in image_files:
-            image_path = os.path.join(folder_path_val, image_file)
-            img = Image.open(image_path).convert("L")  # グレースケールに変換
-            width, height = img.size
-
-            # 有効なX座標、Y原点、スケールをフィルタリング
-            valid_coords_data = [(x, y_origin, scale) for x, y_origin, scale in zip(x_coords, y_origins, scales) if 0 <= x < width and 0 <= y_origin < height]
-            if not valid_coords_data:
-                messagebox.showwarning("Warning", f"{image_file}をスキップ: 有効な座標が画像の範囲外です。")
-                continue
-
-            sheet = workbook.create_sheet(title=os.path.splitext(image_file)[0])
-
-            # ラベルを「輝度 → スケール」の順に並べる
-            header = ["y"]
-            for x, _, _ in valid_coords_data:
-                header.append(f"Brightness x={x}")
-                header.append(f"Scale (mm) x={x}")
-            sheet.append(header)
-
-            # データを「輝度 → スケール」の順に並べる
-            for y in range(height):
-                row = [y]
-                for x, y_origin, scale in valid_coords_data:
-                    brightness = img.getpixel((x, y))
-                    physical_length = (y_origin - y) * scale  # Y原点からの距離（上が正、下が負）
-                    row.extend([brightness, physical_length])
-                sheet.append(row)
-
-            # 列幅の自動調整
-            for col_num, _ in enumerate(sheet.iter_cols(), 1):
-                column_width = max(len(str(cell.value)) for cell in sheet[get_column_letter(col_num)])
-                sheet.column_dimensions[get_column_letter(col_num)].width = column_width + 2
-
-        workbook.save(save_path)
+        # 拡張子が .npy の場合は輝度キューブ形式で保存
+        extract = extract_columns_to_cube if save_path.lower().endswith(".npy") else extract_columns_to_excel
+        params = {"folder": folder_path_val, "x_coords": x_coords, "y_origins": y_origins, "scales": scales, "workers": workers, "chunksize": chunksize}
+        with RunRecorder("column_extraction", save_path, params, on_update=tk_status_callback(root, run_status.set), profile=profile_var.get()):
+            skipped = extract(folder_path_val, x_coords, y_origins, scales, save_path, workers, chunksize, incremental_var.get())
+        for image_file, reason in skipped:
+            messagebox.showwarning("Warning", f"{image_file}をスキップ: {reason}")
+
         messagebox.showinfo("Success", f"輝度値とスケールが{save_path}に保存されました")
 
-    except ValueError:
-        messagebox.showerror("Error", "X座標、Y座標、およびスケールには有効な数値を入力してください。")
+    except ValueError as e:
+        # 抽出処理からのエラー（すべての画像がスキップされた場合など）
+        messagebox.showerror("Error", str(e))
     except Exception as e:
         messagebox.showerror("Error", f"予期しないエラーが発生しました: {e}")
 
-# GUI Setup
-root = tk.Tk()
-root.title("Batch Brightness Extractor with Scale and Origin")
-
-image_folder_path = tk.StringVar()
-
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack(fill="both", expand=True)
+watch_stop_event = None
 
-# フォルダ選択
-tk.Label(frame, text="Select Folder:").grid(row=0, column=0, sticky="e", pady=5)
-tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
-tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
-
-# X座標入力
-tk.Label(frame, text="X-Coordinates (comma-separated):").grid(row=1, column=0, sticky="e", pady=5)
-x_entry = tk.Entry(frame, width=30)
-x_entry.grid(row=1, column=1, padx=5, pady=5)
-
-# Y座標入力
-tk.Label(frame, text="Y-Coordinates (comma-separated):").grid(row=2, column=0, sticky="e", pady=5)
-y_entry = tk.Entry(frame, width=30)
-y_entry.grid(row=2, column=1, padx=5, pady=5)
-
-# スケール入力
-tk.Label(frame, text="Scale (mm/pixel, comma-separated):").grid(row=3, column=0, sticky="e", pady=5)
-scale_entry = tk.Entry(frame, width=30)
-scale_entry.grid(row=3, column=1, padx=5, pady=5)
-
-# 抽出と保存ボタン
-tk.Button(frame, text="Extract Brightness", command=extract_brightness).grid(row=4, column=0, columnspan=3, pady=10)
-
-root.mainloop()
+def start_watch():
+    """撮影中のフォルダを監視し、新しいフレームの輝度列を輝度キューブに追記し続ける"""
+    global watch_stop_event
+    if watch_stop_event and not watch_stop_event.is_set():
+        messagebox.showwarning("Warning", "すでにフォルダを監視しています。")
+        return
+    try:
+        x_coords = [int(x.strip()) for x in x_entry.get().split(',')]
+        y_origins = [int(y.strip()) for y in y_entry.get().split(',')]
+        scales = [float(s.strip()) for s in scale_entry.get().split(',')]
+    except ValueError:
+        messagebox.showerror("Error", "X座標、Y座標、およびスケールには有効な数値を入力してください。")
+        return
+    if not (len(x_coords) == len(y_origins) == len(scales)):
+        messagebox.showerror("Error", "X座標、Y座標、スケールの数が一致していません。")
+        return
+    folder_path_val = image_folder_path.get()
+    if not os.path.exists(folder_path_val):
+        messagebox.showerror("Error", "選択されたフォルダが存在しません。")
+        return
+
+    # 監視中はフレームごとに追記できる輝度キューブ形式で保存する
+    save_path = filedialog.asksaveasfilename(
+        defaultextension=".npy",
+        filetypes=[("Brightness Cube (memory-mapped)", "*.npy")],
+    )
+    if not save_path:
+        return
+
+    watch_stop_event = threading.Event()
+    processed = [0]
+
+    def on_frame(image_file, reason):
+        processed[0] += 1
+        message = f"Watching: {processed[0]} frames ({image_file}" + (f" skipped: {reason})" if reason else ")")
+        root.after(0, watch_status.set, message)
+
+    def run(stop_event):
+        try:
+            watch_columns_to_cube(folder_path_val, x_coords, y_origins, scales, save_path, stop_event, on_frame=on_frame)
+        except Exception as e:
+            stop_event.set()
+            root.after(0, messagebox.showerror, "Error", f"監視中にエラーが発生しました: {e}")
+        root.after(0, watch_status.set, f"Watch stopped: {processed[0]} frames added to {save_path}")
+
+    threading.Thread(target=run, args=(watch_stop_event,), daemon=True).start()
+    watch_status.set("Watching...")
+
+def stop_watch():
+    if watch_stop_event:
+        watch_stop_event.set()
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Batch Brightness Extractor with Scale and Origin")
+
+    image_folder_path = tk.StringVar()
+
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack(fill="both", expand=True)
+
+    # フォルダ選択
+    tk.Label(frame, text="Select Folder:").grid(row=0, column=0, sticky="e", pady=5)
+    tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
+    tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
+
+    # X座標入力
+    tk.Label(frame, text="X-Coordinates (comma-separated):").grid(row=1, column=0, sticky="e", pady=5)
+    x_entry = tk.Entry(frame, width=30)
+    x_entry.grid(row=1, column=1, padx=5, pady=5)
+
+    # Y座標入力
+    tk.Label(frame, text="Y-Coordinates (comma-separated):").grid(row=2, column=0, sticky="e", pady=5)
+    y_entry = tk.Entry(frame, width=30)
+    y_entry.grid(row=2, column=1, padx=5, pady=5)
+
+    # スケール入力
+    tk.Label(frame, text="Scale (mm/pixel, comma-separated):").grid(row=3, column=0, sticky="e", pady=5)
+    scale_entry = tk.Entry(frame, width=30)
+    scale_entry.grid(row=3, column=1, padx=5, pady=5)
+
+    # 並列処理のワーカー数とチャンクサイズ
+    tk.Label(frame, text="Workers:").grid(row=4, column=0, sticky="e", pady=5)
+    workers_entry = tk.Entry(frame, width=30)
+    workers_entry.insert(0, str(os.cpu_count() or 1))
+    workers_entry.grid(row=4, column=1, padx=5, pady=5)
+
+    tk.Label(frame, text="Chunk Size:").grid(row=5, column=0, sticky="e", pady=5)
+    chunksize_entry = tk.Entry(frame, width=30)
+    chunksize_entry.insert(0, "4")
+    chunksize_entry.grid(row=5, column=1, padx=5, pady=5)
+
+    # 増分処理（新規・変更された画像だけを処理して既存の出力に統合）
+    incremental_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(frame, text="Only process new or changed frames (resume)", variable=incremental_var).grid(row=6, column=0, columnspan=3, pady=5)
+
+    # 処理のプロファイル（出力の隣に .prof を保存）
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame, text="Profile run (save .prof next to output)", variable=profile_var).grid(row=7, column=0, columnspan=3, pady=5)
+
+    # 抽出と保存ボタン
+    tk.Button(frame, text="Extract Brightness", command=extract_brightness).grid(row=8, column=0, columnspan=3, pady=10)
+
+    # 処理の段階ごとの時間とメモリ
+    run_status = tk.StringVar(value="")
+    tk.Label(frame, textvariable=run_status).grid(row=9, column=0, columnspan=3, pady=5)
+
+    # 撮影中のフォルダの監視
+    tk.Button(frame, text="Start Watch", command=start_watch).grid(row=10, column=0, pady=5)
+    tk.Button(frame, text="Stop Watch", command=stop_watch).grid(row=10, column=1, pady=5)
+    watch_status = tk.StringVar(value="Watch: idle")
+    tk.Label(frame, textvariable=watch_status).grid(row=11, column=0, columnspan=3, pady=5)
+
+    root.mainloop()
@@ -0,0 +1,390 @@
+# ファイル名: benchmark.py
+"""
+主要な処理の実行時間を測るベンチマーク。
+
+合成したフレームのフォルダ（TimelapseApp と同じ %Y%m%d%H%M%S_連番 のファイル名）に対して、
+デコード・矩形抽出・輝度列抽出・Excel書き込み・面積積分・セル抽出・輪郭検出・タイムラプス作成の
+各段階を測定し、処理時間・スループット・ピークメモリ (RSS) を JSON に保存します。
+フレームは乱数のシードから決まるため、同じ設定なら何度でも同じフォルダが作られます。
+
+    python benchmark.py generate <フォルダ> --count 1000 --width 1280 --height 960 --format bmp
+    python benchmark.py run --count 200 --output results.json
+    python benchmark.py run --frames <フォルダ> --baseline baseline.json --threshold 0.1
+
+各段階は別プロセスで実行するため、ピークメモリは段階ごとの値です。
+--baseline を指定すると基準の結果と比較し、処理時間が threshold の割合を超えて増えた段階があれば
+終了コード 1 を返します。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from run_metrics import peak_rss_bytes
+
+FORMATS = {"bmp": ".bmp", "png": ".png", "jpg": ".jpg", "tiff": ".tiff"}
+SIXTEEN_BIT_FORMATS = ("png", "tiff")
+START_TIME = datetime(2024, 1, 1, 12, 0, 0)
+DEFAULT_THRESHOLD = 0.10
+
+
+def synthetic_frame(index, width, height, bit_depth=8, seed=0):
+    """
+    合成フレームを作る（横方向のグラデーションの上を明るい円がいくつか移動し、ノイズを加えたもの）。
+
+    Returns:
+        np.ndarray: 8ビットなら (高さ, 幅, 3) の uint8、16ビットなら (高さ, 幅) の uint16。
+    """
+    rng = np.random.default_rng([seed, index])
+    layout = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = 40.0 + 80.0 * x / max(width - 1, 1)
+    # 円の位置と速度はシードだけで決まり、フレームごとに少しずつ移動する
+    count = 12
+    centers = layout.uniform(0, 1, (count, 2)) * (width, height)
+    velocities = layout.uniform(-2, 2, (count, 2))
+    radii = layout.uniform(0.02, 0.06, count) * min(width, height)
+    for (cx, cy), (vx, vy), radius in zip(centers, velocities, radii):
+        cx = (cx + vx * index) % width
+        cy = (cy + vy * index) % height
+        frame[(x - cx) ** 2 + (y - cy) ** 2 <= radius ** 2] = 230.0
+    frame += rng.normal(0, 6.0, frame.shape)
+    if bit_depth == 16:
+        return np.clip(frame * 257, 0, 65535).astype(np.uint16)
+    gray = np.clip(frame, 0, 255).astype(np.uint8)
+    return np.stack([gray, gray, np.clip(frame * 0.9, 0, 255).astype(np.uint8)], axis=2)
+
+
+def frame_name(index, extension, interval=1):
+    """TimelapseApp と同じ形式のファイル名 (%Y%m%d%H%M%S_連番)"""
+    timestamp = START_TIME + timedelta(seconds=index * interval)
+    return f"{timestamp.strftime('%Y%m%d%H%M%S')}_{index}{extension}"
+
+
+def generate_frames(folder, count, width, height, image_format="bmp", bit_depth=8, seed=0):
+    """
+    合成フレームのフォルダを作成します。
+
+    Args:
+        folder (str): 保存先のフォルダ。
+        count (int): フレーム数。
+        width, height (int): 解像度。
+        image_format (str): "bmp", "png", "jpg", "tiff" のいずれか。
+        bit_depth (int): 8 または 16（16ビットは png と tiff のグレースケールのみ）。
+        seed (int): 乱数のシード。
+
+    Returns:
+        list: 作成したファイル名のリスト。
+    """
+    from PIL import Image
+
+    if image_format not in FORMATS:
+        raise ValueError(f"対応していない形式です: {image_format}")
+    if bit_depth == 16 and image_format not in SIXTEEN_BIT_FORMATS:
+        raise ValueError("16ビットのフレームは png と tiff だけで作成できます。")
+    os.makedirs(folder, exist_ok=True)
+    names = []
+    for index in range(count):
+        frame = synthetic_frame(index, width, height, bit_depth, seed)
+        name = frame_name(index, FORMATS[image_format])
+        # 16ビットの配列は "I;16" のグレースケール画像になる
+        Image.fromarray(frame).save(os.path.join(folder, name))
+        names.append(name)
+    return names
+
+
+def _folder_bytes(folder):
+    return sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+
+
+def _frame_size(frames):
+    from frame_reader import open_frame
+    from brightness_extraction import list_image_files
+
+    return open_frame(os.path.join(frames, list_image_files(frames)[0])).size
+
+
+def _rectangle(frames):
+    """フレームの中央付近の 64x64（フレームが小さければ収まる大きさ）の矩形"""
+    width, height = _frame_size(frames)
+    size = min(64, width, height)
+    return (width - size) // 2, (height - size) // 2, size, size
+
+
+# 各段階は (フレームフォルダ, 作業フォルダ, 設定) を受け取り (処理した件数, 読み込んだバイト数) を返す
+
+def stage_decode(frames, work, config):
+    from brightness_extraction import list_image_files
+    from frame_reader import load_luminance
+
+    image_files = list_image_files(frames)
+    for image_file in image_files:
+        load_luminance(os.path.join(frames, image_file))
+    return len(image_files), _folder_bytes(frames)
+
+
+def stage_rectangle(frames, work, config):
+    from brightness_extraction import extract_rectangle_to_cube, list_image_files
+
+    x, y, width, height = _rectangle(frames)
+    extract_rectangle_to_cube(frames, x, y, width, height, os.path.join(work, "rectangle.npy"), config["workers"], 4)
+    return len(list_image_files(frames)), _folder_bytes(frames)
+
+
+def stage_columns(frames, work, config):
+    from brightness_extraction import extract_columns_to_cube, list_image_files
+
+    width, _ = _frame_size(frames)
+    x_coords = [width * (i + 1) // 5 for i in range(4)]
+    extract_columns_to_cube(frames, x_coords, [0] * 4, [0.1] * 4, os.path.join(work, "columns.npy"), config["workers"], 4)
+    return len(list_image_files(frames)), _folder_bytes(frames)
+
+
+def stage_excel_write(frames, work, config):
+    from brightness_extraction import extract_rectangle_to_excel, list_image_files
+
+    x, y, width, height = _rectangle(frames)
+    extract_rectangle_to_excel(frames, x, y, width, height, os.path.join(work, "rectangle.xlsx"), config["workers"], 4)
+    return len(list_image_files(frames)), _folder_bytes(frames)
+
+
+def stage_area_integral(frames, work, config):
+    from area_integration import calculate_area_integral
+
+    workbook = os.path.join(work, "rectangle.xlsx")
+    count = calculate_area_integral(workbook, os.path.join(work, "integral.xlsx"), config["workers"])
+    return count, os.path.getsize(workbook)
+
+
+def stage_extract_values(frames, work, config):
+    from cell_extraction import extract_cells, parse_cell_specs
+
+    workbook = os.path.join(work, "rectangle.xlsx")
+    result = extract_cells(workbook, parse_cell_specs("B2, C3, D4:F6"), "mean")
+    return len(result) - 1, os.path.getsize(workbook)
+
+
+def stage_contours(frames, work, config):
+    from brightness_extraction import list_image_files
+    from contour_pipeline import extract_contours
+
+    extract_contours(frames, os.path.join(work, "contours.npz"), 128, 5, config["workers"])
+    return len(list_image_files(frames)), _folder_bytes(frames)
+
+
+def stage_timelapse(frames, work, config):
+    from timelapse_video import create_timelapse
+
+    count = create_timelapse(frames, os.path.join(work, "timelapse.avi"), 30, config["workers"])
+    return count, _folder_bytes(frames)
+
+
+# 実行順（excel_write が作るブックを area_integral と extract_values が読み込む）
+STAGES = {
+    "decode": stage_decode,
+    "rectangle": stage_rectangle,
+    "columns": stage_columns,
+    "excel_write": stage_excel_write,
+    "area_integral": stage_area_integral,
+    "extract_values": stage_extract_values,
+    "contours": stage_contours,
+    "timelapse": stage_timelapse,
+}
+
+
+def _run_stage_in_process(name, frames, work, config, result_path):
+    """子プロセスで1つの段階を実行し、結果を result_path に書き込む"""
+    start = time.perf_counter()
+    count, bytes_read = STAGES[name](frames, work, config)
+    seconds = time.perf_counter() - start
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({"seconds": seconds, "items": count, "bytes_read": bytes_read, "peak_rss_bytes": peak_rss_bytes()}, f)
+
+
+def run_stage(name, frames, work, config, repeat=1):
+    """段階を別プロセスで repeat 回実行し、最も速かった回の結果を返す"""
+    best = None
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            result_path = os.path.join(temp_dir, "stage.json")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "_stage", name, frames, work, json.dumps(config), result_path],
+                check=True,
+            )
+            with open(result_path, encoding="utf-8") as f:
+                result = json.load(f)
+        if best is None or result["seconds"] < best["seconds"]:
+            best = result
+    seconds = max(best["seconds"], 1e-9)
+    best["items_per_second"] = best["items"] / seconds
+    best["megabytes_per_second"] = best["bytes_read"] / seconds / 1e6
+    return best
+
+
+def run_benchmarks(frames, stages=None, workers=1, repeat=1):
+    """
+    フレームフォルダに対して各段階を測定します。
+
+    Returns:
+        dict: {"environment": ..., "config": ..., "stages": {段階名: 結果}}
+    """
+    from brightness_extraction import list_image_files
+
+    stages = stages or list(STAGES)
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        raise ValueError(f"不明な段階です: {', '.join(unknown)}")
+    config = {"workers": workers}
+    results = {}
+    with tempfile.TemporaryDirectory() as work:
+        # 後の段階が使うブックは、測定しない場合でも作っておく
+        needs_workbook = {"area_integral", "extract_values"} & set(stages)
+        if needs_workbook and "excel_write" not in stages:
+            stage_excel_write(frames, work, config)
+        for name in STAGES:
+            if name in stages:
+                print(f"{name} ...", flush=True)
+                results[name] = run_stage(name, frames, work, config, repeat)
+
+    width, height = _frame_size(frames)
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+        },
+        "config": {
+            "frames": os.path.abspath(frames),
+            "frame_count": len(list_image_files(frames)),
+            "resolution": [width, height],
+            "workers": workers,
+            "repeat": repeat,
+        },
+        "stages": results,
+    }
+
+
+def compare_with_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    基準の結果と処理時間を比較します。
+
+    Returns:
+        list: 処理時間が基準の (1 + threshold) 倍を超えた段階の (段階名, 今回の秒数, 基準の秒数) のリスト。
+    """
+    regressions = []
+    for name, result in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if reference and result["seconds"] > reference["seconds"] * (1 + threshold):
+            regressions.append((name, result["seconds"], reference["seconds"]))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f"{'stage':<16}{'seconds':>10}{'items/s':>10}{'MB/s':>10}{'peak MB':>10}{'baseline':>10}{'change':>9}")
+    for name, result in results["stages"].items():
+        line = (
+            f"{name:<16}{result['seconds']:>10.3f}{result['items_per_second']:>10.1f}"
+            f"{result['megabytes_per_second']:>10.1f}{result['peak_rss_bytes'] / 1e6:>10.0f}"
+        )
+        reference = (baseline or {}).get("stages", {}).get(name)
+        if reference:
+            change = result["seconds"] / max(reference["seconds"], 1e-9) - 1
+            line += f"{reference['seconds']:>10.3f}{change:>+9.0%}"
+        print(line)
+
+
+def _add_frame_arguments(parser):
+    parser.add_argument("--count", type=int, default=100, help="フレーム数")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--format", default="bmp", choices=list(FORMATS), help="画像形式")
+    parser.add_argument("--bit-depth", type=int, default=8, choices=[8, 16])
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="主要な処理のベンチマーク")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("generate", help="合成フレームのフォルダを作成する")
+    p.add_argument("folder")
+    _add_frame_arguments(p)
+
+    p = commands.add_parser("run", help="ベンチマークを実行する")
+    p.add_argument("--frames", default=None, help="フレームフォルダ（省略時は合成フレームを一時フォルダに作成）")
+    _add_frame_arguments(p)
+    p.add_argument("--stages", default=None, help=f"測定する段階（カンマ区切り、省略時はすべて: {','.join(STAGES)}）")
+    p.add_argument("--workers", type=int, default=1, help="各段階のワーカー数")
+    p.add_argument("--repeat", type=int, default=1, help="各段階の実行回数（最も速い回を記録）")
+    p.add_argument("--output", default=None, help="結果を保存する .json")
+    p.add_argument("--baseline", default=None, help="比較する基準の結果 (.json)")
+    p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="遅くなったと判定する割合")
+
+    p = commands.add_parser("_stage")
+    for name in ("name", "frames", "work", "config", "result_path"):
+        p.add_argument(name)
+
+    args = parser.parse_args(argv)
+    try:
+        return _run_command(args)
+    except (OSError, ValueError) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+
+
+def _run_command(args):
+    if args.command == "_stage":
+        _run_stage_in_process(args.name, args.frames, args.work, json.loads(args.config), args.result_path)
+        return 0
+    if args.command == "generate":
+        generate_frames(args.folder, args.count, args.width, args.height, args.format, args.bit_depth, args.seed)
+        print(f"{args.count} フレームを作成しました: {args.folder}")
+        return 0
+
+    frames = args.frames
+    temp_frames = None
+    if frames is None:
+        temp_frames = frames = tempfile.mkdtemp(prefix="benchmark_frames_")
+        generate_frames(frames, args.count, args.width, args.height, args.format, args.bit_depth, args.seed)
+    try:
+        stages = args.stages.split(",") if args.stages else None
+        results = run_benchmarks(frames, stages, args.workers, args.repeat)
+    finally:
+        if temp_frames:
+            shutil.rmtree(temp_frames, ignore_errors=True)
+    if temp_frames:
+        results["config"]["frames"] = None
+        results["config"]["generated"] = {
+            "count": args.count, "width": args.width, "height": args.height,
+            "format": args.format, "bit_depth": args.bit_depth, "seed": args.seed,
+        }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果を保存しました: {args.output}")
+    if baseline:
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        for name, seconds, reference in regressions:
+            print(f"遅くなりました: {name} {reference:.3f} 秒 -> {seconds:.3f} 秒", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# ファイル名: brightness_cube.py
+"""
+輝度キューブ形式の読み書き。
+
+抽出した矩形や列の輝度値を (フレーム数, 高さ, 幅) の1つの .npy ファイルにまとめ、
+フレームのタイムスタンプと座標をサイドカーの JSON インデックスに保存します。
+.npy はフレームごとに追記するためメモリ使用量はフレーム数に依存せず、
+読み込み側は np.load(mmap_mode="r") でコピーせずに参照できます。
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+# ヘッダーはフレーム数が増えても書き換えられるよう固定長で確保する
+_HEADER_SIZE = 128
+_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def index_path(cube_path):
+    """キューブに対応するサイドカーインデックスのパスを返す"""
+    return os.path.splitext(cube_path)[0] + ".index.json"
+
+
+def _header_bytes(shape, dtype):
+    """固定長の .npy (version 1.0) ヘッダーを作成する"""
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False, "shape": tuple(shape)})
+    body_size = _HEADER_SIZE - len(_MAGIC) - 2
+    if len(header) + 1 > body_size:
+        raise ValueError(f"キューブのヘッダーが長すぎます: {shape}")
+    header = header.ljust(body_size - 1) + "\n"
+    return _MAGIC + struct.pack("<H", body_size) + header.encode("latin1")
+
+
+class BrightnessCubeWriter:
+    """
+    輝度キューブをフレームごとに書き込むライター。
+
+    Args:
+        path (str): 保存先の .npy ファイルのパス。
+        frame_shape (tuple): 1フレームの (高さ, 幅)。
+        dtype: 輝度値のデータ型（画像のネイティブ型、通常は uint8）。
+        x_coords (list): 各列に対応するX座標。
+        y_coords (list): 各行に対応するY座標。
+        metadata (dict): インデックスに追加で保存する抽出パラメータ（省略可能）。
+        append (bool): True の場合、形状が一致する既存のキューブに追記します。
+            前回の書き込みが中断されていた場合は、最後に flush した時点のフレームから再開します。
+    """
+
+    def __init__(self, path, frame_shape, dtype, x_coords, y_coords, metadata=None, append=False):
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.index = {
+            "dtype": self.dtype.str,
+            "frame_shape": list(self.frame_shape),
+            "x_coords": [float(x) for x in x_coords],
+            "y_coords": [float(y) for y in y_coords],
+            "metadata": metadata or {},
+            "frames": [],
+        }
+        if append and self._can_append():
+            self._file = open(path, "r+b")
+            # 最後の flush 以降に書きかけたデータは捨てる
+            self._file.truncate(_HEADER_SIZE + len(self) * self.frame_bytes)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(_header_bytes((0,) + self.frame_shape, self.dtype))
+        self._positions = {frame["name"]: i for i, frame in enumerate(self.index["frames"])}
+
+    def _can_append(self):
+        """既存のキューブが同じ形状・座標であればそのインデックスを引き継いで True を返す"""
+        if not (os.path.exists(self.path) and os.path.exists(index_path(self.path))):
+            return False
+        with open(index_path(self.path), encoding="utf-8") as f:
+            index = json.load(f)
+        keys = ("dtype", "frame_shape", "x_coords", "y_coords", "metadata")
+        if any(index.get(key) != self.index[key] for key in keys):
+            return False
+        if os.path.getsize(self.path) < _HEADER_SIZE + len(index["frames"]) * self.frame_bytes:
+            return False
+        self.index = index
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.index["frames"])
+
+    def append(self, frame, name, timestamp):
+        """
+        1フレーム分の輝度値をファイル末尾に追記する。
+
+        同じ名前のフレームが既にある場合は、その位置のデータを上書きします。
+        """
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"{name}: フレームの形状 {frame.shape} がキューブの形状 {self.frame_shape} と一致しません。")
+        data = np.ascontiguousarray(frame, dtype=self.dtype).tobytes()
+        position = self._positions.get(name)
+        if position is not None:
+            end = self._file.tell()
+            self._file.seek(_HEADER_SIZE + position * self.frame_bytes)
+            self._file.write(data)
+            self._file.seek(end)
+            self.index["frames"][position]["timestamp"] = timestamp
+            return
+        self._file.write(data)
+        self._positions[name] = len(self.index["frames"])
+        self.index["frames"].append({"name": name, "timestamp": timestamp})
+
+    def flush(self):
+        """ヘッダーのフレーム数とインデックスを現在の内容に更新する"""
+        self._file.flush()
+        position = self._file.tell()
+        self._file.seek(0)
+        self._file.write(_header_bytes((len(self),) + self.frame_shape, self.dtype))
+        self._file.seek(position)
+        self._file.flush()
+        temp_path = index_path(self.path) + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, index_path(self.path))
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+
+def load_cube(path):
+    """
+    輝度キューブをメモリマップで開く。
+
+    Returns:
+        tuple: (形状 (フレーム数, 高さ, 幅) の読み取り専用 memmap, インデックスの dict)。
+    """
+    with open(index_path(path), encoding="utf-8") as f:
+        index = json.load(f)
+    return np.load(path, mmap_mode="r"), index
@@ -0,0 +1,525 @@
+# ファイル名: brightness_extraction.py
+"""
+輝度抽出ツール共通の処理。
+
+Tkのウィジェットに依存しないため、スクリプトから直接呼び出して処理時間を計測できます。
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from PIL import Image
+
+from brightness_cube import BrightnessCubeWriter
+from frame_manifest import FrameManifest
+from frame_reader import open_frame
+from frame_watch import FolderWatcher
+import run_metrics
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff")
+
+# 増分処理でキューブとマニフェストを保存する間隔（フレーム数）
+CHECKPOINT_INTERVAL = 64
+# すべての画像がスキップされたときのエラーメッセージに載せるスキップ理由の最大件数
+SKIPPED_MESSAGE_LIMIT = 10
+
+
+def list_image_files(folder_path):
+    """フォルダ内の画像ファイル名をファイル名順に返す"""
+    return sorted(f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def frame_timestamp(image_path):
+    """
+    フレームの撮影時刻を ISO 形式の文字列で返す。
+
+    TimelapseApp のファイル名 (%Y%m%d%H%M%S_連番) から取得し、含まれていなければ更新日時を使います。
+    """
+    match = re.match(r"(\d{14})", os.path.basename(image_path))
+    if match:
+        try:
+            return datetime.strptime(match.group(1), "%Y%m%d%H%M%S").isoformat()
+        except ValueError:
+            pass
+    return datetime.fromtimestamp(os.path.getmtime(image_path)).isoformat()
+
+
+def check_rectangle(width, height, x_coord, y_coord, rect_width, rect_height):
+    """矩形が画像内に収まっていなければスキップ理由を返す（収まっていれば None）"""
+    if not (0 <= x_coord < width and 0 <= y_coord < height):
+        return "指定された座標が画像範囲外です。"
+    if x_coord + rect_width > width or y_coord + rect_height > height:
+        return "矩形範囲が画像の範囲外です。"
+    return None
+
+
+def rectangle_rows(region, x_coord, y_coord):
+    """
+    切り出した矩形領域をシートに書き込む行のリストとして返す。
+
+    1行目はX座標のヘッダー、以降の各行は先頭にY座標、続いて輝度値が並びます。
+    """
+    header = ["y\\x"] + list(range(x_coord, x_coord + region.shape[1]))
+    return [header] + [[y_coord + j] + values for j, values in enumerate(region.tolist())]
+
+
+def set_column_widths(sheet, rows, sample_size=64):
+    """
+    ヘッダーと先頭・末尾の一部の行から列幅を決めて設定する。
+
+    書き込み専用シートは行を追加する前に列幅を設定する必要があるため、全セルの再走査は行いません。
+    """
+    from openpyxl.utils import get_column_letter
+    sample = rows[:sample_size] + rows[-sample_size:]
+    widths = {}
+    for row in sample:
+        for col_num, value in enumerate(row, 1):
+            widths[col_num] = max(widths.get(col_num, 0), len(str(value)))
+    for col_num, column_width in widths.items():
+        sheet.column_dimensions[get_column_letter(col_num)].width = column_width + 2
+
+
+def append_sheet(workbook, title, rows):
+    """書き込み専用ブックにシートを追加し、行を書き出す"""
+    sheet = workbook.create_sheet(title=title)
+    set_column_widths(sheet, rows)
+    for row in rows:
+        sheet.append(row)
+
+
+def column_rows(columns, height, coords_data):
+    """
+    X座標ごとの輝度列をシートに書き込む行のリストとして返す。
+
+    各行は先頭にY座標、続いてX座標ごとに「輝度 → スケール（Y原点からの距離, 上が正）」の順に並びます。
+    """
+    y_values = np.arange(height)
+    header = ["y"]
+    series = []
+    for k, (x, y_origin, scale) in enumerate(coords_data):
+        header.append(f"Brightness x={x}")
+        header.append(f"Scale (mm) x={x}")
+        series.append(columns[:, k].astype(np.int64).tolist())
+        series.append(((y_origin - y_values) * scale).tolist())
+    return [header] + [[y, *values] for y, values in enumerate(zip(*series))]
+
+
+def _rectangle_job(job):
+    """1画像分の矩形切り出し（プロセスプールで実行される）"""
+    image_path, x_coord, y_coord, rect_width, rect_height = job
+    frame = open_frame(image_path)
+    reason = check_rectangle(*frame.size, x_coord, y_coord, rect_width, rect_height)
+    if reason:
+        return None, reason
+    # 非圧縮の BMP/TIFF は矩形部分のバイトだけを読み込む
+    return frame.luminance_region(x_coord, y_coord, rect_width, rect_height), None
+
+
+def _columns_job(job):
+    """1画像分の列切り出し（プロセスプールで実行される）"""
+    image_path, x_coords, y_origins = job
+    frame = open_frame(image_path)
+    width, height = frame.size
+    valid = [k for k, (x, y_origin) in enumerate(zip(x_coords, y_origins)) if 0 <= x < width and 0 <= y_origin < height]
+    return valid, frame.luminance_columns([x_coords[k] for k in valid])
+
+
+def map_frames(func, jobs, workers=1, chunksize=1):
+    """
+    jobs の各要素に func を適用し、結果を入力と同じ順序で返すイテレータ。
+
+    workers が2以上のときはプロセスプールで並列にデコードします。
+    """
+    if workers <= 1:
+        yield from map(func, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(func, jobs, chunksize=max(1, chunksize))
+
+
+def iter_rectangles(folder_path, image_files, x_coord, y_coord, rect_width, rect_height, workers=1, chunksize=1):
+    """
+    画像を順に処理し、(画像ファイル名, 矩形領域, スキップ理由) を返すイテレータ。
+
+    スキップした画像の矩形領域は None、切り出せた画像のスキップ理由は None になります。
+    """
+    jobs = [(os.path.join(folder_path, f), x_coord, y_coord, rect_width, rect_height) for f in image_files]
+    for image_file, (region, reason) in zip(image_files, map_frames(_rectangle_job, jobs, workers, chunksize)):
+        yield image_file, region, reason
+
+
+def iter_columns(folder_path, image_files, x_coords, y_origins, workers=1, chunksize=1):
+    """
+    画像を順に処理し、(画像ファイル名, 有効な座標の番号, 輝度列) を返すイテレータ。
+
+    輝度列は (高さ, 有効な座標の数) の配列です。
+    """
+    jobs = [(os.path.join(folder_path, f), x_coords, y_origins) for f in image_files]
+    for image_file, (valid, columns) in zip(image_files, map_frames(_columns_job, jobs, workers, chunksize)):
+        yield image_file, valid, columns
+
+
+def open_manifest(folder_path, save_path, params, incremental):
+    """
+    出力に対応するマニフェストを開き、処理する画像を決める。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        save_path (str): 出力ファイル（またはフォルダ）のパス。マニフェストはその隣に置かれます。
+        params (dict): 出力に影響するパラメータ。前回と異なる場合はすべての画像を処理し直します。
+        incremental (bool): False の場合、記録済みの画像も含めてすべての画像を処理します。
+
+    Returns:
+        tuple: (FrameManifest, 処理する画像ファイル名のリスト)
+    """
+    manifest = FrameManifest(save_path, dict(params, folder=os.path.abspath(folder_path)))
+    if not incremental:
+        manifest.frames = {}
+    return manifest, manifest.pending(folder_path, list_image_files(folder_path))
+
+
+def _write_excel(folder_path, save_path, manifest, image_files, sheets):
+    """
+    image_files を処理した sheets が返す (画像ファイル名, 行のリスト, スキップ理由) を書き込み専用ブックに保存する。
+
+    マニフェストに記録済みのシートは既存のファイルから順に写し、処理したシートと名前順に並べます。
+    途中で中断された場合も、処理済みのシートと既存のシートを保存してから例外を送出します。
+    """
+    import openpyxl  # 輝度キューブだけを使う場合は読み込まない
+    old_workbook = None
+    if manifest.frames and os.path.exists(save_path):
+        old_workbook = openpyxl.load_workbook(save_path, read_only=True)
+    replaced = {os.path.splitext(f)[0] for f in image_files}
+    old_titles = sorted(t for t in old_workbook.sheetnames if t not in replaced) if old_workbook else []
+
+    # 書き込み専用モードでは各シートが追加と同時に一時ファイルへ書き出されるため、
+    # メモリ使用量は1シート分の行データに収まる
+    workbook = openpyxl.Workbook(write_only=True)
+    skipped = []
+    copied = set()
+    metrics = run_metrics.current()
+
+    def copy_old_sheet(title):
+        with metrics.stage("excel_copy"):
+            append_sheet(workbook, title, [list(row) for row in old_workbook[title].iter_rows(values_only=True)])
+        copied.add(title)
+
+    try:
+        remaining = iter(old_titles)
+        next_old = next(remaining, None)
+        for image_file, rows, reason in metrics.timed("read_decode", sheets):
+            title = os.path.splitext(image_file)[0]
+            while next_old is not None and next_old < title:
+                copy_old_sheet(next_old)
+                next_old = next(remaining, None)
+            image_path = os.path.join(folder_path, image_file)
+            metrics.add("read_decode", bytes_read=os.path.getsize(image_path))
+            if reason:
+                skipped.append((image_file, reason))
+                manifest.record(image_path, reason)
+                continue
+            with metrics.stage("excel_sheets"):
+                append_sheet(workbook, title, rows)
+            manifest.record(image_path)
+    finally:
+        for title in old_titles:
+            if title not in copied:
+                copy_old_sheet(title)
+        if old_workbook:
+            old_workbook.close()
+        if workbook.worksheets:
+            # 保存が完了するまで既存のファイルとマニフェストは置き換えない
+            temp_path = os.path.splitext(save_path)[0] + ".partial.xlsx"
+            with metrics.stage("excel_save"):
+                workbook.save(temp_path)
+            metrics.add("excel_save", bytes_written=os.path.getsize(temp_path))
+            os.replace(temp_path, save_path)
+            manifest.save()
+
+    if not workbook.worksheets:
+        # 呼び出し元には skipped が返らないため、スキップの理由はメッセージに含める
+        lines = [f"{image_file}: {reason}" for image_file, reason in skipped[:SKIPPED_MESSAGE_LIMIT]]
+        if len(skipped) > SKIPPED_MESSAGE_LIMIT:
+            lines.append(f"ほか {len(skipped) - SKIPPED_MESSAGE_LIMIT} 件")
+        raise ValueError("保存できるシートがありません（すべての画像がスキップされました）。\n" + "\n".join(lines))
+    return skipped
+
+
+def write_cube(folder_path, manifest, frames, open_writer, checkpoint_interval=CHECKPOINT_INTERVAL, on_frame=None):
+    """
+    frames が返す (画像ファイル名, 輝度配列, スキップ理由) を輝度キューブに追記する。
+
+    checkpoint_interval フレームごとにキューブとマニフェストを保存するため、中断しても次回はその時点から再開します。
+    最初のフレームと大きさの異なるフレームはスキップします。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        manifest (FrameManifest): open_manifest で開いたマニフェスト。処理したフレームを記録します。
+        frames (iterable): (画像ファイル名, 輝度配列, スキップ理由) を返すイテレータ。
+        open_writer (callable): 最初のフレームの形状を受け取って BrightnessCubeWriter を作成する関数。
+        checkpoint_interval (int): キューブとマニフェストを保存する間隔（フレーム数）。
+        on_frame (callable): 各フレームの処理後に (画像ファイル名, スキップ理由) で呼び出す関数（省略可能）。
+
+    Returns:
+        list: スキップした画像の (画像ファイル名, 理由) のリスト。
+    """
+    skipped = []
+    cube = None
+    metrics = run_metrics.current()
+    try:
+        for count, (image_file, frame, reason) in enumerate(metrics.timed("read_decode", frames), 1):
+            image_path = os.path.join(folder_path, image_file)
+            metrics.add("read_decode", bytes_read=os.path.getsize(image_path))
+            if not reason:
+                if cube is None:
+                    cube = open_writer(frame.shape)
+                if frame.shape != cube.frame_shape:
+                    reason = "画像の大きさが他のフレームと一致しません。"
+            if reason:
+                skipped.append((image_file, reason))
+                manifest.record(image_path, reason)
+            else:
+                with metrics.stage("cube_write"):
+                    cube.append(frame, os.path.splitext(image_file)[0], frame_timestamp(image_path))
+                metrics.add("cube_write", bytes_written=frame.nbytes)
+                manifest.record(image_path)
+            if count % checkpoint_interval == 0:
+                with metrics.stage("cube_write"):
+                    if cube is not None:
+                        cube.flush()
+                    manifest.save()
+            if on_frame:
+                on_frame(image_file, reason)
+    finally:
+        # キューブを書き終えてからマニフェストを保存する
+        if cube is not None:
+            cube.close()
+        manifest.save()
+    return skipped
+
+
+def extract_rectangle_to_excel(folder_path, x_coord, y_coord, rect_width, rect_height, save_path, workers=1, chunksize=1, incremental=False):
+    """
+    フォルダ内の全画像から矩形領域の輝度値を切り出し、画像ごとに1シートのExcelファイルへ保存します。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        x_coord (int): 矩形左上のX座標。
+        y_coord (int): 矩形左上のY座標。
+        rect_width (int): 矩形の幅。
+        rect_height (int): 矩形の高さ。
+        save_path (str): 保存先のExcelファイルのパス。
+        workers (int): デコードに使うプロセス数（1なら並列化しない）。
+        chunksize (int): 1回にワーカーへ渡す画像数。
+        incremental (bool): True の場合、マニフェストに記録済みで変更のない画像は処理せず既存の出力を引き継ぎます。
+
+    Returns:
+        list: スキップした (画像ファイル名, 理由) のリスト。
+    """
+    params = {"mode": "rectangle", "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height}
+    manifest, image_files = open_manifest(folder_path, save_path, params, incremental)
+    if not image_files and manifest.frames:
+        return []
+
+    sheets = (
+        (image_file, None if reason else rectangle_rows(region, x_coord, y_coord), reason)
+        for image_file, region, reason in iter_rectangles(folder_path, image_files, x_coord, y_coord, rect_width, rect_height, workers, chunksize)
+    )
+    return _write_excel(folder_path, save_path, manifest, image_files, sheets)
+
+
+def extract_rectangle_to_cube(folder_path, x_coord, y_coord, rect_width, rect_height, save_path, workers=1, chunksize=1, incremental=False):
+    """
+    矩形領域の輝度値を輝度キューブ (.npy とインデックス) に保存します。
+
+    引数と戻り値は extract_rectangle_to_excel と同じです。
+    """
+    params = {"mode": "rectangle", "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height}
+    manifest, image_files = open_manifest(folder_path, save_path, params, incremental)
+
+    def open_writer(frame_shape):
+        return BrightnessCubeWriter(
+            save_path, frame_shape, np.uint8,
+            x_coords=range(x_coord, x_coord + rect_width),
+            y_coords=range(y_coord, y_coord + rect_height),
+            metadata=params, append=incremental,
+        )
+
+    frames = iter_rectangles(folder_path, image_files, x_coord, y_coord, rect_width, rect_height, workers, chunksize)
+    return write_cube(folder_path, manifest, frames, open_writer)
+
+
+def extract_columns_to_excel(folder_path, x_coords, y_origins, scales, save_path, workers=1, chunksize=1, incremental=False):
+    """
+    フォルダ内の全画像から指定したX座標の輝度列を取り出し、スケールとともにExcelファイルへ保存します。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        x_coords (list): 輝度を取り出すX座標のリスト。
+        y_origins (list): X座標ごとのY原点。
+        scales (list): X座標ごとのスケール (mm/pixel)。
+        save_path (str): 保存先のExcelファイルのパス。
+        workers (int): デコードに使うプロセス数（1なら並列化しない）。
+        chunksize (int): 1回にワーカーへ渡す画像数。
+        incremental (bool): True の場合、マニフェストに記録済みで変更のない画像は処理せず既存の出力を引き継ぎます。
+
+    Returns:
+        list: スキップした (画像ファイル名, 理由) のリスト。
+    """
+    params = {"mode": "columns", "x_coords": list(x_coords), "y_origins": list(y_origins), "scales": list(scales)}
+    manifest, image_files = open_manifest(folder_path, save_path, params, incremental)
+    if not image_files and manifest.frames:
+        return []
+
+    def sheets():
+        for image_file, valid, columns in iter_columns(folder_path, image_files, x_coords, y_origins, workers, chunksize):
+            if not valid:
+                yield image_file, None, "有効な座標が画像の範囲外です。"
+                continue
+            coords_data = [(x_coords[k], y_origins[k], scales[k]) for k in valid]
+            yield image_file, column_rows(columns, columns.shape[0], coords_data), None
+
+    return _write_excel(folder_path, save_path, manifest, image_files, sheets())
+
+
+def extract_columns_to_cube(folder_path, x_coords, y_origins, scales, save_path, workers=1, chunksize=1, incremental=False):
+    """
+    指定したX座標の輝度列を輝度キューブ (.npy とインデックス) に保存します。
+
+    キューブの各フレームは (高さ, X座標の数) の配列で、すべての座標が画像内にあるフレームだけを保存します。
+    引数と戻り値は extract_columns_to_excel と同じです。
+    """
+    params = {"mode": "columns", "x_coords": list(x_coords), "y_origins": list(y_origins), "scales": list(scales)}
+    manifest, image_files = open_manifest(folder_path, save_path, params, incremental)
+
+    def open_writer(frame_shape):
+        # フレームの高さは最初に保存する画像に合わせる
+        return BrightnessCubeWriter(
+            save_path, frame_shape, np.uint8,
+            x_coords=x_coords, y_coords=range(frame_shape[0]),
+            metadata=params, append=incremental,
+        )
+
+    def frames():
+        for image_file, valid, columns in iter_columns(folder_path, image_files, x_coords, y_origins, workers, chunksize):
+            reason = None if len(valid) == len(x_coords) else "有効な座標が画像の範囲外です。"
+            yield image_file, columns, reason
+
+    return write_cube(folder_path, manifest, frames(), open_writer)
+
+
+def _watch_frames(folder_path, manifest, stop_event, poll_interval, job):
+    """フォルダを監視し、書き込みが完了したフレームごとに job の結果を (画像ファイル名, 輝度配列, スキップ理由) で返す"""
+    watcher = FolderWatcher(folder_path, IMAGE_EXTENSIONS, poll_interval, known=manifest.frames)
+    for ready in watcher.watch(stop_event):
+        for image_file in ready:
+            try:
+                result = job(os.path.join(folder_path, image_file))
+            except (OSError, ValueError) as e:
+                # 書き込み途中のファイルは次回のポーリングで読み直す
+                if watcher.requeue(image_file):
+                    continue
+                result = None, f"画像を読み込めません: {e}"
+            yield (image_file,) + result
+
+
+def watch_rectangle_to_cube(folder_path, x_coord, y_coord, rect_width, rect_height, save_path, stop_event, poll_interval=0.5, on_frame=None):
+    """
+    撮影中のフォルダを監視し、新しいフレームの矩形領域を輝度キューブに逐次追記します。
+
+    stop_event（threading.Event）がセットされるまで処理を続けます。マニフェストに記録済みの画像は処理せず、
+    各フレームの追記後にキューブとマニフェストを保存するため、読み込み側からはすぐに参照できます。
+
+    Returns:
+        list: スキップした (画像ファイル名, 理由) のリスト。
+    """
+    params = {"mode": "rectangle", "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height}
+    manifest, _ = open_manifest(folder_path, save_path, params, incremental=True)
+
+    def open_writer(frame_shape):
+        return BrightnessCubeWriter(
+            save_path, frame_shape, np.uint8,
+            x_coords=range(x_coord, x_coord + rect_width),
+            y_coords=range(y_coord, y_coord + rect_height),
+            metadata=params, append=True,
+        )
+
+    def job(image_path):
+        return _rectangle_job((image_path, x_coord, y_coord, rect_width, rect_height))
+
+    frames = _watch_frames(folder_path, manifest, stop_event, poll_interval, job)
+    return write_cube(folder_path, manifest, frames, open_writer, checkpoint_interval=1, on_frame=on_frame)
+
+
+def watch_columns_to_cube(folder_path, x_coords, y_origins, scales, save_path, stop_event, poll_interval=0.5, on_frame=None):
+    """
+    撮影中のフォルダを監視し、新しいフレームの輝度列を輝度キューブに逐次追記します。
+
+    引数は extract_columns_to_cube と watch_rectangle_to_cube を参照してください。
+    """
+    params = {"mode": "columns", "x_coords": list(x_coords), "y_origins": list(y_origins), "scales": list(scales)}
+    manifest, _ = open_manifest(folder_path, save_path, params, incremental=True)
+
+    def open_writer(frame_shape):
+        return BrightnessCubeWriter(
+            save_path, frame_shape, np.uint8,
+            x_coords=x_coords, y_coords=range(frame_shape[0]),
+            metadata=params, append=True,
+        )
+
+    def job(image_path):
+        valid, columns = _columns_job((image_path, x_coords, y_origins))
+        return columns, None if len(valid) == len(x_coords) else "有効な座標が画像の範囲外です。"
+
+    frames = _watch_frames(folder_path, manifest, stop_event, poll_interval, job)
+    return write_cube(folder_path, manifest, frames, open_writer, checkpoint_interval=1, on_frame=on_frame)
+
+
+def crop_images(folder_path, x_coord, y_coord, rect_width, rect_height, save_folder, incremental=False):
+    """
+    フォルダ内の全画像から矩形領域を切り抜き、"cropped_元のファイル名" として保存します。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        x_coord (int): 矩形左上のX座標。
+        y_coord (int): 矩形左上のY座標。
+        rect_width (int): 矩形の幅。
+        rect_height (int): 矩形の高さ。
+        save_folder (str): 保存先のフォルダのパス。
+        incremental (bool): True の場合、マニフェストに記録済みで変更のない画像は処理しません。
+
+    Returns:
+        list: スキップした (画像ファイル名, 理由) のリスト。
+    """
+    params = {"mode": "crop", "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height}
+    manifest, image_files = open_manifest(folder_path, save_folder, params, incremental)
+    skipped = []
+    metrics = run_metrics.current()
+    try:
+        for count, image_file in enumerate(image_files, 1):
+            image_path = os.path.join(folder_path, image_file)
+            with metrics.stage("read_decode"):
+                frame = open_frame(image_path)
+                reason = check_rectangle(*frame.size, x_coord, y_coord, rect_width, rect_height)
+                if not reason:
+                    # 非圧縮の BMP/TIFF は矩形部分だけを読み込み、それ以外は画像全体をデコードして切り抜く
+                    cropped_img = frame.image_region(x_coord, y_coord, rect_width, rect_height)
+                    if cropped_img is None:
+                        with Image.open(image_path) as img:
+                            cropped_img = img.crop((x_coord, y_coord, x_coord + rect_width, y_coord + rect_height))
+            metrics.add("read_decode", items=1, bytes_read=os.path.getsize(image_path))
+            if reason:
+                skipped.append((image_file, reason))
+            else:
+                output_path = os.path.join(save_folder, f"cropped_{image_file}")
+                with metrics.stage("image_write"):
+                    cropped_img.save(output_path)
+                metrics.add("image_write", items=1, bytes_written=os.path.getsize(output_path))
+            manifest.record(image_path, reason)
+            if count % CHECKPOINT_INTERVAL == 0:
+                manifest.save()
+    finally:
+        manifest.save()
+    return skipped
@@ -0,0 +1,220 @@
+# ファイル名: brightness_histogram.py
+"""
+画像の輝度統計（平均・ヒストグラム・パーセンタイル）の計算。
+
+画像は一度だけデコードし、輝度配列からヒストグラムを整数の bincount で数えます。
+平均とパーセンタイルはヒストグラムから求めるため、輝度配列そのものは保持しません。
+
+フォルダ内の全フレームのヒストグラムは (フレーム数, ビン数) の行列として輝度キューブ形式で保存し、
+タイムスタンプはキューブのインデックスに記録します。
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+from brightness_cube import BrightnessCubeWriter, load_cube
+from brightness_extraction import map_frames, open_manifest, write_cube
+from image_preview import make_preview
+
+ANALYSIS_CACHE_SIZE = 16
+SERIES_CHUNK_FRAMES = 256
+HEATMAP_MAX_BINS = 256
+HEATMAP_MAX_FRAMES = 2000
+SIXTEEN_BIT_MODES = ("I;16", "I;16L", "I;16B", "I;16N")
+
+
+def image_luminance(img):
+    """
+    デコード済みの画像を輝度配列に変換する。
+
+    16ビットのグレースケール画像は uint16 のまま、それ以外は convert("L") で uint8 に変換します。
+    """
+    if img.mode in SIXTEEN_BIT_MODES:
+        return np.asarray(img).astype(np.uint16, copy=False)
+    return np.asarray(img.convert("L"))
+
+
+def luminance_histogram(luminance):
+    """輝度配列のヒストグラム（8ビットなら256, 16ビットなら65536ビン）を整数で数える"""
+    bins = 65536 if luminance.dtype == np.uint16 else 256
+    return np.bincount(luminance.ravel(), minlength=bins)
+
+
+def histogram_mean(histogram):
+    """ヒストグラムから平均輝度を求める"""
+    return float(np.dot(histogram, np.arange(len(histogram), dtype=np.float64)) / histogram.sum())
+
+
+def histogram_percentiles(histogram, percentiles):
+    """
+    ヒストグラムからパーセンタイルを求める。
+
+    np.percentile の既定（線形補間）と同じ値を返します。
+    """
+    cumulative = np.cumsum(histogram)
+    positions = np.asarray(percentiles, dtype=np.float64) / 100 * (cumulative[-1] - 1)
+    lower = np.floor(positions)
+    # 並べ替えた輝度の k 番目の値は、累積度数が k を超える最初のビン
+    lower_values = np.searchsorted(cumulative, lower, side="right")
+    upper_values = np.searchsorted(cumulative, np.ceil(positions), side="right")
+    return lower_values + (upper_values - lower_values) * (positions - lower)
+
+
+class BrightnessAnalysis:
+    """1枚の画像の輝度統計と表示用サムネイル"""
+
+    def __init__(self, histogram, thumbnail=None):
+        self.histogram = histogram
+        self.thumbnail = thumbnail
+        self.pixel_count = int(histogram.sum())
+        self.mean = histogram_mean(histogram)
+
+    @property
+    def max_value(self):
+        return len(self.histogram) - 1
+
+    def percentiles(self, percentiles=(5, 50, 95)):
+        return histogram_percentiles(self.histogram, percentiles)
+
+
+def analyze_image(image_path, thumbnail_size=None):
+    """
+    画像を一度だけデコードして輝度統計を計算する。
+
+    Args:
+        image_path (str): 画像ファイルのパス。
+        thumbnail_size (tuple): 指定した場合、同じデコード結果から (幅, 高さ) に収まるサムネイルも作ります。
+
+    Returns:
+        BrightnessAnalysis: 輝度統計。
+    """
+    with Image.open(image_path) as img:
+        img.load()
+        luminance = image_luminance(img)
+        thumbnail = None
+        if thumbnail_size:
+            # 16ビット画像は Tk で表示できないため上位8ビットを使う
+            source = Image.fromarray((luminance >> 8).astype(np.uint8)) if luminance.dtype == np.uint16 else img
+            thumbnail = make_preview(source, thumbnail_size)
+    return BrightnessAnalysis(luminance_histogram(luminance), thumbnail)
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def _load_analysis(image_path, mtime_ns, file_size, thumbnail_size):
+    return analyze_image(image_path, thumbnail_size)
+
+
+def load_analysis(image_path, thumbnail_size=None):
+    """
+    analyze_image の結果をパスごとにキャッシュして返す。
+
+    キャッシュはファイルの更新日時とサイズで区別するため、上書きされた画像は読み直します。
+    """
+    stat = os.stat(image_path)
+    size = tuple(thumbnail_size) if thumbnail_size else None
+    return _load_analysis(os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, size)
+
+
+def _histogram_job(image_path):
+    """1画像分のヒストグラム（プロセスプールで実行される）"""
+    try:
+        with Image.open(image_path) as img:
+            return luminance_histogram(image_luminance(img)).astype(np.uint32), None
+    except (OSError, ValueError) as e:
+        return None, f"画像を読み込めません: {e}"
+
+
+def histogram_time_series(folder_path, save_path, workers=1, chunksize=4, incremental=False, on_frame=None):
+    """
+    フォルダ内の全画像のヒストグラムを (フレーム数, ビン数) の行列として輝度キューブに保存します。
+
+    8ビット画像は256ビン、16ビット画像は65536ビンで数えます。行列はフレームごとにファイルへ追記するため、
+    フレーム数が多くてもメモリ使用量は増えません。
+
+    Args:
+        folder_path (str): 画像フォルダのパス。
+        save_path (str): 保存先の .npy ファイルのパス。
+        workers (int): 並列にデコードするプロセス数。
+        chunksize (int): 1回にワーカーへ渡す画像の数。
+        incremental (bool): True の場合、前回から変更のない画像は処理しません。
+        on_frame (callable): 各フレームの処理後に (画像ファイル名, スキップ理由) で呼び出す関数（省略可能）。
+
+    Returns:
+        list: スキップした (画像ファイル名, 理由) のリスト。
+    """
+    params = {"mode": "histogram"}
+    manifest, image_files = open_manifest(folder_path, save_path, params, incremental)
+
+    def open_writer(frame_shape):
+        return BrightnessCubeWriter(
+            save_path, frame_shape, np.uint32,
+            x_coords=range(frame_shape[0]), y_coords=[],
+            metadata=params, append=incremental,
+        )
+
+    def frames():
+        jobs = [os.path.join(folder_path, f) for f in image_files]
+        for image_file, (histogram, reason) in zip(image_files, map_frames(_histogram_job, jobs, workers, chunksize)):
+            yield image_file, histogram, reason
+
+    return write_cube(folder_path, manifest, frames(), open_writer, on_frame=on_frame)
+
+
+def load_histogram_series(path):
+    """
+    histogram_time_series で保存した行列を読み込む。
+
+    Returns:
+        tuple: ((フレーム数, ビン数) の読み取り専用 memmap, タイムスタンプのリスト, 平均輝度の配列)。
+    """
+    histograms, index = load_cube(path)
+    timestamps = [frame["timestamp"] for frame in index["frames"]]
+    values = np.arange(histograms.shape[1], dtype=np.float64)
+    means = np.empty(len(histograms))
+    # 65536ビンの行列は大きいため、一定のフレーム数ずつ読み込んで計算する
+    for start in range(0, len(histograms), SERIES_CHUNK_FRAMES):
+        chunk = np.asarray(histograms[start:start + SERIES_CHUNK_FRAMES], dtype=np.float64)
+        means[start:start + len(chunk)] = chunk @ values / chunk.sum(axis=1)
+    return histograms, timestamps, means
+
+
+def _downsample(histograms, max_frames, max_bins):
+    """ヒートマップ表示用に、フレームは平均、ビンは合計で縮小する"""
+    frame_step = -(-len(histograms) // max_frames)
+    bin_step = -(-histograms.shape[1] // max_bins)
+    rows = []
+    for start in range(0, len(histograms), frame_step):
+        block = np.asarray(histograms[start:start + frame_step], dtype=np.float64).mean(axis=0)
+        padded = np.pad(block, (0, -len(block) % bin_step))
+        rows.append(padded.reshape(-1, bin_step).sum(axis=1))
+    return np.array(rows), frame_step, bin_step
+
+
+def export_heatmap(series_path, image_path, log_scale=True):
+    """
+    ヒストグラムの時系列をヒートマップ画像（横軸: フレーム, 縦軸: 輝度）として保存します。
+
+    フレーム数やビン数が多い場合は表示できる大きさまで平均・合計して縮小します。
+    """
+    from matplotlib.figure import Figure  # GUIを使わない書き出しのため pyplot は読み込まない
+
+    histograms, timestamps, means = load_histogram_series(series_path)
+    if not len(histograms):
+        raise ValueError("ヒストグラムが保存されていません。")
+    heatmap, frame_step, bin_step = _downsample(histograms, HEATMAP_MAX_FRAMES, HEATMAP_MAX_BINS)
+    if log_scale:
+        heatmap = np.log1p(heatmap)
+
+    fig = Figure(figsize=(10, 5), dpi=100)
+    ax = fig.add_subplot(111)
+    extent = (0, len(histograms), 0, heatmap.shape[1] * bin_step)
+    image = ax.imshow(heatmap.T, origin="lower", aspect="auto", cmap="viridis", extent=extent, interpolation="nearest")
+    ax.plot(np.arange(len(means)) + 0.5, means, color="white", linewidth=0.8, label="mean")
+    ax.set_xlabel(f"frame ({timestamps[0]} - {timestamps[-1]})")
+    ax.set_ylabel("brightness")
+    ax.legend(loc="upper right")
+    fig.colorbar(image, ax=ax, label="log(1 + pixels)" if log_scale else "pixels")
+    fig.tight_layout()
+    fig.savefig(image_path)
@@ -1,6 +1,12 @@
+import argparse
+import json
 import os
 import subprocess
 import sys
+import tempfile
+import time
+
+from launcher import TOOLS
 
 def build_executable(script_path, output_name=None, add_data=None, windowed=True):
     """
@@ -36,22 +42,118 @@ def build_executable(script_path, output_name=None, add_data=None, windowed=True
         print(f"ビルド中にエラーが発生しました: {e}")
         sys.exit(1)
 
-if __name__ == "__main__":
-    # パッケージ化対象スクリプト
-    script_to_package = "gui_brightness_histogram.py"
+def build_launcher(output_name="ImageTools", add_data=None, windowed=True):
+    """
+    すべてのツールを1つのフォルダ形式 (--onedir) の実行環境にまとめ、launcher.py から起動できるようにします。
+
+    numpy・cv2・pandas などはツールごとにコピーされず1つのフォルダで共有され、
+    --onefile のように起動のたびに一時フォルダへ展開されることもありません。
+    ツールのモジュールはランチャーから実行時に読み込むため、--hidden-import で明示的に含めます。
+
+    Args:
+        output_name (str): 出力フォルダと実行可能ファイルの名前。
+        add_data (list): 含める追加データ（例: ["source_path;destination_path"]）。
+        windowed (bool): GUIモードでパッケージ化する場合はTrue。
 
-    # 出力実行可能ファイル名
-    executable_name = "BrightnessHistogramApp"
+    Returns:
+        str: ビルドした実行可能ファイルのパス。
+    """
+    options = ["pyinstaller", "--onedir", "--noconfirm", "--name", output_name]
+
+    if windowed:
+        options.append("--windowed")
+
+    for module_name, _ in TOOLS + [("cli", None)]:
+        options.extend(["--hidden-import", module_name])
+
+    if add_data:
+        for data in add_data:
+            options.extend(["--add-data", data])
+
+    options.append("launcher.py")
+
+    try:
+        print("ランチャーのビルド開始...")
+        subprocess.run(options, check=True)
+        print(f"ビルド完了: dist/{output_name} フォルダを確認してください。")
+    except subprocess.CalledProcessError as e:
+        print(f"ビルド中にエラーが発生しました: {e}")
+        sys.exit(1)
+
+    executable = os.path.join("dist", output_name, output_name + (".exe" if os.name == "nt" else ""))
+    return executable
+
+def measure_startup_times(command, repeat=3):
+    """
+    ランチャーで各ツールを起動し、ツールのモジュールを読み込み終わるまでの時間を測定します。
+
+    プロセスの起動から終了までの時間（実行ファイルの起動とライブラリの読み込みを含む）と、
+    そのうちツールのモジュールの読み込みにかかった時間を、それぞれ repeat 回の最小値で返します。
+
+    Args:
+        command (list): ランチャーを起動するコマンド（例: ["dist/ImageTools/ImageTools.exe"]）。
+        repeat (int): 測定回数。
+
+    Returns:
+        dict: モジュール名 -> {"startup_seconds": 秒, "import_seconds": 秒}
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report_path = os.path.join(temp_dir, "startup.json")
+        for module_name, _ in TOOLS:
+            startup_times, import_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(command + ["--measure-startup", module_name, report_path], check=True)
+                startup_times.append(time.perf_counter() - start)
+                with open(report_path, encoding="utf-8") as f:
+                    import_times.append(json.load(f)["import_seconds"])
+            results[module_name] = {"startup_seconds": min(startup_times), "import_seconds": min(import_times)}
+    return results
+
+def report_startup_times(results, report_path=None):
+    """起動時間の一覧を表示し、report_path が指定されていれば JSON として保存します。"""
+    print(f"{'ツール':<30}{'起動 (秒)':>12}{'読み込み (秒)':>16}")
+    for module_name, times in results.items():
+        print(f"{module_name:<30}{times['startup_seconds']:>12.2f}{times['import_seconds']:>16.2f}")
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"起動時間を保存しました: {report_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ツールを実行可能ファイルにパッケージ化します。")
+    parser.add_argument("--launcher", action="store_true",
+                        help="すべてのツールを1つのフォルダ形式の実行環境とランチャーにまとめる")
+    parser.add_argument("--measure-only", action="store_true",
+                        help="ビルドせず、Pythonから launcher.py を実行して起動時間だけを測定する")
+    args = parser.parse_args()
 
     # 追加データ（フォントなど）
     additional_data = [
         "C:/Windows/Fonts/meiryo.ttc;."
     ]
 
-    # 実行可能ファイルをビルド
-    build_executable(
-        script_path=script_to_package,
-        output_name=executable_name,
-        add_data=additional_data,
-        windowed=True
-    )
+    if args.measure_only:
+        report_startup_times(measure_startup_times([sys.executable, "launcher.py"]))
+    elif args.launcher:
+        # ランチャーをビルドし、ツールごとの起動時間を測定してビルドの出力フォルダに保存
+        executable = build_launcher(output_name="ImageTools", add_data=additional_data, windowed=True)
+        report_startup_times(
+            measure_startup_times([executable]),
+            os.path.join(os.path.dirname(executable), "startup_times.json"),
+        )
+    else:
+        # パッケージ化対象スクリプト
+        script_to_package = "gui_brightness_histogram.py"
+
+        # 出力実行可能ファイル名
+        executable_name = "BrightnessHistogramApp"
+
+        # 実行可能ファイルをビルド
+        build_executable(
+            script_path=script_to_package,
+            output_name=executable_name,
+            add_data=additional_data,
+            windowed=True
+        )
@@ -0,0 +1,107 @@
+import csv
+import time
+from pathlib import Path
+
+import numpy as np
+
+from brightness_cube import BrightnessCubeWriter
+from frame_reader import luma
+
+
+def parse_rois(text):
+    """Parse "x,y,w,h; x,y,w,h" into a list of (x, y, w, h) tuples."""
+    rois = []
+    for part in text.split(";"):
+        if part.strip():
+            values = [int(v.strip()) for v in part.split(",")]
+            if len(values) != 4:
+                raise ValueError(f"ROI must be x,y,w,h: {part.strip()}")
+            rois.append(tuple(values))
+    return rois
+
+
+def parse_columns(text):
+    """Parse "x1,x2,..." into a list of column x-coordinates."""
+    return [int(v.strip()) for v in text.split(",") if v.strip()]
+
+
+class CaptureAnalytics:
+    """
+    Computes brightness analytics from frames while they are still in memory.
+
+    For every frame the mean brightness (and the mean of each ROI) is appended to
+    brightness.csv, and the ROI rectangles and column profiles are appended to brightness
+    cubes in the same layout as the file-based extractors write, so the usual tools can
+    read them without decoding the saved images again.
+    """
+
+    def __init__(self, save_dir, frame_size, rois=(), columns=(), flush_interval=2.0):
+        width, height = frame_size
+        for x, y, w, h in rois:
+            if not (0 <= x and 0 <= y and w > 0 and h > 0 and x + w <= width and y + h <= height):
+                raise ValueError(f"ROI {x},{y},{w},{h} is outside the {width}x{height} frame")
+        for x in columns:
+            if not 0 <= x < width:
+                raise ValueError(f"Column {x} is outside the {width}x{height} frame")
+
+        self.rois = list(rois)
+        self.columns = list(columns)
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+        self.output_dir = Path(save_dir) / "analytics"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        self.roi_cubes = [
+            BrightnessCubeWriter(
+                str(self.output_dir / f"roi_{i + 1}_{x}_{y}_{w}x{h}.npy"), (h, w), np.uint8,
+                x_coords=range(x, x + w), y_coords=range(y, y + h),
+                metadata={"mode": "rectangle", "x": x, "y": y, "width": w, "height": h},
+            )
+            for i, (x, y, w, h) in enumerate(self.rois)
+        ]
+        self.column_cube = None
+        if self.columns:
+            self.column_cube = BrightnessCubeWriter(
+                str(self.output_dir / "columns.npy"), (height, len(self.columns)), np.uint8,
+                x_coords=self.columns, y_coords=range(height),
+                metadata={"mode": "columns", "x_coords": self.columns},
+            )
+
+        csv_path = self.output_dir / "brightness.csv"
+        is_new = not csv_path.exists()
+        self._csv_file = open(csv_path, "a", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._csv_file)
+        if is_new:
+            self._csv.writerow(["timestamp", "frame", "mean"] + [f"roi_{i + 1}_mean" for i in range(len(self.rois))])
+
+    def process(self, frame, name, timestamp):
+        """Analyze one BGR frame and append the results."""
+        # Same integer luma as the file-based extractors, so a later re-analysis of the saved frames matches exactly
+        luminance = luma(frame, "bgr")
+        roi_means = []
+        for (x, y, w, h), cube in zip(self.rois, self.roi_cubes):
+            region = luminance[y:y + h, x:x + w]
+            cube.append(region, name, timestamp)
+            roi_means.append(float(region.mean()))
+        if self.column_cube is not None:
+            self.column_cube.append(luminance[:, self.columns], name, timestamp)
+        self._csv.writerow([timestamp, name, float(luminance.mean())] + roi_means)
+        # Rewriting the cube indexes on every frame would cost more than the analysis itself
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Make the results written so far visible to readers."""
+        self._csv_file.flush()
+        for cube in self.roi_cubes:
+            cube.flush()
+        if self.column_cube is not None:
+            self.column_cube.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self._csv_file.close()
+        for cube in self.roi_cubes:
+            cube.close()
+        if self.column_cube is not None:
+            self.column_cube.close()
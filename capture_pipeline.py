@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+
+
+class PeriodicSchedule:
+    """
+    Fixed-rate schedule on the monotonic clock.
+
+    Capture slots are start + n * interval, so time spent reading, encoding or writing a
+    frame does not accumulate into drift. When a slot is missed entirely it is skipped
+    rather than captured late.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.start = time.monotonic()
+        self.index = 0
+        self.missed = 0
+        self._first_capture = None
+        self._last_capture = None
+        self._captures = 0
+
+    def wait(self, keep_running, resolution=0.1):
+        """Sleep until the next slot. Returns False if keep_running() turned false meanwhile."""
+        target = self.start + self.index * self.interval
+        now = time.monotonic()
+        if now > target + self.interval:
+            skipped = int((now - target) // self.interval)
+            self.missed += skipped
+            self.index += skipped
+            target = self.start + self.index * self.interval
+        while keep_running():
+            remaining = target - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, resolution))
+        self.index += 1
+        return keep_running()
+
+    def mark_capture(self):
+        now = time.monotonic()
+        if self._first_capture is None:
+            self._first_capture = now
+        self._last_capture = now
+        self._captures += 1
+
+    @property
+    def actual_period(self):
+        """Mean period between captured frames so far (None before the second frame)."""
+        if self._captures < 2:
+            return None
+        return (self._last_capture - self._first_capture) / (self._captures - 1)
+
+
+class FrameWriterPool:
+    """
+    Pool of threads that encode and write frames handed over through a bounded queue.
+
+    cv2.imencode and file writes release the GIL, so several frames can be encoded in
+    parallel while the capture thread keeps to its schedule. When the queue is full the
+    new frame is dropped and counted instead of blocking the capture thread.
+    """
+
+    def __init__(self, write_frame, workers=2, max_queue=8):
+        self.write_frame = write_frame
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.errors = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(max(1, workers))]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    @property
+    def max_queue(self):
+        return self.queue.maxsize
+
+    def submit(self, *args):
+        """Queue a frame for writing. Returns False if it had to be dropped."""
+        try:
+            self.queue.put_nowait(args)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.write_frame(*item)
+                with self._lock:
+                    self.written += 1
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = e
+
+    def close(self):
+        """Write out every queued frame and stop the threads."""
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
@@ -0,0 +1,287 @@
+# ファイル名: cell_cache.py
+"""
+セル抽出用の列指向キャッシュ。
+
+ブックを一度読み込んだときに、各シートの使用範囲を数値の配列として保存しておき、
+以降はどのセルを指定されてもブックを開かずにキャッシュから答えます。
+
+キャッシュはブックごとに1つのフォルダで、次のファイルからなります。
+    values.npy  全シートのセル値を行優先で連結した float64 の配列
+    kinds.npy   各セルの種類（空・小数・整数・真偽値・その他）の uint8 配列
+    index.json  ブックのパス・サイズ・更新日時、シート名と日時、各シートの形状と配列内の位置、
+                文字列や日付など数値でない値の一覧
+
+ブックのサイズか更新日時が変わるとキャッシュは作り直します。キャッシュフォルダ全体の大きさは
+上限を超えると、最後に使ってから最も時間が経ったブックのキャッシュから削除します。
+"""
+import hashlib
+import json
+import os
+import shutil
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import openpyxl
+
+CACHE_VERSION = 1
+MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+# セルの種類（kinds.npy の値）
+EMPTY, FLOAT, INT, BOOL, OTHER = range(5)
+
+# float64 で正確に表せる整数の範囲
+_MAX_EXACT_INT = 2 ** 53
+
+
+def default_cache_dir():
+    """ユーザーごとのキャッシュフォルダ（Windows では LOCALAPPDATA 配下）"""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ExcelExtractor", "cell_cache")
+
+
+def _encode_other(value):
+    """数値でないセル値を JSON に保存できる [型, 値] に変換する"""
+    if isinstance(value, datetime):
+        return ["datetime", value.isoformat()]
+    if isinstance(value, date):
+        return ["date", value.isoformat()]
+    if isinstance(value, time):
+        return ["time", value.isoformat()]
+    if isinstance(value, timedelta):
+        return ["timedelta", value.total_seconds()]
+    if isinstance(value, int):
+        return ["int", str(value)]
+    return ["str", str(value)]
+
+
+def _decode_other(encoded):
+    kind, value = encoded
+    if kind == "datetime":
+        return datetime.fromisoformat(value)
+    if kind == "date":
+        return date.fromisoformat(value)
+    if kind == "time":
+        return time.fromisoformat(value)
+    if kind == "timedelta":
+        return timedelta(seconds=value)
+    if kind == "int":
+        return int(value)
+    return value
+
+
+def _encode_rows(rows, width, others):
+    """シートの行のリストを (値, 種類) の2次元配列に変換する（数値でない値は others に追加）"""
+    values = np.zeros((len(rows), width), np.float64)
+    kinds = np.zeros((len(rows), width), np.uint8)
+    for r, row in enumerate(rows):
+        for c, value in enumerate(row):
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                values[r, c], kinds[r, c] = value, BOOL
+            elif isinstance(value, int) and abs(value) <= _MAX_EXACT_INT:
+                values[r, c], kinds[r, c] = value, INT
+            elif isinstance(value, float):
+                values[r, c], kinds[r, c] = value, FLOAT
+            else:
+                values[r, c], kinds[r, c] = len(others), OTHER
+                others.append(_encode_other(value))
+    return values, kinds
+
+
+class CachedWorkbook:
+    """
+    キャッシュから読み込んだブック。
+
+    Attributes:
+        sheet_names (list): シート名（ブック内の順序）。
+        timestamps (list): 各シート名の先頭14桁から求めた日時（ISO形式の文字列、日時がなければ None）。
+    """
+
+    def __init__(self, folder, index):
+        self.index = index
+        self.sheet_names = index["sheet_names"]
+        self.timestamps = index["timestamps"]
+        self.shapes = np.array(index["shapes"], np.int64).reshape(-1, 2)
+        self.offsets = np.array(index["offsets"], np.int64)
+        self.others = index["others"]
+        self.values = np.load(os.path.join(folder, "values.npy"), mmap_mode="r")
+        self.kinds = np.load(os.path.join(folder, "kinds.npy"), mmap_mode="r")
+
+    def sheet_order(self, sheet_names):
+        """sheet_names の各シートの位置"""
+        position = {name: i for i, name in enumerate(self.sheet_names)}
+        return np.array([position[name] for name in sheet_names], np.int64)
+
+    def cells(self, sheets, rows, cols):
+        """
+        複数シートの同じセル群の値をまとめて取り出す。
+
+        Args:
+            sheets (array): シートの位置。
+            rows, cols (array): 1始まりの行番号と列番号（同じ長さ）。
+
+        Returns:
+            list: シートごとの値のリスト（空のセルや使用範囲外は None）。
+        """
+        rows = np.asarray(rows, np.int64) - 1
+        cols = np.asarray(cols, np.int64) - 1
+        heights = self.shapes[sheets, 0][:, None]
+        widths = self.shapes[sheets, 1][:, None]
+        inside = (rows < heights) & (cols < widths)
+        values = np.zeros(inside.shape, np.float64)
+        kinds = np.full(inside.shape, EMPTY, np.uint8)
+        # 使用範囲内の位置だけを読む（すべてのシートが空のブックでは values.npy も空になる）
+        if inside.any():
+            flat = (self.offsets[sheets][:, None] + rows * widths + cols)[inside]
+            values[inside] = self.values[flat]
+            kinds[inside] = self.kinds[flat]
+        result = []
+        for value_row, kind_row in zip(values.tolist(), kinds.tolist()):
+            result.append([self._decode(value, kind) for value, kind in zip(value_row, kind_row)])
+        return result
+
+    def _decode(self, value, kind):
+        if kind == EMPTY:
+            return None
+        if kind == INT:
+            return int(value)
+        if kind == BOOL:
+            return bool(value)
+        if kind == OTHER:
+            return _decode_other(self.others[int(value)])
+        return value
+
+
+class CellCache:
+    """
+    ブックごとのセル値キャッシュ。
+
+    Args:
+        cache_dir (str): キャッシュを保存するフォルダ（省略時は default_cache_dir()）。
+        max_bytes (int): キャッシュフォルダ全体の大きさの上限。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def entry_path(self, file_path):
+        """ブックに対応するキャッシュフォルダのパス（ブックの絶対パスのハッシュ）"""
+        key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, file_path):
+        """
+        ブックのキャッシュを読み込む。キャッシュがない、またはブックが変更されている場合は None を返す。
+        """
+        folder = self.entry_path(file_path)
+        index_file = os.path.join(folder, "index.json")
+        if not os.path.exists(index_file):
+            return None
+        stat = os.stat(file_path)
+        try:
+            with open(index_file, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            index.get("version") != CACHE_VERSION
+            or index.get("size") != stat.st_size
+            or index.get("mtime_ns") != stat.st_mtime_ns
+        ):
+            return None
+        # 最終使用日時として index.json の更新日時を使う
+        os.utime(index_file)
+        return CachedWorkbook(folder, index)
+
+    def build(self, file_path, sheet_timestamp=None):
+        """
+        ブックの全シートの使用範囲を読み込んでキャッシュを作成する。
+
+        Args:
+            file_path (str): Excelファイルのパス。
+            sheet_timestamp (callable): シート名から日時 (datetime) を求める関数。
+                日時を求められないシートは None として保存します。
+
+        Returns:
+            CachedWorkbook: 作成したキャッシュ。
+        """
+        stat = os.stat(file_path)
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet_names = list(workbook.sheetnames)
+            value_blocks, kind_blocks, shapes, offsets, others = [], [], [], [], []
+            offset = 0
+            for sheet_name in sheet_names:
+                sheet = workbook[sheet_name]
+                # ファイルに記録された寸法は信用せず、実際のセルから使用範囲を求める
+                sheet.reset_dimensions()
+                rows = [row for row in sheet.iter_rows(values_only=True)]
+                while rows and not any(value is not None for value in rows[-1]):
+                    rows.pop()
+                width = max((len(row) for row in rows), default=0)
+                values, kinds = _encode_rows(rows, width, others)
+                value_blocks.append(values.ravel())
+                kind_blocks.append(kinds.ravel())
+                shapes.append([len(rows), width])
+                offsets.append(offset)
+                offset += values.size
+        finally:
+            workbook.close()
+
+        timestamps = []
+        for sheet_name in sheet_names:
+            try:
+                timestamps.append(sheet_timestamp(sheet_name).isoformat() if sheet_timestamp else None)
+            except ValueError:
+                timestamps.append(None)
+        index = {
+            "version": CACHE_VERSION,
+            "path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sheet_names": sheet_names,
+            "timestamps": timestamps,
+            "shapes": shapes,
+            "offsets": offsets,
+            "others": others,
+        }
+
+        folder = self.entry_path(file_path)
+        temp_folder = folder + ".tmp"
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        os.makedirs(temp_folder)
+        np.save(os.path.join(temp_folder, "values.npy"), np.concatenate(value_blocks) if value_blocks else np.zeros(0))
+        np.save(os.path.join(temp_folder, "kinds.npy"), np.concatenate(kind_blocks) if kind_blocks else np.zeros(0, np.uint8))
+        with open(os.path.join(temp_folder, "index.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(temp_folder, folder)
+        self.evict(keep=folder)
+        return CachedWorkbook(folder, index)
+
+    def get(self, file_path, sheet_timestamp=None):
+        """キャッシュを読み込み、なければ（またはブックが変更されていれば）作成する"""
+        return self.load(file_path) or self.build(file_path, sheet_timestamp)
+
+    def evict(self, keep=None):
+        """キャッシュフォルダ全体が上限を超えていれば、最後に使ってから最も時間が経ったものから削除する"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            folder = os.path.join(self.cache_dir, name)
+            index_file = os.path.join(folder, "index.json")
+            if not os.path.isfile(index_file):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.is_file())
+            entries.append((os.stat(index_file).st_mtime, folder, size))
+        total = sum(size for _, _, size in entries)
+        for _, folder, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if folder == keep:
+                continue
+            shutil.rmtree(folder, ignore_errors=True)
+            total -= size
@@ -0,0 +1,172 @@
+# ファイル名: cell_extraction.py
+"""
+Excelブックの各シートから指定したセルの値を時系列順に抽出する処理。
+
+ブックは読み取り専用モードで開き、各シートは指定されたセルのうち最も下の行までだけを読み込みます。
+セルは "B2" のような単独のセルと "B2:D10" のような範囲で指定でき、範囲は値を展開するか集計して返します。
+同じブックに何度も問い合わせる場合は cell_cache.CellCache を渡すと、2回目以降はキャッシュから答えます。
+"""
+import re
+from datetime import datetime
+
+import openpyxl
+from openpyxl.utils import get_column_letter, range_boundaries
+
+# 範囲の集計方法（キーはGUIの表示名）
+RANGE_MODES = {
+    "値を展開": None,
+    "平均": "mean",
+    "合計": "sum",
+    "最小": "min",
+    "最大": "max",
+}
+
+
+class CellSpec:
+    """
+    1つのセル指定（単独のセルまたは範囲）。
+
+    行と列は1始まりで、範囲の両端を含みます。
+    """
+
+    def __init__(self, text):
+        self.text = text.strip().upper()
+        try:
+            min_col, min_row, max_col, max_row = range_boundaries(self.text)
+        except (ValueError, TypeError):
+            raise ValueError(f"無効なセル番号です: {text.strip()}") from None
+        if None in (min_col, min_row, max_col, max_row):
+            raise ValueError(f"行と列の両方を指定してください: {text.strip()}")
+        self.min_row, self.max_row = min_row, max_row
+        self.min_col, self.max_col = min_col, max_col
+        self.is_range = ":" in self.text
+
+    def cells(self):
+        """範囲内のセルの (行, 列) を行順に返す"""
+        return [
+            (row, col)
+            for row in range(self.min_row, self.max_row + 1)
+            for col in range(self.min_col, self.max_col + 1)
+        ]
+
+    def addresses(self):
+        """範囲内のセル番号を行順に返す"""
+        return [f"{get_column_letter(col)}{row}" for row, col in self.cells()]
+
+
+def parse_cell_specs(text):
+    """カンマ区切りのセル指定（例: "B2, C5, D1:E4"）を CellSpec のリストに変換する"""
+    specs = [CellSpec(part) for part in text.split(",") if part.strip()]
+    if not specs:
+        raise ValueError("セル番号を入力してください")
+    return specs
+
+
+def sheet_timestamp(sheet_name):
+    """シート名の先頭14桁の日時 (YYYYMMDDhhmmss) を返す"""
+    match = re.match(r"(\d{14})", sheet_name)
+    if not match:
+        raise ValueError(f"シート名の先頭に日時 (YYYYMMDDhhmmss) がありません: {sheet_name}")
+    return datetime.strptime(match.group(1), "%Y%m%d%H%M%S")
+
+
+def result_header(specs, range_mode=None):
+    """結果の1行目（"シート名" とセル番号、範囲は展開したセル番号または "範囲 (集計方法)"）"""
+    header = ["シート名"]
+    for spec in specs:
+        if spec.is_range and range_mode is None:
+            header.extend(spec.addresses())
+        elif spec.is_range:
+            header.append(f"{spec.text} ({range_mode})")
+        else:
+            header.append(spec.text)
+    return header
+
+
+def aggregate(values, range_mode):
+    """範囲の数値だけを集計する（数値がなければ空文字）"""
+    numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if not numbers:
+        return ""
+    if range_mode == "sum":
+        return sum(numbers)
+    if range_mode == "min":
+        return min(numbers)
+    if range_mode == "max":
+        return max(numbers)
+    return sum(numbers) / len(numbers)
+
+
+def spec_values(spec, values, range_mode=None):
+    """1つのセル指定について、spec.cells() の順に並んだセル値から結果の行に並べる値のリストを返す"""
+    if spec.is_range and range_mode is not None:
+        return [aggregate(values, range_mode)]
+    return ["" if value is None else value for value in values]
+
+
+def read_sheet_block(sheet, max_row, max_col):
+    """
+    読み取り専用シートの A1 から (max_row, max_col) までのセル値を行のリストとして読み込む。
+
+    max_row より下の行は解析しません。
+    """
+    return [list(row) for row in sheet.iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True)]
+
+
+def extract_cells(file_path, specs, range_mode=None, cache=None):
+    """
+    ブックの全シートから指定したセルの値を抽出し、シートの日時順に並べる。
+
+    Args:
+        file_path (str): Excelファイルのパス。
+        specs (list): parse_cell_specs で作成したセル指定のリスト。
+        range_mode (str): 範囲の集計方法（"mean", "sum", "min", "max"）。None の場合は範囲内の値を展開します。
+        cache (CellCache): 指定した場合はブックの代わりにキャッシュから値を読み込みます
+            （キャッシュがなければ最初に作成します）。
+
+    Returns:
+        list: 1行目が見出し、以降がシートごとの [シート名, 値...] のリスト。
+    """
+    if cache is not None:
+        return _extract_cached(cache.get(file_path, sheet_timestamp), specs, range_mode)
+
+    max_row = max(spec.max_row for spec in specs)
+    max_col = max(spec.max_col for spec in specs)
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet_names = sorted(workbook.sheetnames, key=sheet_timestamp)
+        result = [result_header(specs, range_mode)]
+        for sheet_name in sheet_names:
+            block = read_sheet_block(workbook[sheet_name], max_row, max_col)
+
+            def cell_value(row, col):
+                # 空の行やセルは読み込んだ行のリストに含まれない場合がある
+                if row > len(block) or col > len(block[row - 1]):
+                    return None
+                return block[row - 1][col - 1]
+
+            row = [sheet_name]
+            for spec in specs:
+                row.extend(spec_values(spec, [cell_value(r, c) for r, c in spec.cells()], range_mode))
+            result.append(row)
+        return result
+    finally:
+        workbook.close()
+
+
+def _extract_cached(cached, specs, range_mode=None):
+    """キャッシュ (CachedWorkbook) から extract_cells と同じ結果を作る"""
+
+    def cached_timestamp(item):
+        sheet_name, timestamp = item
+        # 日時のないシートは sheet_timestamp と同じエラーにする
+        return datetime.fromisoformat(timestamp) if timestamp else sheet_timestamp(sheet_name)
+
+    sheet_names = [name for name, _ in sorted(zip(cached.sheet_names, cached.timestamps), key=cached_timestamp)]
+    sheets = cached.sheet_order(sheet_names)
+    rows = [[sheet_name] for sheet_name in sheet_names]
+    for spec in specs:
+        spec_rows, spec_cols = zip(*spec.cells())
+        for row, values in zip(rows, cached.cells(sheets, spec_rows, spec_cols)):
+            row.extend(spec_values(spec, values, range_mode))
+    return [result_header(specs, range_mode)] + rows
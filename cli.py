@@ -0,0 +1,252 @@
+# ファイル名: cli.py
+"""
+各ツールの処理をGUIなしで実行するコマンドラインツール。
+
+    python cli.py rectangle <画像フォルダ> <保存先 .xlsx/.npy> --x 100 --y 200 --width 50 --height 40
+    python cli.py columns <画像フォルダ> <保存先 .xlsx/.npy> --x 100,200 --y 0,0 --scale 0.1,0.1
+    python cli.py crop <画像フォルダ> <保存先フォルダ> --x 100 --y 200 --width 50 --height 40
+    python cli.py integrate <入力 .xlsx/.npy> <保存先 .xlsx> [--regions "x0,x1,y0,y1; ..."]
+    python cli.py cells <ブック .xlsx> --cells "B2, C5, D1:E4" [--mode mean] [--output 結果.csv]
+    python cli.py timelapse <画像フォルダ> <保存先 .avi> [--fps 30]
+    python cli.py contours <画像フォルダ> <保存先 .npz> --threshold 128 --blur 5 [--track]
+    python cli.py histogram <画像フォルダ> <保存先 .npy> [--heatmap 画像.png]
+    python cli.py --run-log [--profile] <サブコマンド> ...   段階ごとの時間を出力の隣に実行ログとして保存する
+
+tkinter は読み込みません。numpy 以外の重いライブラリ（cv2, pandas, openpyxl, matplotlib）は
+サブコマンドが必要とするときにだけ読み込むため、GUIのないバッチ用のマシンでもすぐに起動します。
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+
+from run_metrics import RunRecorder
+
+
+def _int_list(text):
+    return [int(v.strip()) for v in text.split(",")]
+
+
+def _float_list(text):
+    return [float(v.strip()) for v in text.split(",")]
+
+
+def _default_workers():
+    return os.cpu_count() or 1
+
+
+def _report_skipped(skipped):
+    for image_file, reason in skipped:
+        print(f"スキップ: {image_file}: {reason}", file=sys.stderr)
+
+
+def run_rectangle(args):
+    from brightness_extraction import extract_rectangle_to_cube, extract_rectangle_to_excel
+
+    # 拡張子が .npy の場合は輝度キューブ形式で保存
+    extract = extract_rectangle_to_cube if args.output.lower().endswith(".npy") else extract_rectangle_to_excel
+    skipped = extract(args.folder, args.x, args.y, args.width, args.height, args.output, args.workers, args.chunksize, args.incremental)
+    _report_skipped(skipped)
+    print(f"保存しました: {args.output}")
+
+
+def run_columns(args):
+    from brightness_extraction import extract_columns_to_cube, extract_columns_to_excel
+
+    if not (len(args.x) == len(args.y) == len(args.scale)):
+        raise ValueError("X座標、Y座標、スケールの数が一致していません。")
+    extract = extract_columns_to_cube if args.output.lower().endswith(".npy") else extract_columns_to_excel
+    skipped = extract(args.folder, args.x, args.y, args.scale, args.output, args.workers, args.chunksize, args.incremental)
+    _report_skipped(skipped)
+    print(f"保存しました: {args.output}")
+
+
+def run_crop(args):
+    from brightness_extraction import crop_images
+
+    os.makedirs(args.output, exist_ok=True)
+    skipped = crop_images(args.folder, args.x, args.y, args.width, args.height, args.output, args.incremental)
+    _report_skipped(skipped)
+    print(f"保存しました: {args.output}")
+
+
+def run_integrate(args):
+    from area_integration import calculate_area_integral, parse_regions
+
+    count = calculate_area_integral(args.input, args.output, args.workers, parse_regions(args.regions))
+    print(f"{count} シートを積分し、{args.output} に保存しました")
+
+
+def run_cells(args):
+    from cell_extraction import extract_cells, parse_cell_specs
+
+    cache = None
+    if args.cache:
+        from cell_cache import CellCache
+
+        cache = CellCache(args.cache_dir)
+    result = extract_cells(args.workbook, parse_cell_specs(args.cells), args.mode, cache)
+    if args.output:
+        with open(args.output, mode="w", newline="", encoding="utf-8-sig") as file:
+            csv.writer(file).writerows(result)
+        print(f"保存しました: {args.output}")
+    else:
+        for row in result:
+            print("\t".join(map(str, row)))
+
+
+def run_timelapse(args):
+    from timelapse_video import create_timelapse
+
+    count = create_timelapse(args.folder, args.output, args.fps, args.workers)
+    print(f"{count} フレームの動画を保存しました: {args.output}")
+
+
+def run_contours(args):
+    from contour_pipeline import extract_contours
+
+    skipped = extract_contours(
+        args.folder, args.output, args.threshold, args.blur, args.workers,
+        annotated_folder=args.annotated, min_area=args.min_area,
+    )
+    _report_skipped(skipped)
+    print(f"保存しました: {args.output}")
+    if args.track:
+        from contour_tracking import track_contour_table
+
+        tracks_path = os.path.splitext(args.output)[0] + "_tracks.npz"
+        count = track_contour_table(args.output, tracks_path, args.max_distance, args.max_gap, args.min_area, top_level_only=True)
+        print(f"{count} トラックを保存しました: {tracks_path}")
+
+
+def run_histogram(args):
+    from brightness_histogram import export_heatmap, histogram_time_series
+
+    skipped = histogram_time_series(args.folder, args.output, args.workers, incremental=args.incremental)
+    _report_skipped(skipped)
+    print(f"保存しました: {args.output}")
+    if args.heatmap:
+        export_heatmap(args.output, args.heatmap)
+        print(f"ヒートマップを保存しました: {args.heatmap}")
+
+
+def _add_rectangle_arguments(parser):
+    parser.add_argument("--x", type=int, required=True, help="矩形左上のX座標")
+    parser.add_argument("--y", type=int, required=True, help="矩形左上のY座標")
+    parser.add_argument("--width", type=int, required=True, help="矩形の幅")
+    parser.add_argument("--height", type=int, required=True, help="矩形の高さ")
+
+
+def _add_batch_arguments(parser):
+    parser.add_argument("--workers", type=int, default=_default_workers(), help="並列に処理するプロセス数")
+    parser.add_argument("--chunksize", type=int, default=1, help="1回にワーカーへ渡す画像数")
+    parser.add_argument("--incremental", action="store_true", help="前回から変更のない画像は処理しない")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="画像フォルダとExcelファイルの処理をGUIなしで実行します。")
+    parser.add_argument("--run-log", action="store_true",
+                        help="段階ごとの時間・バイト数・ピークメモリを出力の隣の .runlog.json に保存する")
+    parser.add_argument("--profile", action="store_true",
+                        help="処理を cProfile で計測し、出力の隣に .prof を保存する（--run-log を含む）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("rectangle", help="矩形領域の輝度値を抽出する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先（.xlsx または輝度キューブの .npy）")
+    _add_rectangle_arguments(p)
+    _add_batch_arguments(p)
+    p.set_defaults(func=run_rectangle)
+
+    p = commands.add_parser("columns", help="指定したX座標の輝度列を抽出する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先（.xlsx または輝度キューブの .npy）")
+    p.add_argument("--x", type=_int_list, required=True, help="X座標（カンマ区切り）")
+    p.add_argument("--y", type=_int_list, required=True, help="X座標ごとのY原点（カンマ区切り）")
+    p.add_argument("--scale", type=_float_list, required=True, help="X座標ごとのスケール mm/pixel（カンマ区切り）")
+    _add_batch_arguments(p)
+    p.set_defaults(func=run_columns)
+
+    p = commands.add_parser("crop", help="矩形領域を切り抜いた画像を保存する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先フォルダ")
+    _add_rectangle_arguments(p)
+    p.add_argument("--incremental", action="store_true", help="前回から変更のない画像は処理しない")
+    p.set_defaults(func=run_crop)
+
+    p = commands.add_parser("integrate", help="輝度値のシートを面積積分する")
+    p.add_argument("input", help="入力ファイル（.xlsx/.xls または輝度キューブの .npy）")
+    p.add_argument("output", help="保存先の .xlsx")
+    p.add_argument("--regions", default="", help='部分矩形 "x0,x1,y0,y1; ..."')
+    p.add_argument("--workers", type=int, default=None, help="シートを読み込むプロセス数")
+    p.set_defaults(func=run_integrate)
+
+    p = commands.add_parser("cells", help="各シートのセル値を時系列順に抽出する")
+    p.add_argument("workbook", help="Excelファイル")
+    p.add_argument("--cells", required=True, help='セル番号（カンマ区切り、範囲も可: "B2, C5, D1:E4"）')
+    p.add_argument("--mode", default=None, choices=["mean", "sum", "min", "max"], help="範囲の集計方法（省略時は値を展開）")
+    p.add_argument("--output", help="保存先の .csv（省略時は標準出力にタブ区切りで表示）")
+    p.add_argument("--cache", action="store_true", help="セル値のキャッシュを使う")
+    p.add_argument("--cache-dir", default=None, help="キャッシュフォルダ")
+    p.set_defaults(func=run_cells)
+
+    p = commands.add_parser("timelapse", help="タイムラプス動画を作成する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先の .avi")
+    p.add_argument("--fps", type=int, default=30)
+    p.add_argument("--workers", type=int, default=None, help="デコードに使うスレッド数")
+    p.set_defaults(func=run_timelapse)
+
+    p = commands.add_parser("contours", help="輪郭を検出して輪郭テーブル (.npz) に保存する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先の .npz")
+    p.add_argument("--threshold", type=int, required=True, help="2値化のしきい値 (0-255)")
+    p.add_argument("--blur", type=int, required=True, help="ぼかしの大きさ")
+    p.add_argument("--min-area", type=float, default=0.0, help="これより小さい輪郭は保存しない")
+    p.add_argument("--annotated", default=None, help="輪郭を描いた画像の保存先フォルダ")
+    p.add_argument("--workers", type=int, default=_default_workers(), help="並列に処理するプロセス数")
+    p.add_argument("--track", action="store_true", help="フレーム間で輪郭を追跡し <保存先>_tracks.npz に保存する")
+    p.add_argument("--max-distance", type=float, default=20.0, help="追跡で許すフレーム間の移動量 (pixel)")
+    p.add_argument("--max-gap", type=int, default=0, help="追跡で見失ってもよいフレーム数")
+    p.set_defaults(func=run_contours)
+
+    p = commands.add_parser("histogram", help="輝度ヒストグラムの時系列を保存する")
+    p.add_argument("folder", help="画像フォルダ")
+    p.add_argument("output", help="保存先の .npy")
+    p.add_argument("--heatmap", default=None, help="ヒートマップ画像の保存先")
+    p.add_argument("--workers", type=int, default=_default_workers(), help="並列に処理するプロセス数")
+    p.add_argument("--incremental", action="store_true", help="前回から変更のない画像は処理しない")
+    p.set_defaults(func=run_histogram)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.run_log or args.profile:
+            _run_recorded(args)
+        else:
+            args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _run_recorded(args):
+    """サブコマンドを RunRecorder の中で実行し、最後に段階ごとの集計を表示する"""
+    params = {key: value for key, value in vars(args).items() if key not in ("func", "command", "run_log", "profile")}
+    recorder = RunRecorder(args.command, args.output, params, profile=args.profile)
+    try:
+        with recorder:
+            args.func(args)
+    finally:
+        print(recorder.status_text(final=True), file=sys.stderr)
+        for name, stats in recorder.log["stages"].items():
+            print(f"  {name:<16}{stats['seconds']:>9.2f}s{stats['items']:>8}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+    sys.exit(main())
@@ -2,10 +2,27 @@ import cv2
 import tkinter as tk
 from tkinter import filedialog
 from tkinter import messagebox
-from tkinter.scrolledtext import ScrolledText
 from PIL import Image, ImageTk
+import multiprocessing
 import os
-import numpy as np
+import threading
+from contour_pipeline import ContourPipeline, annotate_contours, decode_image, downscale, extract_contours
+from contour_tracking import track_contour_table
+from image_preview import load_preview, make_preview
+from run_metrics import RunRecorder, tk_status_callback
+from virtual_table import VirtualTable
+
+PREVIEW_DEBOUNCE_MS = 150
+CONTOUR_TABLE_COLUMNS = [
+    ("id", "Contour", "{}"),
+    ("centroid_x", "Centroid X", "{:.1f}"),
+    ("centroid_y", "Centroid Y", "{:.1f}"),
+    ("left", "Left", "{}"),
+    ("top", "Top", "{}"),
+    ("right", "Right", "{}"),
+    ("bottom", "Bottom", "{}"),
+    ("area", "Area", "{:.1f}"),
+]
 
 
 class ContourApp:
@@ -13,6 +30,15 @@ class ContourApp:
         self.root = root
         self.root.title("Contour Detection App")
 
+        # Live preview state: full-resolution and downscaled pipelines with cached stages
+        self.full_pipeline = None
+        self.preview_pipeline = None
+        self.preview_job = None
+        self.preview_lock = threading.Lock()
+        self.preview_request = None
+        self.preview_running = False
+        self.batch_running = False
+
         # GUI Components
         self.label = tk.Label(root, text="Select an image to process:")
         self.label.pack(pady=10)
@@ -23,134 +49,191 @@ class ContourApp:
         # Sliders for parameters
         self.threshold_label = tk.Label(root, text="Threshold:")
         self.threshold_label.pack()
-        self.threshold_slider = tk.Scale(root, from_=0, to=255, orient=tk.HORIZONTAL)
+        self.threshold_slider = tk.Scale(root, from_=0, to=255, orient=tk.HORIZONTAL, command=self.schedule_preview)
         self.threshold_slider.set(100)
         self.threshold_slider.pack()
 
         self.blur_label = tk.Label(root, text="Blur Size:")
         self.blur_label.pack()
-        self.blur_slider = tk.Scale(root, from_=1, to=20, orient=tk.HORIZONTAL, resolution=1)
+        self.blur_slider = tk.Scale(root, from_=1, to=20, orient=tk.HORIZONTAL, resolution=1, command=self.schedule_preview)
         self.blur_slider.set(9)
         self.blur_slider.pack()
 
+        self.min_area_label = tk.Label(root, text="Min Area (px):")
+        self.min_area_label.pack()
+        self.min_area = tk.StringVar(value="0")
+        self.min_area.trace_add("write", lambda *args: self.schedule_preview())
+        tk.Entry(root, textvariable=self.min_area, width=10).pack()
+
         self.process_btn = tk.Button(root, text="Process Image", command=self.process_image, state=tk.DISABLED)
         self.process_btn.pack(pady=5)
 
         self.image_label = tk.Label(root)
         self.image_label.pack(pady=10)
 
+        self.status_label = tk.Label(root, text="")
+        self.status_label.pack()
+
         self.save_btn = tk.Button(root, text="Save Processed Image", command=self.save_image, state=tk.DISABLED)
         self.save_btn.pack(pady=5)
 
-        self.annotation_text = ScrolledText(root, height=10, width=70, state=tk.DISABLED)
-        self.annotation_text.pack(pady=10)
+        self.batch_btn = tk.Button(root, text="Batch Process Folder", command=self.batch_process)
+        self.batch_btn.pack(pady=5)
+
+        # Per-stage timing of the batch mode, and an opt-in profile saved next to the contour table
+        self.profile_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(root, text="Profile batch (save .prof next to output)", variable=self.profile_var).pack()
+        self.run_status_label = tk.Label(root, text="")
+        self.run_status_label.pack()
+
+        self.contour_table = VirtualTable(root, CONTOUR_TABLE_COLUMNS, height=10)
+        self.contour_table.pack(pady=10, fill=tk.X)
 
         self.original_image_path = None
         self.processed_image = None
+        self.processed_params = None
 
     def select_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.jpeg;*.jpg;*.png;*.bmp")])
         if file_path:
             self.original_image_path = file_path
+            self.full_pipeline = None
+            self.preview_pipeline = None
+            self.processed_image = None
+            self.processed_params = None
+            self.save_btn.config(state=tk.DISABLED)
             self.display_image(file_path)
             self.process_btn.config(state=tk.NORMAL)
+            # Decode once off the Tk thread; the sliders then only re-run the stages they affect
+            threading.Thread(target=self.load_pipelines, args=(file_path,), daemon=True).start()
 
     def display_image(self, image_path):
         try:
-            image = Image.open(image_path)
-            image.thumbnail((500, 500))  # Resize for display
+            image = load_preview(image_path, (500, 500))  # Reduced-resolution decode for display
             photo = ImageTk.PhotoImage(image)
             self.image_label.config(image=photo)
             self.image_label.image = photo
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load image: {e}")
 
+    def load_pipelines(self, image_path):
+        try:
+            img_color = decode_image(image_path)
+            working_copy, scale = downscale(img_color)
+            full_pipeline = ContourPipeline(img_color)
+            preview_pipeline = ContourPipeline(working_copy, scale)
+        except Exception as e:
+            self.root.after(0, messagebox.showerror, "Error", f"Failed to load image: {e}")
+            return
+        self.root.after(0, self.pipelines_loaded, image_path, full_pipeline, preview_pipeline)
+
+    def pipelines_loaded(self, image_path, full_pipeline, preview_pipeline):
+        if image_path != self.original_image_path:
+            return  # Another image was selected meanwhile
+        self.full_pipeline = full_pipeline
+        self.preview_pipeline = preview_pipeline
+        self.start_preview()
+
+    def current_params(self):
+        try:
+            min_area = max(0.0, float(self.min_area.get()))
+        except ValueError:
+            min_area = 0.0
+        return self.threshold_slider.get(), self.blur_slider.get(), min_area
+
+    def schedule_preview(self, _value=None):
+        """Debounce slider events so the preview is recomputed once the slider settles."""
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(PREVIEW_DEBOUNCE_MS, self.start_preview)
+
+    def start_preview(self):
+        self.preview_job = None
+        if self.preview_pipeline is None:
+            return
+        with self.preview_lock:
+            # Only the latest request matters; a running worker picks it up when it finishes
+            self.preview_request = (self.preview_pipeline, self.current_params())
+            if self.preview_running:
+                return
+            self.preview_running = True
+        threading.Thread(target=self.preview_worker, daemon=True).start()
+
+    def preview_worker(self):
+        while True:
+            with self.preview_lock:
+                request, self.preview_request = self.preview_request, None
+                if request is None:
+                    self.preview_running = False
+                    return
+            pipeline, params = request
+            try:
+                _, contours, measurements = pipeline.filtered(*params)
+                annotated = annotate_contours(pipeline.image, pipeline.inverted, contours, measurements)
+                image = make_preview(Image.fromarray(cv2.cvtColor(annotated, cv2.COLOR_BGR2RGB)), (500, 500))
+            except Exception as e:
+                self.root.after(0, self.status_label.config, {"text": f"Preview failed: {e}"})
+                continue
+            self.root.after(0, self.show_preview, pipeline, image, len(contours))
+
+    def show_preview(self, pipeline, image, contour_count):
+        if pipeline is not self.preview_pipeline:
+            return
+        photo = ImageTk.PhotoImage(image)
+        self.image_label.config(image=photo)
+        self.image_label.image = photo
+        self.status_label.config(text=f"Preview: {contour_count} contours")
+
     def process_image(self):
         if not self.original_image_path:
             messagebox.showerror("Error", "No image selected!")
             return
 
         try:
-            # Handle Japanese or special character paths
-            with open(self.original_image_path, 'rb') as f:
-                file_bytes = np.asarray(bytearray(f.read()), dtype=np.uint8)
-                img_color = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-            if img_color is None:
-                raise FileNotFoundError("Failed to load the image. Check the file path or its format.")
-
-            # Create inverted color version of the image
-            inverted_img_color = cv2.bitwise_not(img_color)
-
-            # Read parameters from sliders
-            threshold = self.threshold_slider.get()
-            blur_size = self.blur_slider.get()
-
-            # Ensure blur size is odd
-            if blur_size % 2 == 0:
-                blur_size += 1
-
-            # Process image
-            img_gray = cv2.cvtColor(img_color, cv2.COLOR_BGR2GRAY)
-            img_blur = cv2.blur(img_gray, (blur_size, blur_size))
-            _, img_binary = cv2.threshold(img_blur, threshold, 255, cv2.THRESH_BINARY)
-            contours, _ = cv2.findContours(img_binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-
-            # Draw contours, bounding rectangles, and center points
-            img_color_with_annotations = img_color.copy()
-            self.annotation_text.config(state=tk.NORMAL)
-            self.annotation_text.delete(1.0, tk.END)  # Clear previous annotations
-
-            for i, contour in enumerate(contours):
-                # Get inverted color for the contour
-                color = tuple(map(int, inverted_img_color[contour[0][0][1], contour[0][0][0]]))
-
-                # Draw the contour
-                cv2.drawContours(img_color_with_annotations, [contour], -1, color, 2)
-
-                # Calculate bounding rectangle and draw it
-                x, y, w, h = cv2.boundingRect(contour)
-                cv2.rectangle(img_color_with_annotations, (x, y), (x + w, y + h), color, 2)
-
-                # Calculate moments and centroid
-                moments = cv2.moments(contour)
-                if moments["m00"] != 0:  # Avoid division by zero
-                    center_x = int(moments["m10"] / moments["m00"])
-                    center_y = int(moments["m01"] / moments["m00"])
-                else:
-                    center_x, center_y = 0, 0
-
-                # Draw centroid using inverted colors
-                cv2.circle(img_color_with_annotations, (center_x, center_y), 5, color, -1)
-
-                # Add annotation to text widget
-                annotation = (
-                    f"Contour {i + 1}:\n"
-                    f"  Centroid = ({center_x}, {center_y})\n"
-                    f"  Bounding Rect = Top-left: ({x}, {y}), "
-                    f"Bottom-right: ({x + w}, {y + h})\n"
-                )
-                self.annotation_text.insert(tk.END, annotation)
-
-            self.annotation_text.config(state=tk.DISABLED)
+            if self.full_pipeline is None:
+                self.full_pipeline = ContourPipeline(decode_image(self.original_image_path))
+            pipeline = self.full_pipeline
+
+            # Read parameters from sliders; small contours are dropped before anything is drawn
+            params = self.current_params()
+            indices, contours, measurements = pipeline.filtered(*params)
+
+            # Draw contours, bounding rectangles, and center points at full resolution
+            img_color_with_annotations = annotate_contours(pipeline.image, pipeline.inverted, contours, measurements)
+
+            self.contour_table.set_data({
+                "id": indices + 1,
+                "centroid_x": measurements["centroid_x"],
+                "centroid_y": measurements["centroid_y"],
+                "left": measurements["bbox_x"],
+                "top": measurements["bbox_y"],
+                "right": measurements["bbox_x"] + measurements["bbox_w"],
+                "bottom": measurements["bbox_y"] + measurements["bbox_h"],
+                "area": measurements["area"],
+            })
 
             # Convert processed image to PIL format
             img_color_with_annotations = cv2.cvtColor(img_color_with_annotations, cv2.COLOR_BGR2RGB)
             self.processed_image = Image.fromarray(img_color_with_annotations)
+            self.processed_params = params
 
             # Display processed image
             self.display_processed_image(self.processed_image)
+            self.status_label.config(text=f"Processed: {len(contours)} contours")
             self.save_btn.config(state=tk.NORMAL)
         except Exception as e:
             messagebox.showerror("Error", f"Image processing failed: {e}")
 
     def display_processed_image(self, image):
-        image.thumbnail((500, 500))  # Resize for display
-        photo = ImageTk.PhotoImage(image)
+        # Resize a copy for display so the full-resolution result is kept for saving
+        photo = ImageTk.PhotoImage(make_preview(image, (500, 500)))
         self.image_label.config(image=photo)
         self.image_label.image = photo
 
     def save_image(self):
+        if self.processed_image and self.processed_params != self.current_params():
+            # The sliders moved since the last full-resolution run; save what the preview shows
+            self.process_image()
         if self.processed_image:
             file_path = filedialog.asksaveasfilename(defaultextension=".jpeg",
                                                      filetypes=[("JPEG files", "*.jpeg"),
@@ -161,8 +244,63 @@ class ContourApp:
                 messagebox.showinfo("Success", "Image saved successfully!")
 
 
+    def batch_process(self):
+        """Run the contour pipeline over a whole folder with the current slider settings."""
+        if self.batch_running:
+            messagebox.showwarning("Warning", "A batch is already running.")
+            return
+        folder_path = filedialog.askdirectory(title="Select the frame folder")
+        if not folder_path:
+            return
+        save_path = filedialog.asksaveasfilename(defaultextension=".npz", filetypes=[("Contour table", "*.npz")])
+        if not save_path:
+            return
+        annotated_folder = None
+        if messagebox.askyesno("Annotated Images", "Also save annotated images?"):
+            annotated_folder = filedialog.askdirectory(title="Select the folder for annotated images") or None
+        track = messagebox.askyesno("Tracking", "Link contours across frames into tracks?")
+
+        threshold, blur_size, min_area = self.current_params()
+        profile = self.profile_var.get()
+        processed = [0]
+
+        def on_frame(image_file, reason):
+            processed[0] += 1
+            if processed[0] % 20 == 0:
+                self.root.after(0, self.status_label.config, {"text": f"Batch: {processed[0]} frames"})
+
+        params = {"folder": folder_path, "threshold": threshold, "blur_size": blur_size, "min_area": min_area, "track": track}
+        on_update = tk_status_callback(self.root, lambda text: self.run_status_label.config(text=text))
+
+        def run():
+            try:
+                with RunRecorder("contours", save_path, params, on_update=on_update, profile=profile) as recorder:
+                    skipped = extract_contours(
+                        folder_path, save_path, threshold, blur_size,
+                        workers=os.cpu_count() or 1, annotated_folder=annotated_folder, on_frame=on_frame, min_area=min_area,
+                    )
+                    message = f"Batch finished: {processed[0] - len(skipped)} frames saved to {save_path}"
+                    if skipped:
+                        message += f" ({len(skipped)} skipped)"
+                    if track:
+                        tracks_path = os.path.splitext(save_path)[0] + "_tracks.npz"
+                        with recorder.stage("track"):
+                            track_count = track_contour_table(save_path, tracks_path, top_level_only=True)
+                        message += f", {track_count} tracks saved to {tracks_path}"
+                self.root.after(0, self.status_label.config, {"text": message})
+            except Exception as e:
+                self.root.after(0, messagebox.showerror, "Error", f"Batch processing failed: {e}")
+            finally:
+                self.batch_running = False
+
+        self.batch_running = True
+        self.status_label.config(text="Batch: starting...")
+        threading.Thread(target=run, daemon=True).start()
+
+
 # Run the app
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Worker processes of the batch mode in PyInstaller builds
     root = tk.Tk()
     app = ContourApp(root)
     root.mainloop()
@@ -0,0 +1,331 @@
+import os
+
+import cv2
+import numpy as np
+
+from brightness_extraction import frame_timestamp, list_image_files, map_frames
+import run_metrics
+
+PREVIEW_MAX_SIZE = 1024
+CONTOUR_COLUMNS = {
+    "frame": np.int32,
+    "contour_id": np.int32,
+    "centroid_x": np.float32,
+    "centroid_y": np.float32,
+    "bbox_x": np.int32,
+    "bbox_y": np.int32,
+    "bbox_w": np.int32,
+    "bbox_h": np.int32,
+    "area": np.float64,
+    "next": np.int32,
+    "previous": np.int32,
+    "first_child": np.int32,
+    "parent": np.int32,
+}
+# The filled disk cv2.circle(image, centroid, 5, color, -1) draws, as a dilation kernel
+CENTROID_DOT = cv2.circle(np.zeros((11, 11), np.uint8), (5, 5), 5, 1, -1)
+
+
+def decode_image(image_path):
+    """Decode an image as BGR, also for paths with Japanese or other special characters."""
+    with open(image_path, 'rb') as f:
+        file_bytes = np.frombuffer(f.read(), dtype=np.uint8)
+    img_color = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+    if img_color is None:
+        raise FileNotFoundError("Failed to load the image. Check the file path or its format.")
+    return img_color
+
+
+def odd_blur_size(blur_size):
+    """Blur kernels are used with odd sizes only."""
+    blur_size = max(1, int(blur_size))
+    return blur_size + 1 if blur_size % 2 == 0 else blur_size
+
+
+def downscale(img_color, max_size=PREVIEW_MAX_SIZE):
+    """Return (working copy that fits in max_size, scale factor relative to the original)."""
+    height, width = img_color.shape[:2]
+    scale = min(1.0, max_size / max(width, height))
+    if scale == 1.0:
+        return img_color, 1.0
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img_color, size, interpolation=cv2.INTER_AREA), scale
+
+
+class ContourPipeline:
+    """
+    Grayscale -> blur -> threshold -> findContours on one decoded image, caching each stage.
+
+    Every stage keeps the result for the parameters it was last called with, so changing
+    the threshold only re-runs threshold and findContours, and changing the blur size
+    re-runs from the blur onward. The decoded image and its grayscale are computed once.
+
+    scale is the size of this image relative to the original; blur sizes are given in
+    original-image pixels and scaled down accordingly, so a downscaled working copy
+    produces a close approximation of the full-resolution result.
+    """
+
+    def __init__(self, img_color, scale=1.0):
+        self.image = img_color
+        self.scale = scale
+        self.gray = cv2.cvtColor(img_color, cv2.COLOR_BGR2GRAY)
+        self._inverted = None
+        self._blur_key = None
+        self._blurred = None
+        self._binary_key = None
+        self._binary = None
+        self._contours_key = None
+        self._contours = None
+        self._measurements_key = None
+        self._measurements = None
+
+    @property
+    def inverted(self):
+        if self._inverted is None:
+            self._inverted = cv2.bitwise_not(self.image)
+        return self._inverted
+
+    def blurred(self, blur_size):
+        blur_size = odd_blur_size(round(odd_blur_size(blur_size) * self.scale))
+        if self._blur_key != blur_size:
+            self._blurred = cv2.blur(self.gray, (blur_size, blur_size))
+            self._blur_key = blur_size
+        return self._blurred
+
+    def binary(self, threshold, blur_size):
+        key = (threshold, odd_blur_size(blur_size))
+        if self._binary_key != key:
+            _, self._binary = cv2.threshold(self.blurred(blur_size), threshold, 255, cv2.THRESH_BINARY)
+            self._binary_key = key
+        return self._binary
+
+    def contours(self, threshold, blur_size):
+        """Return (contours, hierarchy) for the given parameters."""
+        key = (threshold, odd_blur_size(blur_size))
+        if self._contours_key != key:
+            self._contours = cv2.findContours(self.binary(threshold, blur_size), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+            self._contours_key = key
+        return self._contours
+
+    def measurements(self, threshold, blur_size):
+        """measure_contours for the contours of the given parameters."""
+        key = (threshold, odd_blur_size(blur_size))
+        if self._measurements_key != key:
+            self._measurements = measure_contours(self.contours(threshold, blur_size)[0])
+            self._measurements_key = key
+        return self._measurements
+
+    def filtered(self, threshold, blur_size, min_area):
+        """
+        Return (indices, contours, measurements) of the contours with at least min_area.
+
+        min_area is given in original-image pixels and scaled to this image.
+        """
+        contours, _ = self.contours(threshold, blur_size)
+        return filter_contours(contours, self.measurements(threshold, blur_size), min_area * self.scale ** 2)
+
+
+def measure_contours(contours):
+    """
+    Area, centroid and bounding box of every contour in one vectorized pass.
+
+    The points of all contours are concatenated and the polygon moments (the same
+    formulas cv2.moments uses for contours) are summed per contour with reduceat, so the
+    cost does not depend on the number of contours the way per-contour calls do.
+
+    Returns:
+        dict: Arrays area, centroid_x, centroid_y, bbox_x, bbox_y, bbox_w, bbox_h. The
+        centroid of a contour without area is (0, 0).
+    """
+    count = len(contours)
+    if not count:
+        return {
+            "area": np.zeros(0), "centroid_x": np.zeros(0), "centroid_y": np.zeros(0),
+            **{name: np.zeros(0, np.int32) for name in ("bbox_x", "bbox_y", "bbox_w", "bbox_h")},
+        }
+    lengths = np.fromiter((len(c) for c in contours), np.intp, count)
+    starts = np.cumsum(lengths) - lengths
+    points = np.concatenate(contours).reshape(-1, 2)
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+    following = np.arange(1, len(points) + 1)
+    following[starts + lengths - 1] = starts  # Each polygon closes back on its first point
+    x_next, y_next = x[following], y[following]
+    cross = x * y_next - x_next * y
+    m00 = np.add.reduceat(cross, starts) / 2
+    m10 = np.add.reduceat(cross * (x + x_next), starts) / 6
+    m01 = np.add.reduceat(cross * (y + y_next), starts) / 6
+    has_area = m00 != 0
+    safe_m00 = np.where(has_area, m00, 1)
+    left = np.minimum.reduceat(points[:, 0], starts)
+    top = np.minimum.reduceat(points[:, 1], starts)
+    return {
+        "area": np.abs(m00),
+        "centroid_x": np.where(has_area, m10 / safe_m00, 0),
+        "centroid_y": np.where(has_area, m01 / safe_m00, 0),
+        "bbox_x": left.astype(np.int32),
+        "bbox_y": top.astype(np.int32),
+        "bbox_w": (np.maximum.reduceat(points[:, 0], starts) - left + 1).astype(np.int32),
+        "bbox_h": (np.maximum.reduceat(points[:, 1], starts) - top + 1).astype(np.int32),
+    }
+
+
+def filter_contours(contours, measurements, min_area):
+    """Keep the contours with at least min_area; returns (indices, contours, measurements)."""
+    keep = np.flatnonzero(measurements["area"] >= min_area)
+    return keep, [contours[i] for i in keep], {name: values[keep] for name, values in measurements.items()}
+
+
+def annotate_contours(img_color, inverted_img_color, contours, measurements):
+    """
+    Draw contours, bounding rectangles and centroids in the inverted colour of each contour.
+
+    As in the original per-contour drawing, every contour with its rectangle and dot takes
+    one colour: the inverted image at the contour's first point. The annotations are drawn
+    into an int32 label mask (contour index + 1) with one polylines call per contour and a
+    single dilation for all centroid dots; only the drawn pixels are then looked up in the
+    per-contour palette, instead of drawing into the colour image call by call.
+    """
+    annotated = img_color.copy()
+    if not contours:
+        return annotated
+    labels = np.zeros(img_color.shape[:2], np.int32)
+    x, y = measurements["bbox_x"], measurements["bbox_y"]
+    right = x + measurements["bbox_w"]
+    bottom = y + measurements["bbox_h"]
+    rectangles = np.stack([
+        np.stack([x, y], axis=1), np.stack([right, y], axis=1),
+        np.stack([right, bottom], axis=1), np.stack([x, bottom], axis=1),
+    ], axis=1).astype(np.int32)
+    for label, (contour, rectangle) in enumerate(zip(contours, rectangles), 1):
+        cv2.polylines(labels, [contour, rectangle], True, label, 2)
+    # Dots are dilated as float32 (exact for any realistic label count); the dilation takes
+    # the largest label, so like the per-contour drawing, later contours are drawn on top
+    dots = np.zeros(labels.shape, np.float32)
+    cx = np.clip(measurements["centroid_x"].astype(np.intp), 0, labels.shape[1] - 1)
+    cy = np.clip(measurements["centroid_y"].astype(np.intp), 0, labels.shape[0] - 1)
+    dots[cy, cx] = np.arange(1, len(contours) + 1, dtype=np.float32)
+    dots = cv2.dilate(dots, CENTROID_DOT).astype(np.int32)
+    np.maximum(labels, dots, out=labels)
+
+    first_points = np.array([contour[0, 0] for contour in contours])
+    palette = inverted_img_color[first_points[:, 1], first_points[:, 0]]
+    drawn = np.flatnonzero(labels)
+    annotated.reshape(-1, annotated.shape[2])[drawn] = palette[labels.ravel()[drawn] - 1]
+    return annotated
+
+
+def contour_table(contours, hierarchy, min_area=0.0):
+    """
+    Measure the contours of one frame into a dict of columns (frame is filled in by the caller).
+
+    Contours smaller than min_area are left out; contour_id keeps the findContours index so
+    the hierarchy columns still refer to the right contours.
+    """
+    keep, _, measurements = filter_contours(contours, measure_contours(contours), min_area)
+    table = {name: np.zeros(len(keep), dtype) for name, dtype in CONTOUR_COLUMNS.items()}
+    table["contour_id"][:] = keep
+    for name, values in measurements.items():
+        table[name][:] = values
+    if len(keep):
+        links = hierarchy[0][keep]
+        for k, name in enumerate(("next", "previous", "first_child", "parent")):
+            table[name][:] = links[:, k]
+    return table
+
+
+def write_image(path, img_color):
+    """Encode and write an image, also for paths with Japanese or other special characters."""
+    success, buffer = cv2.imencode(os.path.splitext(path)[1] or ".png", img_color)
+    if not success:
+        raise ValueError(f"Failed to encode {path}")
+    with open(path, 'wb') as f:
+        f.write(buffer)
+
+
+def _contour_frame_job(job):
+    """Contour table for one frame (runs in the process pool)."""
+    image_path, threshold, blur_size, min_area, annotated_folder = job
+    try:
+        pipeline = ContourPipeline(decode_image(image_path))
+    except (OSError, ValueError) as e:
+        return None, str(e)
+    contours, hierarchy = pipeline.contours(threshold, blur_size)
+    table = contour_table(contours, hierarchy, min_area)
+    if annotated_folder:
+        kept = [contours[i] for i in table["contour_id"]]
+        annotated = annotate_contours(pipeline.image, pipeline.inverted, kept, table)
+        write_image(os.path.join(annotated_folder, f"contours_{os.path.basename(image_path)}"), annotated)
+    return table, None
+
+
+def extract_contours(folder_path, save_path, threshold, blur_size, workers=1, chunksize=4, annotated_folder=None, on_frame=None, min_area=0.0):
+    """
+    Run the contour pipeline over every image in a folder and save one columnar contour table.
+
+    The table is an .npz file with one array per column of CONTOUR_COLUMNS, one row per
+    contour. The frame column indexes the frame_names and frame_timestamps arrays, and
+    next/previous/first_child/parent are the findContours hierarchy (-1 for none).
+
+    Args:
+        folder_path (str): Folder with the timelapse frames.
+        save_path (str): Output .npz file.
+        threshold (int): Binary threshold (0-255).
+        blur_size (int): Box blur size; even sizes are rounded up to odd.
+        workers (int): Number of worker processes.
+        chunksize (int): Frames handed to a worker at a time.
+        annotated_folder (str): If given, annotated images are written there as contours_<name>.
+        on_frame (callable): Called with (image file, skip reason) after each frame.
+        min_area (float): Contours with a smaller area are neither stored nor drawn.
+
+    Returns:
+        list: (image file, reason) for every frame that could not be processed.
+    """
+    image_files = list_image_files(folder_path)
+    if annotated_folder:
+        os.makedirs(annotated_folder, exist_ok=True)
+    jobs = [(os.path.join(folder_path, f), threshold, blur_size, min_area, annotated_folder) for f in image_files]
+
+    tables = []
+    frame_names = []
+    frame_timestamps = []
+    skipped = []
+    metrics = run_metrics.current()
+    # Decoding and detection run in the workers, so "detect" is the time spent waiting for them
+    results = metrics.timed("detect", map_frames(_contour_frame_job, jobs, workers, chunksize))
+    for image_file, (table, reason) in zip(image_files, results):
+        metrics.add("detect", bytes_read=os.path.getsize(os.path.join(folder_path, image_file)))
+        if reason:
+            skipped.append((image_file, reason))
+        else:
+            table["frame"][:] = len(frame_names)
+            tables.append(table)
+            frame_names.append(image_file)
+            frame_timestamps.append(frame_timestamp(os.path.join(folder_path, image_file)))
+        if on_frame:
+            on_frame(image_file, reason)
+
+    columns = {
+        name: np.concatenate([table[name] for table in tables]) if tables else np.zeros(0, dtype)
+        for name, dtype in CONTOUR_COLUMNS.items()
+    }
+    with metrics.stage("table_save"):
+        np.savez(
+            save_path,
+            frame_names=np.array(frame_names, dtype=str),
+            frame_timestamps=np.array(frame_timestamps, dtype=str),
+            threshold=threshold,
+            blur_size=odd_blur_size(blur_size),
+            min_area=min_area,
+            **columns,
+        )
+    # np.savez appends .npz when the path has no extension
+    saved_path = save_path if save_path.endswith(".npz") else save_path + ".npz"
+    metrics.add("table_save", bytes_written=os.path.getsize(saved_path))
+    return skipped
+
+
+def load_contour_table(path):
+    """Load a table written by extract_contours as a dict of column arrays."""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
@@ -0,0 +1,205 @@
+import numpy as np
+
+from contour_pipeline import load_contour_table
+
+# The 3x3 block of grid cells around a point covers every neighbour within one cell size
+_NEIGHBOUR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+def _cell_keys(cx, cy):
+    return cx.astype(np.int64) * (1 << 32) + cy.astype(np.int64)
+
+
+def candidate_pairs(points_a, points_b, max_distance):
+    """
+    All (i, j) with |points_a[i] - points_b[j]| <= max_distance, found through a uniform grid.
+
+    points_b is bucketed into cells of size max_distance and sorted by cell, so each point
+    of points_a only looks at the 3x3 cells around it. Everything is vectorized; the cost
+    grows with the number of nearby pairs rather than with len(a) * len(b).
+    """
+    if not len(points_a) or not len(points_b):
+        empty = np.zeros(0, np.intp)
+        return empty, empty
+    cell_a = np.floor(points_a / max_distance).astype(np.int64)
+    cell_b = np.floor(points_b / max_distance).astype(np.int64)
+    keys_b = _cell_keys(cell_b[:, 0], cell_b[:, 1])
+    order = np.argsort(keys_b, kind="stable")
+    sorted_keys = keys_b[order]
+
+    pairs_a, pairs_b = [], []
+    for dx, dy in _NEIGHBOUR_OFFSETS:
+        keys = _cell_keys(cell_a[:, 0] + dx, cell_a[:, 1] + dy)
+        start = np.searchsorted(sorted_keys, keys, side="left")
+        stop = np.searchsorted(sorted_keys, keys, side="right")
+        counts = stop - start
+        if not counts.any():
+            continue
+        a = np.repeat(np.arange(len(points_a)), counts)
+        # Position within each run of equal keys: global index minus the run's first index
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pairs_a.append(a)
+        pairs_b.append(order[np.repeat(start, counts) + within])
+    if not pairs_a:
+        empty = np.zeros(0, np.intp)
+        return empty, empty
+    a = np.concatenate(pairs_a)
+    b = np.concatenate(pairs_b)
+    close = np.hypot(*(points_a[a] - points_b[b]).T) <= max_distance
+    return a[close], b[close]
+
+
+def bbox_iou(boxes_a, boxes_b):
+    """Intersection over union of matching rows of two (n, 4) arrays of x, y, w, h."""
+    x0 = np.maximum(boxes_a[:, 0], boxes_b[:, 0])
+    y0 = np.maximum(boxes_a[:, 1], boxes_b[:, 1])
+    x1 = np.minimum(boxes_a[:, 0] + boxes_a[:, 2], boxes_b[:, 0] + boxes_b[:, 2])
+    y1 = np.minimum(boxes_a[:, 1] + boxes_a[:, 3], boxes_b[:, 1] + boxes_b[:, 3])
+    intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    union = boxes_a[:, 2] * boxes_a[:, 3] + boxes_b[:, 2] * boxes_b[:, 3] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1), 0.0)
+
+
+def greedy_match(a, b, cost):
+    """
+    Pick pairs in order of increasing cost, each index of a and b at most once.
+
+    Instead of walking the sorted pairs one by one, every round accepts all pairs that
+    are the cheapest remaining pair for both of their ends, which gives the same result.
+    """
+    order = np.lexsort((b, a, cost))
+    a, b = a[order], b[order]
+    matched_a, matched_b = [], []
+    while len(a):
+        first_a = np.zeros(len(a), bool)
+        first_a[np.unique(a, return_index=True)[1]] = True
+        first_b = np.zeros(len(b), bool)
+        first_b[np.unique(b, return_index=True)[1]] = True
+        accept = first_a & first_b
+        matched_a.append(a[accept])
+        matched_b.append(b[accept])
+        keep = ~np.isin(a, a[accept]) & ~np.isin(b, b[accept])
+        a, b = a[keep], b[keep]
+    if not matched_a:
+        empty = np.zeros(0, np.intp)
+        return empty, empty
+    return np.concatenate(matched_a), np.concatenate(matched_b)
+
+
+def track_contours(table, max_distance=20.0, max_gap=0, min_area=0.0, top_level_only=False):
+    """
+    Link the contours of consecutive frames into tracks.
+
+    A contour is matched to a track whose last position is within max_distance pixels;
+    among candidates the cost is the normalized centroid distance plus (1 - bbox IoU),
+    and pairs are assigned greedily by cost. Unmatched contours start new tracks. A track
+    that finds no match stays open for max_gap further frames.
+
+    Args:
+        table (dict): Contour table as returned by load_contour_table.
+        max_distance (float): Maximum centroid movement between frames, in pixels.
+        max_gap (int): Number of frames a track may be missing before it is closed.
+        min_area (float): Contours with a smaller area are not tracked.
+        top_level_only (bool): Only track outer contours (no parent in the hierarchy).
+
+    Returns:
+        np.ndarray: Track id per table row (-1 for rows that were filtered out).
+    """
+    frames = table["frame"]
+    track_ids = np.full(len(frames), -1, np.int64)
+    eligible = table["area"] >= min_area
+    if top_level_only:
+        eligible &= table["parent"] < 0
+    points = np.column_stack([table["centroid_x"], table["centroid_y"]]).astype(np.float64)
+    boxes = np.column_stack([table["bbox_x"], table["bbox_y"], table["bbox_w"], table["bbox_h"]]).astype(np.float64)
+
+    # Open tracks: id, last row and the frame of that row
+    open_ids = np.zeros(0, np.int64)
+    open_rows = np.zeros(0, np.intp)
+    open_frames = np.zeros(0, np.int64)
+    next_id = 0
+    boundaries = np.flatnonzero(np.diff(frames)) + 1
+    for rows in np.split(np.arange(len(frames)), boundaries):
+        if not len(rows):
+            continue
+        frame = frames[rows[0]]
+        rows = rows[eligible[rows]]
+        alive = frame - open_frames <= max_gap + 1
+        open_ids, open_rows, open_frames = open_ids[alive], open_rows[alive], open_frames[alive]
+
+        a, b = candidate_pairs(points[rows], points[open_rows], max_distance)
+        distance = np.hypot(*(points[rows[a]] - points[open_rows[b]]).T)
+        cost = distance / max_distance + (1.0 - bbox_iou(boxes[rows[a]], boxes[open_rows[b]]))
+        matched_rows, matched_tracks = greedy_match(a, b, cost)
+
+        track_ids[rows[matched_rows]] = open_ids[matched_tracks]
+        open_rows[matched_tracks] = rows[matched_rows]
+        open_frames[matched_tracks] = frame
+
+        new = np.ones(len(rows), bool)
+        new[matched_rows] = False
+        new_ids = np.arange(next_id, next_id + new.sum())
+        next_id += len(new_ids)
+        track_ids[rows[new]] = new_ids
+        open_ids = np.concatenate([open_ids, new_ids])
+        open_rows = np.concatenate([open_rows, rows[new]])
+        open_frames = np.concatenate([open_frames, np.full(len(new_ids), frame)])
+    return track_ids
+
+
+def track_series(table, track_ids):
+    """
+    Per-track time series of position and area.
+
+    Returns:
+        dict: track id -> dict of arrays frame, timestamp, centroid_x, centroid_y, area.
+    """
+    tracked = np.flatnonzero(track_ids >= 0)
+    order = tracked[np.lexsort((table["frame"][tracked], track_ids[tracked]))]
+    ids, starts = np.unique(track_ids[order], return_index=True)
+    series = {}
+    for track_id, rows in zip(ids, np.split(order, starts[1:])):
+        series[int(track_id)] = {
+            "frame": table["frame"][rows],
+            "timestamp": table["frame_timestamps"][table["frame"][rows]],
+            "centroid_x": table["centroid_x"][rows],
+            "centroid_y": table["centroid_y"][rows],
+            "area": table["area"][rows],
+        }
+    return series
+
+
+def track_contour_table(table_path, save_path, max_distance=20.0, max_gap=0, min_area=0.0, top_level_only=False):
+    """
+    Track the contours of a table written by extract_contours and save the result.
+
+    The output .npz holds every column of the input plus track_id, and a per-track summary
+    (track_ids, track_first_frame, track_last_frame, track_length, track_mean_area).
+
+    Returns:
+        int: Number of tracks.
+    """
+    table = load_contour_table(table_path)
+    track_ids = track_contours(table, max_distance, max_gap, min_area, top_level_only)
+    tracked = track_ids >= 0
+    ids, inverse, lengths = np.unique(track_ids[tracked], return_inverse=True, return_counts=True)
+    frames = table["frame"][tracked]
+    first_frame = np.full(len(ids), np.iinfo(np.int32).max, np.int64)
+    last_frame = np.full(len(ids), -1, np.int64)
+    np.minimum.at(first_frame, inverse, frames)
+    np.maximum.at(last_frame, inverse, frames)
+    mean_area = np.bincount(inverse, weights=table["area"][tracked], minlength=len(ids)) / np.maximum(lengths, 1)
+    np.savez(
+        save_path,
+        **table,
+        track_id=track_ids,
+        track_ids=ids,
+        track_first_frame=first_frame,
+        track_last_frame=last_frame,
+        track_length=lengths,
+        track_mean_area=mean_area,
+        max_distance=max_distance,
+        max_gap=max_gap,
+    )
+    return len(ids)
+
@@ -1,53 +1,13 @@
-import pandas as pd
-import numpy as np
+import multiprocessing
 import tkinter as tk
 from tkinter import filedialog, messagebox
-
-def calculate_area_integral(input_file: str, output_file: str):
-    try:
-        # Excelファイルを読み込み
-        excel_data = pd.ExcelFile(input_file)
-
-        # 結果を格納するリスト
-        integration_results = []
-
-        # 各シートについて処理
-        for sheet_name in excel_data.sheet_names:
-            # シートデータをデータフレームとして取得
-            df = excel_data.parse(sheet_name, header=None)
-
-            # 1行目はX座標、1列目はY座標
-            x_coords = df.iloc[0, 1:].astype(float).values  # X座標を取得
-            y_coords = df.iloc[1:, 0].astype(float).values  # Y座標を取得
-            brightness_values = df.iloc[1:, 1:].astype(float).values  # 輝度値部分
-
-            # 正の輝度値のみ対象にする
-            brightness_values[brightness_values <= 0] = 0
-
-            # 2次元積分を実施（台形法）
-            area_integral = np.trapz(np.trapz(brightness_values, x=x_coords, axis=1), x=y_coords)
-
-            # 単位面積当たりの平均輝度値を計算
-            positive_area = np.trapz(np.trapz(brightness_values > 0, x=x_coords, axis=1), x=y_coords)
-            average_brightness = area_integral / positive_area if positive_area > 0 else 0
-
-            # シート名、積分値、平均輝度値を結果に追加
-            integration_results.append((sheet_name, area_integral, average_brightness))
-
-        # 結果をデータフレームとして整形
-        result_df = pd.DataFrame(integration_results, columns=["Sheet Name", "Area Integral", "Average Brightness"])
-
-        # 結果を新しいExcelファイルとして保存
-        result_df.to_excel(output_file, index=False)
-        messagebox.showinfo("成功", "積分結果を保存しました。")
-
-    except Exception as e:
-        messagebox.showerror("エラー", f"エラーが発生しました:\n{e}")
+from area_integration import calculate_area_integral, parse_regions
+from run_metrics import RunRecorder, tk_status_callback
 
 def select_input_file():
     input_file = filedialog.askopenfilename(
         title="入力ファイルを選択",
-        filetypes=[("Excelファイル", "*.xlsx;*.xls")]
+        filetypes=[("Excelファイル", "*.xlsx;*.xls"), ("輝度キューブ", "*.npy")]
     )
     if input_file:
         input_file_entry.delete(0, tk.END)
@@ -70,34 +30,61 @@ def start_processing():
     if not input_file or not output_file:
         messagebox.showwarning("警告", "入力ファイルと出力ファイルを指定してください。")
         return
+    try:
+        regions = parse_regions(regions_entry.get())
+    except ValueError as e:
+        messagebox.showerror("エラー", f"部分矩形の指定が正しくありません:\n{e}")
+        return
 
-    calculate_area_integral(input_file, output_file)
-
-# GUIの設定
-root = tk.Tk()
-root.title("Excel 面積積分ツール")
-
-# ファイル選択部分
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack()
-
-# 入力ファイル選択
-tk.Label(frame, text="入力ファイル:").grid(row=0, column=0, sticky="w")
-input_file_entry = tk.Entry(frame, width=50)
-input_file_entry.grid(row=0, column=1, padx=5)
-input_file_button = tk.Button(frame, text="選択", command=select_input_file)
-input_file_button.grid(row=0, column=2)
-
-# 出力ファイル選択
-tk.Label(frame, text="出力ファイル:").grid(row=1, column=0, sticky="w")
-output_file_entry = tk.Entry(frame, width=50)
-output_file_entry.grid(row=1, column=1, padx=5)
-output_file_button = tk.Button(frame, text="保存", command=select_output_file)
-output_file_button.grid(row=1, column=2)
-
-# 実行ボタン
-process_button = tk.Button(root, text="積分計算開始", command=start_processing, bg="lightblue")
-process_button.pack(pady=10)
+    try:
+        params = {"input": input_file, "regions": regions}
+        with RunRecorder("area_integral", output_file, params, on_update=tk_status_callback(root, run_status.set), profile=profile_var.get()):
+            calculate_area_integral(input_file, output_file, regions=regions)
+        messagebox.showinfo("成功", "積分結果を保存しました。")
+    except Exception as e:
+        messagebox.showerror("エラー", f"エラーが発生しました:\n{e}")
 
-# メインループの開始
-root.mainloop()
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+
+    # GUIの設定
+    root = tk.Tk()
+    root.title("Excel 面積積分ツール")
+
+    # ファイル選択部分
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack()
+
+    # 入力ファイル選択
+    tk.Label(frame, text="入力ファイル:").grid(row=0, column=0, sticky="w")
+    input_file_entry = tk.Entry(frame, width=50)
+    input_file_entry.grid(row=0, column=1, padx=5)
+    input_file_button = tk.Button(frame, text="選択", command=select_input_file)
+    input_file_button.grid(row=0, column=2)
+
+    # 出力ファイル選択
+    tk.Label(frame, text="出力ファイル:").grid(row=1, column=0, sticky="w")
+    output_file_entry = tk.Entry(frame, width=50)
+    output_file_entry.grid(row=1, column=1, padx=5)
+    output_file_button = tk.Button(frame, text="保存", command=select_output_file)
+    output_file_button.grid(row=1, column=2)
+
+    # 部分矩形（省略可能）
+    tk.Label(frame, text="部分矩形 (x0,x1,y0,y1; ...):").grid(row=2, column=0, sticky="w")
+    regions_entry = tk.Entry(frame, width=50)
+    regions_entry.grid(row=2, column=1, padx=5)
+
+    # 処理のプロファイル（出力ファイルの隣に .prof を保存）
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame, text="処理をプロファイルする（出力ファイルの隣に .prof を保存）", variable=profile_var).grid(row=3, column=0, columnspan=3, sticky="w")
+
+    # 実行ボタン
+    process_button = tk.Button(root, text="積分計算開始", command=start_processing, bg="lightblue")
+    process_button.pack(pady=10)
+
+    # 処理の段階ごとの時間とメモリ
+    run_status = tk.StringVar(value="")
+    tk.Label(root, textvariable=run_status).pack(pady=5)
+
+    # メインループの開始
+    root.mainloop()
@@ -1,7 +1,8 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
 import os
+from brightness_extraction import list_image_files, crop_images
+from run_metrics import RunRecorder, tk_status_callback
 
 def select_folder():
     folder_path = filedialog.askdirectory()
@@ -34,28 +35,15 @@ def extract_and_save_cropped_images():
         if not os.path.exists(save_folder_val):
             os.makedirs(save_folder_val)  # 保存フォルダを作成
 
-        image_files = [f for f in os.listdir(folder_path_val) if f.lower().endswith((".png", ".jpg", ".jpeg", ".bmp", ".tiff"))]
-        if not image_files:
+        if not list_image_files(folder_path_val):
             messagebox.showerror("Error", "選択されたフォルダに画像ファイルが見つかりません。")
             return
 
-        for image_file in image_files:
-            image_path = os.path.join(folder_path_val, image_file)
-            img = Image.open(image_path)
-            width, height = img.size
-
-            # 入力範囲が画像サイズを超えていないかチェック
-            if not (0 <= x_coord < width and 0 <= y_coord < height):
-                messagebox.showwarning("Warning", f"{image_file}をスキップ: 指定された座標が画像範囲外です。")
-                continue
-            if x_coord + rect_width > width or y_coord + rect_height > height:
-                messagebox.showwarning("Warning", f"{image_file}をスキップ: 矩形範囲が画像の範囲外です。")
-                continue
-
-            # 画像を切り抜いて保存
-            cropped_img = img.crop((x_coord, y_coord, x_coord + rect_width, y_coord + rect_height))
-            save_path = os.path.join(save_folder_val, f"cropped_{image_file}")
-            cropped_img.save(save_path)
+        params = {"folder": folder_path_val, "x": x_coord, "y": y_coord, "width": rect_width, "height": rect_height}
+        with RunRecorder("crop", save_folder_val, params, on_update=tk_status_callback(root, run_status.set), profile=profile_var.get()):
+            skipped = crop_images(folder_path_val, x_coord, y_coord, rect_width, rect_height, save_folder_val, incremental_var.get())
+        for image_file, reason in skipped:
+            messagebox.showwarning("Warning", f"{image_file}をスキップ: {reason}")
 
         messagebox.showinfo("Success", f"画像が{save_folder_val}に保存されました。")
 
@@ -64,47 +52,60 @@ def extract_and_save_cropped_images():
     except Exception as e:
         messagebox.showerror("Error", f"予期しないエラーが発生しました: {e}")
 
-# GUI Setup
-root = tk.Tk()
-root.title("Rectangle Image Cropper")
+if __name__ == "__main__":
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Rectangle Image Cropper")
+
+    image_folder_path = tk.StringVar()
+    save_folder_path = tk.StringVar()
+
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack(fill="both", expand=True)
+
+    # フォルダ選択
+    tk.Label(frame, text="Select Image Folder:").grid(row=0, column=0, sticky="e", pady=5)
+    tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
+    tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
 
-image_folder_path = tk.StringVar()
-save_folder_path = tk.StringVar()
+    # 保存先フォルダ選択
+    tk.Label(frame, text="Select Save Folder:").grid(row=1, column=0, sticky="e", pady=5)
+    tk.Entry(frame, textvariable=save_folder_path, width=40).grid(row=1, column=1, padx=5, pady=5)
+    tk.Button(frame, text="Browse", command=select_save_folder).grid(row=1, column=2, pady=5)
 
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack(fill="both", expand=True)
+    # X座標入力
+    tk.Label(frame, text="X-Coordinate:").grid(row=2, column=0, sticky="e", pady=5)
+    x_entry = tk.Entry(frame, width=30)
+    x_entry.grid(row=2, column=1, padx=5, pady=5)
 
-# フォルダ選択
-tk.Label(frame, text="Select Image Folder:").grid(row=0, column=0, sticky="e", pady=5)
-tk.Entry(frame, textvariable=image_folder_path, width=40).grid(row=0, column=1, padx=5, pady=5)
-tk.Button(frame, text="Browse", command=select_folder).grid(row=0, column=2, pady=5)
+    # Y座標入力
+    tk.Label(frame, text="Y-Coordinate:").grid(row=3, column=0, sticky="e", pady=5)
+    y_entry = tk.Entry(frame, width=30)
+    y_entry.grid(row=3, column=1, padx=5, pady=5)
 
-# 保存先フォルダ選択
-tk.Label(frame, text="Select Save Folder:").grid(row=1, column=0, sticky="e", pady=5)
-tk.Entry(frame, textvariable=save_folder_path, width=40).grid(row=1, column=1, padx=5, pady=5)
-tk.Button(frame, text="Browse", command=select_save_folder).grid(row=1, column=2, pady=5)
+    # 幅入力
+    tk.Label(frame, text="Rectangle Width:").grid(row=4, column=0, sticky="e", pady=5)
+    width_entry = tk.Entry(frame, width=30)
+    width_entry.grid(row=4, column=1, padx=5, pady=5)
 
-# X座標入力
-tk.Label(frame, text="X-Coordinate:").grid(row=2, column=0, sticky="e", pady=5)
-x_entry = tk.Entry(frame, width=30)
-x_entry.grid(row=2, column=1, padx=5, pady=5)
+    # 高さ入力
+    tk.Label(frame, text="Rectangle Height:").grid(row=5, column=0, sticky="e", pady=5)
+    height_entry = tk.Entry(frame, width=30)
+    height_entry.grid(row=5, column=1, padx=5, pady=5)
 
-# Y座標入力
-tk.Label(frame, text="Y-Coordinate:").grid(row=3, column=0, sticky="e", pady=5)
-y_entry = tk.Entry(frame, width=30)
-y_entry.grid(row=3, column=1, padx=5, pady=5)
+    # 増分処理（新規・変更された画像だけを処理）
+    incremental_var = tk.BooleanVar(value=True)
+    tk.Checkbutton(frame, text="Only process new or changed frames (resume)", variable=incremental_var).grid(row=6, column=0, columnspan=3, pady=5)
 
-# 幅入力
-tk.Label(frame, text="Rectangle Width:").grid(row=4, column=0, sticky="e", pady=5)
-width_entry = tk.Entry(frame, width=30)
-width_entry.grid(row=4, column=1, padx=5, pady=5)
+    # 処理のプロファイル（保存先フォルダに .prof を保存）
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame, text="Profile run (save .prof in the save folder)", variable=profile_var).grid(row=7, column=0, columnspan=3, pady=5)
 
-# 高さ入力
-tk.Label(frame, text="Rectangle Height:").grid(row=5, column=0, sticky="e", pady=5)
-height_entry = tk.Entry(frame, width=30)
-height_entry.grid(row=5, column=1, padx=5, pady=5)
+    # 抽出と保存ボタン
+    tk.Button(frame, text="Extract and Save Cropped Images", command=extract_and_save_cropped_images).grid(row=8, column=0, columnspan=3, pady=10)
 
-# 抽出と保存ボタン
-tk.Button(frame, text="Extract and Save Cropped Images", command=extract_and_save_cropped_images).grid(row=6, column=0, columnspan=3, pady=10)
+    # 処理の段階ごとの時間とメモリ
+    run_status = tk.StringVar(value="")
+    tk.Label(frame, textvariable=run_status).grid(row=9, column=0, columnspan=3, pady=5)
 
-root.mainloop()
+    root.mainloop()
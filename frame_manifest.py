@@ -0,0 +1,68 @@
+# ファイル名: frame_manifest.py
+"""
+出力ごとのフレームマニフェスト。
+
+処理済みの各画像のパス・サイズ・更新日時と抽出パラメータを記録し、
+再実行時には新規または変更された画像だけを処理できるようにします。
+"""
+import json
+import os
+
+MANIFEST_VERSION = 1
+
+
+def manifest_path(output_path):
+    """出力に対応するマニフェストのパスを返す（出力がフォルダの場合はフォルダ内に置く）"""
+    if os.path.isdir(output_path):
+        return os.path.join(output_path, ".frame_manifest.json")
+    return os.path.splitext(output_path)[0] + ".manifest.json"
+
+
+class FrameManifest:
+    """
+    処理済みフレームの記録。
+
+    Args:
+        output_path (str): 出力ファイル（またはフォルダ）のパス。
+        params (dict): 抽出パラメータ。記録済みのパラメータと異なる場合や出力が存在しない場合は記録を破棄します。
+    """
+
+    def __init__(self, output_path, params):
+        self.path = manifest_path(output_path)
+        self.params = params
+        self.frames = {}
+        if os.path.exists(self.path) and os.path.exists(output_path):
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION and data.get("params") == params:
+                self.frames = data.get("frames", {})
+
+    def is_current(self, image_path):
+        """画像が前回の処理から変更されていなければ True を返す"""
+        entry = self.frames.get(os.path.basename(image_path))
+        if entry is None:
+            return False
+        stat = os.stat(image_path)
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def pending(self, folder_path, image_files):
+        """未処理または変更された画像ファイル名を返す"""
+        return [f for f in image_files if not self.is_current(os.path.join(folder_path, f))]
+
+    def record(self, image_path, skipped=None):
+        """画像を処理済みとして記録する（skipped にはスキップ理由を渡す）"""
+        stat = os.stat(image_path)
+        self.frames[os.path.basename(image_path)] = {
+            "path": os.path.abspath(image_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "skipped": skipped,
+        }
+
+    def save(self):
+        """マニフェストを書き込む（書き込み途中で中断されても前回の内容が残るよう置き換えで保存）"""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "params": self.params, "frames": self.frames}, f, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
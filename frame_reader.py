@@ -0,0 +1,238 @@
+# ファイル名: frame_reader.py
+"""
+画像の一部分だけを読み込むフレームリーダー。
+
+非圧縮の BMP と、非圧縮のストリップ/タイル形式の TIFF はヘッダーを解析して画素データをメモリマップし、
+要求された矩形や列のバイトだけを読み込みます。行の並び順・行末のパディング・グレースケール変換は
+読み込んだ部分にだけ適用します。それ以外の形式（圧縮されたものを含む）は画像全体をデコードして切り出します。
+
+グレースケール変換は PIL の convert("L") と同じ整数演算で行うため、結果は全体をデコードした場合と一致します。
+"""
+import struct
+
+import numpy as np
+from PIL import Image
+
+
+def load_luminance(image_path):
+    """画像をグレースケールで読み込み、(高さ, 幅) の uint8 配列として返す"""
+    with Image.open(image_path) as img:
+        return np.asarray(img.convert("L"))
+
+
+def luma(pixels, order):
+    """
+    画素を PIL の convert("L") と同じ整数演算で輝度に変換する。
+
+    ファイルから読み込んだフレームとカメラから取り込んだフレームの輝度を一致させるため、
+    cv2.cvtColor（丸めが異なり、一部の画素が1ずれる）ではなくこの関数を使います。
+
+    Args:
+        pixels (numpy.ndarray): (…, チャンネル) の uint8 配列。
+        order (str): チャンネルの並び（"bgr", "rgb", "bgra" など。"gray" の場合は最初のチャンネルをそのまま返す）。
+
+    Returns:
+        numpy.ndarray: (…) の uint8 配列。
+    """
+    if order == "gray":
+        return pixels[..., 0].copy()
+    # 一時配列を増やさないよう、同じ uint32 配列に順に加算する
+    total = pixels[..., order.index("r")].astype(np.uint32)
+    total *= 19595
+    for channel, weight in (("g", 38470), ("b", 7471)):
+        term = pixels[..., order.index(channel)].astype(np.uint32)
+        term *= weight
+        total += term
+    total += 0x8000
+    total >>= 16
+    return total.astype(np.uint8)
+
+
+class _BmpFrame:
+    """非圧縮 BMP（8/24/32 ビット）の画素データをメモリマップして読む"""
+
+    def __init__(self, path, header):
+        pixel_offset = struct.unpack_from("<I", header, 10)[0]
+        dib_size = struct.unpack_from("<I", header, 14)[0]
+        if dib_size < 40:
+            raise NotImplementedError("OS/2 形式の BMP")
+        width, height, _, bpp, compression = struct.unpack_from("<iiHHI", header, 18)
+        if compression != 0 or bpp not in (8, 24, 32) or width <= 0 or height == 0:
+            raise NotImplementedError("圧縮またはビット数が未対応の BMP")
+        self.size = (width, abs(height))
+        self.bottom_up = height > 0
+        self.bytes_per_pixel = bpp // 8
+        stride = ((width * bpp + 31) // 32) * 4
+        self.rows = np.memmap(path, np.uint8, "r", offset=pixel_offset, shape=(abs(height), stride))
+        self.lut = None
+        if bpp == 8:
+            # パレットの各色を輝度に変換した表を引く
+            colors = struct.unpack_from("<I", header, 46)[0] or 256
+            palette = np.frombuffer(header, np.uint8, colors * 4, 14 + dib_size).reshape(colors, 4)
+            self.lut = np.zeros(256, np.uint8)
+            self.lut[:colors] = luma(palette[:, :3], "bgr")
+
+    def _file_rows(self, y, h):
+        """画像の y 行目から h 行分に対応するファイル上の行（下から上に格納されている場合は逆順）"""
+        if self.bottom_up:
+            start = self.size[1] - 1 - y
+            return slice(start, start - h if start - h >= 0 else None, -1)
+        return slice(y, y + h)
+
+    def _pixels(self, rows, count):
+        return np.asarray(rows).reshape(rows.shape[0], count, self.bytes_per_pixel)
+
+    def _to_luma(self, pixels):
+        if self.lut is not None:
+            return self.lut[pixels[..., 0]]
+        return luma(pixels, "bgr")
+
+    def luminance_region(self, x, y, w, h):
+        bpp = self.bytes_per_pixel
+        return self._to_luma(self._pixels(self.rows[self._file_rows(y, h), x * bpp:(x + w) * bpp], w))
+
+    def luminance_columns(self, xs):
+        bpp = self.bytes_per_pixel
+        byte_index = (np.asarray(xs, dtype=np.intp)[:, np.newaxis] * bpp + np.arange(bpp)).ravel()
+        rows = self.rows[self._file_rows(0, self.size[1])][:, byte_index]
+        return self._to_luma(self._pixels(rows, len(xs)))
+
+    def image_region(self, x, y, w, h):
+        if self.lut is not None:
+            return None  # パレット画像は PIL で切り抜く
+        bpp = self.bytes_per_pixel
+        pixels = self._pixels(self.rows[self._file_rows(y, h), x * bpp:(x + w) * bpp], w)
+        return Image.fromarray(np.ascontiguousarray(pixels[..., 2::-1]), "RGB")
+
+
+_TIFF_TYPES = {3: ("H", 2), 4: ("I", 4)}
+_TIFF_MODES = {("gray", 1): "L", ("rgb", 3): "RGB", ("rgb", 4): "RGBA"}
+
+
+class _TiffFrame:
+    """非圧縮・チャンキー形式の 8 ビット TIFF（ストリップまたはタイル）の画素データをメモリマップして読む"""
+
+    def __init__(self, path, header):
+        endian = "<" if header[:2] == b"II" else ">"
+        tags = {}
+        with open(path, "rb") as f:
+            f.seek(struct.unpack_from(endian + "I", header, 4)[0])
+            count = struct.unpack(endian + "H", f.read(2))[0]
+            entries = f.read(count * 12)
+            for i in range(count):
+                tag, type_, n, value = struct.unpack_from(endian + "HHI4s", entries, i * 12)
+                if type_ not in _TIFF_TYPES:
+                    continue
+                code, item_size = _TIFF_TYPES[type_]
+                if n * item_size <= 4:
+                    raw = value[:n * item_size]
+                else:
+                    f.seek(struct.unpack(endian + "I", value)[0])
+                    raw = f.read(n * item_size)
+                tags[tag] = struct.unpack(endian + code * n, raw)
+
+        width, height = tags[256][0], tags[257][0]
+        samples = tags.get(277, (1,))[0]
+        if (tags.get(259, (1,))[0] != 1 or tags.get(284, (1,))[0] != 1 or tags.get(317, (1,))[0] != 1
+                or any(b != 8 for b in tags.get(258, (1,))) or tags.get(339, (1,))[0] != 1):
+            raise NotImplementedError("圧縮またはビット数が未対応の TIFF")
+        photometric = tags.get(262, (None,))[0]
+        if photometric == 1 and samples in (1, 2):
+            self.order = "gray"
+        elif photometric == 2 and samples in (3, 4):
+            self.order = "rgb"
+        else:
+            raise NotImplementedError("色空間が未対応の TIFF")
+
+        self.size = (width, height)
+        self.samples = samples
+        if 322 in tags:
+            self.block_size = (tags[322][0], tags[323][0])
+            self.offsets = tags[324]
+        else:
+            self.block_size = (width, min(tags.get(278, (height,))[0], height))
+            self.offsets = tags[273]
+        self.tiled = 322 in tags
+        self.blocks_across = -(-width // self.block_size[0])
+        self.data = np.memmap(path, np.uint8, "r")
+
+    def _region(self, x, y, w, h):
+        """矩形に重なるストリップ/タイルだけを読み、(h, w, サンプル数) の配列に詰める"""
+        bw, bh = self.block_size
+        out = np.empty((h, w, self.samples), np.uint8)
+        for row in range(y // bh, (y + h - 1) // bh + 1):
+            # タイルは端でも全サイズで格納されるが、最後のストリップは行数が少ない場合がある
+            rows_in_block = bh if self.tiled else min(bh, self.size[1] - row * bh)
+            block_bytes = rows_in_block * bw * self.samples
+            y0, y1 = max(y, row * bh), min(y + h, row * bh + rows_in_block)
+            for col in range(x // bw, (x + w - 1) // bw + 1):
+                offset = self.offsets[row * self.blocks_across + col]
+                block = self.data[offset:offset + block_bytes].reshape(rows_in_block, bw, self.samples)
+                x0, x1 = max(x, col * bw), min(x + w, col * bw + bw)
+                out[y0 - y:y1 - y, x0 - x:x1 - x] = block[y0 - row * bh:y1 - row * bh, x0 - col * bw:x1 - col * bw]
+        return out
+
+    def luminance_region(self, x, y, w, h):
+        return luma(self._region(x, y, w, h), self.order)
+
+    def luminance_columns(self, xs):
+        height = self.size[1]
+        columns = np.empty((height, len(xs)), np.uint8)
+        for k, x in enumerate(xs):
+            columns[:, k] = self.luminance_region(x, 0, 1, height)[:, 0]
+        return columns
+
+    def image_region(self, x, y, w, h):
+        mode = _TIFF_MODES.get((self.order, self.samples))
+        if mode is None:
+            return None
+        pixels = self._region(x, y, w, h)
+        return Image.fromarray(pixels[..., 0] if mode == "L" else pixels, mode)
+
+
+class _DecodedFrame:
+    """部分読み込みできない形式のフレーム（必要になった時点で全体をデコードする）"""
+
+    def __init__(self, path):
+        self.path = path
+        with Image.open(path) as img:
+            self.size = img.size
+        self._luminance = None
+
+    def _full_luminance(self):
+        if self._luminance is None:
+            self._luminance = load_luminance(self.path)
+        return self._luminance
+
+    def luminance_region(self, x, y, w, h):
+        return self._full_luminance()[y:y + h, x:x + w].copy()
+
+    def luminance_columns(self, xs):
+        return self._full_luminance()[:, list(xs)].copy()
+
+    def image_region(self, x, y, w, h):
+        return None
+
+
+def open_frame(image_path):
+    """
+    画像を部分読み込み用に開く。
+
+    Args:
+        image_path (str): 画像ファイルのパス。
+
+    Returns:
+        size (幅, 高さ) と、luminance_region(x, y, w, h)・luminance_columns(xs)・
+        image_region(x, y, w, h) を持つオブジェクト。矩形や列は画像内に収まっている必要があります。
+        image_region は元の色のまま切り抜いた PIL 画像を返し、部分読み込みできない形式では None を返します。
+    """
+    with open(image_path, "rb") as f:
+        header = f.read(1078)  # BMP のファイルヘッダー + 情報ヘッダー + 最大のパレット
+    try:
+        if header[:2] == b"BM":
+            return _BmpFrame(image_path, header)
+        if header[:4] in (b"II*\x00", b"MM\x00*"):
+            return _TiffFrame(image_path, header)
+    except (NotImplementedError, KeyError, IndexError, struct.error, ValueError):
+        pass  # 未対応のヘッダーや途中までしか書かれていないファイルは PIL に任せる
+    return _DecodedFrame(image_path)
@@ -0,0 +1,70 @@
+# ファイル名: frame_watch.py
+"""
+撮影中のフォルダを監視し、書き込みが完了した新しいフレームを順に返す。
+
+処理済みのファイル名は記録しておき、再度 stat やデコードを行いません。
+"""
+import os
+
+
+class FolderWatcher:
+    """
+    フォルダをポーリングして新しい画像ファイルを検出する。
+
+    Args:
+        folder_path (str): 監視するフォルダのパス。
+        extensions (tuple): 対象とする拡張子（小文字）。
+        poll_interval (float): ポーリング間隔（秒）。
+        known (iterable): 処理済みとして扱うファイル名。
+    """
+
+    def __init__(self, folder_path, extensions, poll_interval=0.5, known=()):
+        self.folder_path = folder_path
+        self.extensions = extensions
+        self.poll_interval = poll_interval
+        self.seen = set(known)
+        # 書き込み中かもしれないファイルの (サイズ, 更新日時)
+        self._candidates = {}
+        self._retries = {}
+
+    def poll(self):
+        """
+        書き込みが完了した新しいファイル名をファイル名順に返す。
+
+        前回のポーリングからサイズと更新日時が変わっていないファイルを書き込み完了とみなします。
+        """
+        ready = []
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                name = entry.name
+                if name in self.seen or not name.lower().endswith(self.extensions):
+                    continue
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if stat.st_size > 0 and self._candidates.get(name) == signature:
+                    ready.append(name)
+                    self.seen.add(name)
+                    del self._candidates[name]
+                else:
+                    self._candidates[name] = signature
+        return sorted(ready)
+
+    def requeue(self, name, max_retries=10):
+        """
+        デコードに失敗したファイルを次回以降のポーリングで再び返すようにする。
+
+        書き込みが一時的に止まっていたファイルを救済するためのもので、max_retries 回を超えた場合は False を返します。
+        """
+        self._retries[name] = self._retries.get(name, 0) + 1
+        if self._retries[name] > max_retries:
+            return False
+        self.seen.discard(name)
+        return True
+
+    def watch(self, stop_event):
+        """stop_event がセットされるまで、新しいファイル名のリストを検出するたびに返す"""
+        while not stop_event.is_set():
+            ready = self.poll()
+            if ready:
+                yield ready
+            stop_event.wait(self.poll_interval)
@@ -1,13 +1,17 @@
 # ファイル名: gui_brightness_histogram.py
 
+import multiprocessing
+import os
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib import rcParams
 from matplotlib.font_manager import FontProperties
+from brightness_histogram import export_heatmap, histogram_time_series, load_analysis
 
 # フォント設定（日本語対応）
 try:
@@ -16,28 +20,20 @@ try:
 except Exception as e:
     print("フォント設定に失敗しました。デフォルトフォントを使用します。", e)
 
-def calculate_average_brightness(image_path: str) -> float:
+def plot_histogram(histogram):
     try:
-        img = Image.open(image_path).convert('L')  # グレースケールに変換
-        img_array = np.array(img)
-        avg_brightness = img_array.mean()
-        return avg_brightness
-    except Exception as e:
-        messagebox.showerror("エラー", f"画像処理中にエラーが発生しました: {e}")
-        return -1
-
-def plot_histogram(image_path: str):
-    try:
-        img = Image.open(image_path).convert('L')  # グレースケールに変換
-        img_array = np.array(img)
-        hist, bins = np.histogram(img_array, bins=256, range=(0, 256))
+        max_value = len(histogram) - 1
 
         # プロット
         fig = plt.Figure(figsize=(6, 4), dpi=100)  # サイズ調整
         ax = fig.add_subplot(111)
-        ax.bar(bins[:-1], hist, width=1, color='dodgerblue', edgecolor='black', alpha=0.7)
+        if len(histogram) == 256:
+            ax.bar(np.arange(256), histogram, width=1, color='dodgerblue', edgecolor='black', alpha=0.7)
+        else:
+            # 16ビット画像は65536本の棒を描かず、輪郭だけを描く
+            ax.fill_between(np.arange(len(histogram)), histogram, step='mid', color='dodgerblue', alpha=0.7)
         ax.set_title("明るさヒストグラム", fontproperties=jp_font, fontsize=16)
-        ax.set_xlabel("輝度値 (0-255)", fontproperties=jp_font, fontsize=12)
+        ax.set_xlabel(f"輝度値 (0-{max_value})", fontproperties=jp_font, fontsize=12)
         ax.set_ylabel("ピクセル数", fontproperties=jp_font, fontsize=12)
         ax.grid(visible=True, color='gray', linestyle='--', linewidth=0.5, alpha=0.7)
         ax.set_facecolor('#f5f5f5')
@@ -50,22 +46,21 @@ def plot_histogram(image_path: str):
 def select_image():
     file_path = filedialog.askopenfilename(
         title="画像を選択してください",
-        filetypes=[("画像ファイル", "*.jpg;*.jpeg;*.png;*.bmp;*.tiff")]
+        filetypes=[("画像ファイル", "*.jpg;*.jpeg;*.png;*.bmp;*.tif;*.tiff")]
     )
     if file_path:
         try:
-            img = Image.open(file_path)
-            img.thumbnail((300, 300))  # 表示用に画像サイズを縮小
-            img_tk = ImageTk.PhotoImage(img)
+            # 一度のデコードでサムネイル・平均輝度・ヒストグラムを求める（同じ画像は再計算しない）
+            analysis = load_analysis(file_path, (300, 300))
+            img_tk = ImageTk.PhotoImage(analysis.thumbnail)
             image_label.config(image=img_tk)
             image_label.image = img_tk
 
-            avg_brightness = calculate_average_brightness(file_path)
-            if avg_brightness != -1:
-                result_label.config(text=f"平均輝度: {avg_brightness:.2f}")
+            p5, p50, p95 = analysis.percentiles((5, 50, 95))
+            result_label.config(text=f"平均輝度: {analysis.mean:.2f}  (5%: {p5:.0f} / 中央値: {p50:.0f} / 95%: {p95:.0f})")
 
             global current_figure  # グローバル変数でヒストグラムを保存
-            current_figure = plot_histogram(file_path)
+            current_figure = plot_histogram(analysis.histogram)
             if current_figure:
                 for widget in histogram_frame.winfo_children():
                     widget.destroy()
@@ -97,28 +92,91 @@ def export_histogram():
         except Exception as e:
             messagebox.showerror("エラー", f"ヒストグラムの保存中にエラーが発生しました: {e}")
 
-# GUIアプリケーションのセットアップ
-root = tk.Tk()
-root.title("画像の平均輝度とヒストグラム")
+def batch_histograms():
+    """
+    フォルダ内の全フレームのヒストグラムと平均輝度を並列に計算し、時系列として保存します。
+    """
+    global batch_running
+    if batch_running:
+        messagebox.showwarning("警告", "一括処理を実行中です。")
+        return
+    folder_path = filedialog.askdirectory(title="画像フォルダを選択してください")
+    if not folder_path:
+        return
+    save_path = filedialog.asksaveasfilename(
+        title="ヒストグラムの時系列を保存",
+        defaultextension=".npy",
+        filetypes=[("Brightness Cube (memory-mapped)", "*.npy")]
+    )
+    if not save_path:
+        return
+    heatmap_path = None
+    if messagebox.askyesno("確認", "ヒートマップ画像も保存しますか？"):
+        heatmap_path = filedialog.asksaveasfilename(
+            title="ヒートマップを保存",
+            defaultextension=".png",
+            filetypes=[("PNGファイル", "*.png")]
+        )
+
+    batch_running = True
+    processed = [0]
+
+    def on_frame(image_file, reason):
+        processed[0] += 1
+        if processed[0] % 50 == 0:
+            root.after(0, batch_status.set, f"一括処理中: {processed[0]} フレーム")
+
+    def run():
+        global batch_running
+        try:
+            skipped = histogram_time_series(folder_path, save_path, workers=os.cpu_count() or 1, on_frame=on_frame)
+            if heatmap_path:
+                export_heatmap(save_path, heatmap_path)
+            message = f"一括処理が完了しました: {processed[0] - len(skipped)} フレーム"
+            if skipped:
+                message += f"（スキップ {len(skipped)} 件）"
+            root.after(0, batch_status.set, message)
+        except Exception as e:
+            root.after(0, batch_status.set, "一括処理に失敗しました")
+            root.after(0, messagebox.showerror, "エラー", f"一括処理中にエラーが発生しました: {e}")
+        finally:
+            batch_running = False
+
+    batch_status.set("一括処理中...")
+    threading.Thread(target=run, daemon=True).start()
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+
+    # GUIアプリケーションのセットアップ
+    root = tk.Tk()
+    root.title("画像の平均輝度とヒストグラム")
+
+    frame = tk.Frame(root, padx=10, pady=10)
+    frame.pack()
+
+    select_button = tk.Button(frame, text="画像を選択", command=select_image)
+    select_button.grid(row=0, column=0, pady=10)
 
-frame = tk.Frame(root, padx=10, pady=10)
-frame.pack()
+    image_label = tk.Label(frame, text="画像がここに表示されます", width=40, height=15, bg="gray")
+    image_label.grid(row=1, column=0, pady=10)
 
-select_button = tk.Button(frame, text="画像を選択", command=select_image)
-select_button.grid(row=0, column=0, pady=10)
+    result_label = tk.Label(frame, text="平均輝度: -", font=("Arial", 14))
+    result_label.grid(row=2, column=0, pady=10)
 
-image_label = tk.Label(frame, text="画像がここに表示されます", width=40, height=15, bg="gray")
-image_label.grid(row=1, column=0, pady=10)
+    export_button = tk.Button(frame, text="ヒストグラムをエクスポート", command=export_histogram)
+    export_button.grid(row=3, column=0, pady=10)
 
-result_label = tk.Label(frame, text="平均輝度: -", font=("Arial", 14))
-result_label.grid(row=2, column=0, pady=10)
+    batch_button = tk.Button(frame, text="フォルダを一括処理", command=batch_histograms)
+    batch_button.grid(row=4, column=0, pady=10)
 
-export_button = tk.Button(frame, text="ヒストグラムをエクスポート", command=export_histogram)
-export_button.grid(row=3, column=0, pady=10)
+    batch_status = tk.StringVar(value="")
+    tk.Label(frame, textvariable=batch_status).grid(row=5, column=0)
 
-histogram_frame = tk.Frame(root)
-histogram_frame.pack(pady=10)
+    histogram_frame = tk.Frame(root)
+    histogram_frame.pack(pady=10)
 
-current_figure = None  # グローバル変数でヒストグラムを保持
+    current_figure = None  # グローバル変数でヒストグラムを保持
+    batch_running = False
 
-root.mainloop()
+    root.mainloop()
@@ -0,0 +1,57 @@
+# ファイル名: image_preview.py
+"""
+GUI表示用の縮小画像（プレビュー）の作成。
+
+JPEG はデコーダーの縮小読み込み（draft モード）で必要な解像度だけをデコードし、
+それ以外の形式は整数倍の縮小 (Image.reduce) を先に行ってから仕上げの縮小をします。
+同じ画像を何度も表示しても速いよう、プレビューは LRU キャッシュに保持します。
+"""
+import os
+from functools import lru_cache
+
+from PIL import Image
+
+PREVIEW_CACHE_SIZE = 32
+
+
+def _reducible(image):
+    """
+    Image.reduce（と大きく縮小するときの thumbnail）が扱えるモードに変換する。
+
+    パレット (P) と2値 (1) は平均を取れないため RGB / L に、16ビット (I;16 など) は 32ビット整数の I にします。
+    """
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    if image.mode.startswith("I;16"):
+        return image.convert("I")
+    return image
+
+
+def make_preview(image, max_size):
+    """読み込み済みの画像から max_size に収まる縮小コピーを作る（元の画像は変更しない）"""
+    image = _reducible(image)
+    factor = max(1, min(image.width // max_size[0], image.height // max_size[1]))
+    preview = image.reduce(factor) if factor > 1 else image.copy()
+    preview.thumbnail(max_size)
+    return preview
+
+
+@lru_cache(maxsize=PREVIEW_CACHE_SIZE)
+def _load_preview(image_path, mtime_ns, file_size, max_size):
+    with Image.open(image_path) as img:
+        # JPEG は 1/2, 1/4, 1/8 の解像度で直接デコードされる（他の形式では何もしない）
+        img.draft(None, max_size)
+        img.load()
+        return make_preview(img, max_size)
+
+
+def load_preview(image_path, max_size):
+    """
+    画像ファイルを max_size に収まるプレビューとして読み込む。
+
+    キャッシュはファイルの更新日時とサイズで区別するため、上書きされた画像は読み直します。
+    """
+    stat = os.stat(image_path)
+    return _load_preview(os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, tuple(max_size))
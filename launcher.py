@@ -0,0 +1,99 @@
+# ファイル名: launcher.py
+"""
+すべてのツールを1つの実行環境から起動するランチャー。
+
+ランチャーの画面は tkinter だけを読み込み、ツールのボタンが押されたときに同じ実行ファイルを
+"--tool <モジュール名>" 付きで別プロセスとして起動します。ツールのモジュールとそれが使う
+numpy・cv2・pandas などはそのプロセスで初めて読み込まれます。
+
+    launcher.py                          ランチャーの画面を開く
+    launcher.py --tool <モジュール名>     ツールを直接開く
+    launcher.py --cli <サブコマンド> ...  cli.py のコマンドを実行する
+    launcher.py --measure-startup <モジュール名> <結果の .json>
+                                         ツールのモジュールの読み込み時間を測定して終了する（ビルド時の測定用）
+"""
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+# (モジュール名, ボタンの表示名)
+TOOLS = [
+    ("Brightness_trimming_app", "矩形の輝度抽出"),
+    ("batch_brightness_extractor", "輝度列の一括抽出"),
+    ("extract_cropped_images", "画像の切り抜き"),
+    ("excel_integration_tool", "Excel 面積積分"),
+    ("script_name", "Excelセル抽出"),
+    ("gui_brightness_histogram", "輝度ヒストグラム"),
+    ("timelapse_app", "タイムラプス撮影"),
+    ("timelapse_creator", "タイムラプス動画の作成"),
+    ("contour_detection_app", "輪郭検出"),
+]
+
+
+def self_command():
+    """このランチャーを起動するコマンド（PyInstaller でビルドした場合は実行ファイル自身）"""
+    if getattr(sys, "frozen", False):
+        return [sys.executable]
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+def run_tool(module_name):
+    """ツールのモジュールを __main__ として実行する（ツールの画面が閉じるまで戻らない）"""
+    import runpy
+
+    if module_name not in dict(TOOLS):
+        raise SystemExit(f"不明なツールです: {module_name}")
+    # ツールには "--tool" などのランチャーの引数を渡さない
+    sys.argv = sys.argv[:1]
+    runpy.run_module(module_name, run_name="__main__", alter_sys=True)
+
+
+def measure_startup(module_name, report_path):
+    """ツールのモジュールを読み込むまでの時間を測定し、結果を JSON に書き込む"""
+    import importlib
+
+    start = time.perf_counter()
+    importlib.import_module(module_name)
+    elapsed = time.perf_counter() - start
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"tool": module_name, "import_seconds": elapsed}, f)
+
+
+def open_launcher():
+    """ツールのボタンを並べたランチャーの画面を開く"""
+    import tkinter as tk
+
+    root = tk.Tk()
+    root.title("画像解析ツール")
+    status = tk.StringVar(value="開くツールを選択してください")
+
+    def launch(module_name, title):
+        subprocess.Popen(self_command() + ["--tool", module_name])
+        status.set(f"{title} を起動しました")
+
+    for module_name, title in TOOLS:
+        tk.Button(root, text=title, width=30, command=lambda m=module_name, t=title: launch(m, t)).pack(padx=20, pady=3)
+    tk.Label(root, textvariable=status).pack(pady=10)
+    root.mainloop()
+
+
+def main(argv):
+    if len(argv) >= 2 and argv[0] == "--tool":
+        run_tool(argv[1])
+    elif argv and argv[0] == "--cli":
+        import cli
+
+        return cli.main(argv[1:])
+    elif len(argv) >= 3 and argv[0] == "--measure-startup":
+        measure_startup(argv[1], argv[2])
+    else:
+        open_launcher()
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerでパッケージ化した場合のワーカープロセス用
+    sys.exit(main(sys.argv[1:]))
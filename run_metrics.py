@@ -0,0 +1,339 @@
+# ファイル名: run_metrics.py
+"""
+処理の段階ごとの時間と資源の記録。
+
+RunRecorder を with 文で使うと、その間に処理関数が報告した段階（読み込み・デコード、
+Excelへの書き込みなど）ごとに、経過時間・件数・読み書きしたバイト数を集計し、
+終了時に処理全体の時間とピークメモリとともに JSON の実行ログとして保存します。
+
+処理関数は current() で実行中のレコーダーを取得して報告します。レコーダーがない場合は
+何もしないレコーダーが返るため、GUIやコマンドラインから使わないときの負担はほとんどありません。
+
+段階は入れ子にでき、記録される時間は内側の段階の時間を除いたものです。そのため1つのスレッドで
+処理する場合、各段階の時間の合計はおおよそ処理全体の時間になります（保存用のスレッドなど複数の
+スレッドから記録した場合は、合計が処理全体の時間を超えることがあります）。
+"""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+RUN_LOG_VERSION = 1
+UPDATE_INTERVAL = 0.5
+PROFILE_TOP = 40
+
+_active = threading.local()
+
+
+def peak_rss_bytes():
+    """このプロセスと終了した子プロセスのうち最大のピークメモリ (RSS) をバイト単位で返す"""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_bytes()
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux は KB、macOS はバイト単位
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _windows_peak_rss_bytes():
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return 0
+    return counters.PeakWorkingSetSize
+
+
+def run_log_path(output_path):
+    """出力に対応する実行ログのパスを返す（出力がフォルダの場合はフォルダ内に置く）"""
+    if os.path.isdir(output_path):
+        return os.path.join(output_path, "run_log.json")
+    return os.path.splitext(output_path)[0] + ".runlog.json"
+
+
+def profile_path(output_path):
+    """出力に対応するプロファイル結果 (.prof) のパスを返す"""
+    if os.path.isdir(output_path):
+        return os.path.join(output_path, "run_profile.prof")
+    return os.path.splitext(output_path)[0] + ".prof"
+
+
+def tk_status_callback(root, set_status):
+    """
+    Tk のステータス表示を更新する on_update 用の関数を返す。
+
+    メインスレッドで処理している場合はその場で再描画し、ほかのスレッドからは root.after で渡します。
+
+    Args:
+        root: Tk のルートウィンドウ。
+        set_status (callable): 文字列を受け取ってステータス表示を書き換える関数。
+    """
+    main_thread = threading.main_thread()
+
+    def update(text):
+        if threading.current_thread() is main_thread:
+            set_status(text)
+            root.update_idletasks()
+        else:
+            root.after(0, set_status, text)
+
+    return update
+
+
+def _megabytes(value):
+    return f"{value / 1e6:.1f} MB"
+
+
+class StageStats:
+    """1つの段階の集計（時間は内側の段階を除いた秒数）"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.items = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def as_dict(self):
+        return {
+            "seconds": self.seconds,
+            "items": self.items,
+            "items_per_second": self.items / self.seconds if self.seconds > 0 else None,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class _NullRecorder:
+    """レコーダーがないときに current() が返す、何も記録しないレコーダー"""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def timed(self, name, iterable):
+        return iterable
+
+    def add(self, name, items=0, bytes_read=0, bytes_written=0):
+        pass
+
+
+NULL_RECORDER = _NullRecorder()
+
+
+def current():
+    """このスレッドで実行中のレコーダー（なければ何も記録しないレコーダー）を返す"""
+    return getattr(_active, "recorder", None) or NULL_RECORDER
+
+
+class RunRecorder:
+    """
+    1回の処理の段階ごとの時間と資源の記録。
+
+    Args:
+        tool (str): ツール名（実行ログに記録します）。
+        output_path (str): 処理の出力ファイル（またはフォルダ）のパス。実行ログとプロファイル結果はその隣に保存します。
+            None の場合はファイルに保存しません。
+        params (dict): 実行ログに記録するパラメータ（省略可能）。
+        on_update (callable): 処理中と終了時に状況の文字列を受け取る関数（GUIのステータス表示など）。
+        profile (bool): True の場合、処理を cProfile で計測し、結果を出力の隣に .prof と .profile.txt で保存します。
+            計測するのはレコーダーを開始したスレッドだけで、ワーカープロセスの処理は含みません。
+        update_interval (float): on_update を呼び出す最短の間隔（秒）。
+    """
+
+    def __init__(self, tool, output_path=None, params=None, on_update=None, profile=False, update_interval=UPDATE_INTERVAL):
+        self.tool = tool
+        self.output_path = output_path
+        self.params = params or {}
+        self.on_update = on_update
+        self.profile = profile
+        self.update_interval = update_interval
+        self.stages = {}
+        self.log = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiler = None
+        self._started = None
+        self._start_time = None
+        self._last_update = 0.0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc)
+        return False
+
+    def start(self):
+        """記録を開始し、このスレッドのレコーダーとして登録する"""
+        self._started = datetime.now()
+        self._start_time = time.perf_counter()
+        _active.recorder = self
+        if self.profile:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def finish(self, error=None):
+        """
+        記録を終了し、実行ログ（とプロファイル結果）を保存する。
+
+        Returns:
+            dict: 実行ログの内容。
+        """
+        if self._profiler is not None:
+            self._profiler.disable()
+        if getattr(_active, "recorder", None) is self:
+            _active.recorder = None
+        wall_seconds = time.perf_counter() - self._start_time
+        with self._lock:
+            stages = {name: stats.as_dict() for name, stats in self.stages.items()}
+        self.log = {
+            "version": RUN_LOG_VERSION,
+            "tool": self.tool,
+            "params": self.params,
+            "output": os.path.abspath(self.output_path) if self.output_path else None,
+            "started": self._started.isoformat(timespec="seconds"),
+            "wall_seconds": wall_seconds,
+            "status": "ok" if error is None else f"error: {error}",
+            "frames": self.frames,
+            "frames_per_second": self.frames / wall_seconds if wall_seconds > 0 else None,
+            "bytes_read": sum(stage["bytes_read"] for stage in stages.values()),
+            "bytes_written": sum(stage["bytes_written"] for stage in stages.values()),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": stages,
+            "profile": None,
+        }
+        if self.output_path:
+            # 出力先に書き込めなくても、処理そのものの結果（や例外）は妨げない
+            try:
+                if self._profiler is not None:
+                    self.log["profile"] = self._save_profile()
+                self._save_log()
+            except OSError:
+                pass
+        if self.on_update:
+            self.on_update(self.status_text(final=True))
+        return self.log
+
+    @property
+    def frames(self):
+        """処理したフレーム（シート）数。最も多くの件数を記録した段階の件数です。"""
+        with self._lock:
+            return max((stats.items for stats in self.stages.values()), default=0)
+
+    def _stats(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        return stats
+
+    @contextmanager
+    def stage(self, name):
+        """with 文の中の経過時間を段階 name の時間として記録する（内側の段階の時間は除く）"""
+        # 入れ子の段階は同じスレッドの中でだけ意味を持つため、スレッドごとに管理する
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            inner = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self._stats(name).seconds += elapsed - inner
+            self._maybe_update()
+
+    def timed(self, name, iterable):
+        """iterable の次の要素を待つ時間を段階 name の時間として記録し、要素ごとに件数を1増やす"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            self.add(name, items=1)
+            yield item
+
+    def add(self, name, items=0, bytes_read=0, bytes_written=0):
+        """段階 name の件数とバイト数を加算する（ほかのスレッドからも呼び出せます）"""
+        with self._lock:
+            stats = self._stats(name)
+            stats.items += items
+            stats.bytes_read += bytes_read
+            stats.bytes_written += bytes_written
+
+    def status_text(self, final=False):
+        """GUIのステータス表示用の1行の文字列"""
+        elapsed = time.perf_counter() - self._start_time
+        frames = self.frames
+        with self._lock:
+            bytes_read = sum(stats.bytes_read for stats in self.stages.values())
+            bytes_written = sum(stats.bytes_written for stats in self.stages.values())
+            slowest = max(self.stages.items(), key=lambda item: item[1].seconds, default=None)
+        parts = [
+            f"{'Done' if final else 'Running'}: {frames} frames in {elapsed:.1f}s",
+            f"{frames / elapsed if elapsed > 0 else 0:.1f} frames/s",
+            f"read {_megabytes(bytes_read)}",
+            f"written {_megabytes(bytes_written)}",
+            f"peak {_megabytes(peak_rss_bytes())}",
+        ]
+        if slowest and elapsed > 0:
+            name, stats = slowest
+            parts.append(f"slowest stage {name} {stats.seconds / elapsed:.0%}")
+        return " | ".join(parts)
+
+    def _maybe_update(self):
+        if self.on_update is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_update >= self.update_interval:
+            self._last_update = now
+            self.on_update(self.status_text())
+
+    def _save_log(self):
+        """実行ログを書き込む（書き込み途中で中断されても前回の内容が残るよう置き換えで保存）"""
+        path = run_log_path(self.output_path)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.log, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def _save_profile(self):
+        """プロファイル結果を .prof（pstats 形式）と累積時間順の .profile.txt に保存し、.prof のパスを返す"""
+        import io
+        import pstats
+
+        path = profile_path(self.output_path)
+        self._profiler.dump_stats(path)
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        with open(os.path.splitext(path)[0] + ".profile.txt", "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+        return path
@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import openpyxl
-import re
-from datetime import datetime
 import csv
 
+from cell_cache import CellCache
+from cell_extraction import RANGE_MODES, extract_cells, parse_cell_specs
+
 def select_file():
     """ファイル選択ダイアログを開く"""
     file_path = filedialog.askopenfilename(
@@ -17,36 +18,23 @@ def select_file():
 def extract_values():
     """複数セルの値を時系列順に並べて抽出"""
     file_path = entry_file_path.get()
-    cells = entry_cells.get().split(",")
     
     if not file_path:
         messagebox.showerror("エラー", "ファイルを選択してください")
         return
     
-    if not cells:
-        messagebox.showerror("エラー", "セル番号を入力してください")
+    try:
+        # セル番号（範囲を含む）は最初に一度だけ解析する
+        specs = parse_cell_specs(entry_cells.get())
+    except ValueError as e:
+        messagebox.showerror("エラー", str(e))
         return
     
     try:
-        # Excelファイルを開く（data_only=Trueで数式の結果を取得）
-        workbook = openpyxl.load_workbook(file_path, data_only=True)
-        
-        # シート名を時系列順に並べ替える
-        sheet_names = sorted(
-            workbook.sheetnames,
-            key=lambda name: datetime.strptime(re.match(r"(\d{14})", name).group(1), "%Y%m%d%H%M%S")
-        )
-        
-        # 結果を保存するリスト
-        result = [["シート名"] + cells]
-        
-        for sheet_name in sheet_names:
-            sheet = workbook[sheet_name]
-            row = [sheet_name]
-            for cell in cells:
-                value = sheet[cell.strip()].value
-                row.append(value if value is not None else "")
-            result.append(row)
+        # 読み取り専用で開き、各シートは指定セルの最も下の行までだけを読み込む
+        # キャッシュを使う場合は初回に全セルを保存し、2回目以降はブックを開かずにキャッシュから読む
+        cache = CellCache() if use_cache.get() else None
+        result = extract_cells(file_path, specs, RANGE_MODES[range_mode.get()], cache)
         
         # 結果をGUIに表示
         display_result(result)
@@ -125,41 +113,54 @@ def export_to_excel():
     except Exception as e:
         messagebox.showerror("エラー", f"Excelファイルの保存中にエラーが発生しました: {e}")
 
-# GUI構築
-root = tk.Tk()
-root.title("Excelセル抽出ツール（時系列対応）")
+if __name__ == "__main__":
+    # GUI構築
+    root = tk.Tk()
+    root.title("Excelセル抽出ツール（時系列対応）")
 
-# ファイルパス入力
-frame_file = tk.Frame(root)
-frame_file.pack(pady=10)
+    # ファイルパス入力
+    frame_file = tk.Frame(root)
+    frame_file.pack(pady=10)
 
-tk.Label(frame_file, text="Excelファイル:").pack(side=tk.LEFT)
-entry_file_path = tk.Entry(frame_file, width=50)
-entry_file_path.pack(side=tk.LEFT, padx=5)
-tk.Button(frame_file, text="参照", command=select_file).pack(side=tk.LEFT)
+    tk.Label(frame_file, text="Excelファイル:").pack(side=tk.LEFT)
+    entry_file_path = tk.Entry(frame_file, width=50)
+    entry_file_path.pack(side=tk.LEFT, padx=5)
+    tk.Button(frame_file, text="参照", command=select_file).pack(side=tk.LEFT)
 
-# セル番号入力
-frame_cells = tk.Frame(root)
-frame_cells.pack(pady=10)
+    # セル番号入力
+    frame_cells = tk.Frame(root)
+    frame_cells.pack(pady=10)
 
-tk.Label(frame_cells, text="セル番号 (カンマ区切り, 例: A1, B2, C3):").pack(side=tk.LEFT)
-entry_cells = tk.Entry(frame_cells, width=30)
-entry_cells.pack(side=tk.LEFT, padx=5)
+    tk.Label(frame_cells, text="セル番号 (カンマ区切り, 例: A1, B2, C3:D10):").pack(side=tk.LEFT)
+    entry_cells = tk.Entry(frame_cells, width=30)
+    entry_cells.pack(side=tk.LEFT, padx=5)
+    
+    # 範囲の扱い（値を展開するか、シートごとに集計するか）
+    frame_range = tk.Frame(root)
+    frame_range.pack(pady=5)
+    
+    tk.Label(frame_range, text="範囲の扱い:").pack(side=tk.LEFT)
+    range_mode = tk.StringVar(value="値を展開")
+    tk.OptionMenu(frame_range, range_mode, *RANGE_MODES).pack(side=tk.LEFT, padx=5)
+    
+    # 同じブックを繰り返し抽出する場合のキャッシュ
+    use_cache = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="キャッシュを使う（同じファイルの2回目以降の抽出を高速化）", variable=use_cache).pack()
 
-# 抽出ボタン
-extract_button = tk.Button(root, text="抽出", command=extract_values)
-extract_button.pack(pady=10)
+    # 抽出ボタン
+    extract_button = tk.Button(root, text="抽出", command=extract_values)
+    extract_button.pack(pady=10)
 
-# CSVエクスポートボタン
-export_button_csv = tk.Button(root, text="CSVにエクスポート", command=export_to_csv, state=tk.DISABLED)
-export_button_csv.pack(pady=5)
+    # CSVエクスポートボタン
+    export_button_csv = tk.Button(root, text="CSVにエクスポート", command=export_to_csv, state=tk.DISABLED)
+    export_button_csv.pack(pady=5)
 
-# Excelエクスポートボタン
-export_button_excel = tk.Button(root, text="Excelにエクスポート", command=export_to_excel, state=tk.DISABLED)
-export_button_excel.pack(pady=5)
+    # Excelエクスポートボタン
+    export_button_excel = tk.Button(root, text="Excelにエクスポート", command=export_to_excel, state=tk.DISABLED)
+    export_button_excel.pack(pady=5)
 
-# 結果表示テキスト
-result_text = tk.Text(root, width=80, height=20)
-result_text.pack(pady=10)
+    # 結果表示テキスト
+    result_text = tk.Text(root, width=80, height=20)
+    result_text.pack(pady=10)
 
-root.mainloop()
+    root.mainloop()
@@ -6,6 +6,9 @@ from datetime import datetime
 import tkinter as tk
 from tkinter import messagebox, filedialog
 from pathlib import Path
+from capture_analytics import CaptureAnalytics, parse_rois, parse_columns
+from capture_pipeline import FrameWriterPool, PeriodicSchedule
+from run_metrics import RunRecorder, tk_status_callback
 
 class TimelapseApp:
     def __init__(self, root):
@@ -19,6 +22,9 @@ class TimelapseApp:
         self.height = tk.IntVar(value=1944)
         self.save_directory = tk.StringVar(value=os.getcwd())
         self.image_format = tk.StringVar(value="BMP")
+        self.analytics_rois = tk.StringVar(value="")
+        self.analytics_columns = tk.StringVar(value="")
+        self.profile_capture = tk.BooleanVar(value=False)
         self.capturing = False
         self.capture_thread = None
 
@@ -32,18 +38,23 @@ class TimelapseApp:
             ("Image Width:", self.width),
             ("Image Height:", self.height),
             ("Save Directory:", self.save_directory),
-            ("Image Format (BMP/PNG/JPG):", self.image_format)
+            ("Image Format (BMP/PNG/JPG):", self.image_format),
+            ("Analytics ROIs (x,y,w,h; ...):", self.analytics_rois),
+            ("Analytics Columns (x1,x2,...):", self.analytics_columns)
         ]
         for i, (label, var) in enumerate(inputs):
             self.create_input(label, var, i)
 
         tk.Button(self.root, text="Select Folder", command=self.select_directory).grid(row=6, column=2)
-        tk.Button(self.root, text="Start Capture", command=self.start_capture).grid(row=7, column=0)
-        tk.Button(self.root, text="Stop Capture", command=self.stop_capture).grid(row=7, column=1)
-        tk.Button(self.root, text="Exit", command=self.cleanup).grid(row=8, column=0, columnspan=2)
+        tk.Button(self.root, text="Start Capture", command=self.start_capture).grid(row=9, column=0)
+        tk.Button(self.root, text="Stop Capture", command=self.stop_capture).grid(row=9, column=1)
+        tk.Button(self.root, text="Exit", command=self.cleanup).grid(row=10, column=0, columnspan=2)
+        tk.Checkbutton(self.root, text="Profile capture", variable=self.profile_capture).grid(row=9, column=2)
 
         self.status_label = tk.Label(self.root, text="Status: Ready")
-        self.status_label.grid(row=9, column=0, columnspan=3)
+        self.status_label.grid(row=11, column=0, columnspan=3)
+        # The capture thread reports here too; off the main thread updates go through root.after
+        self.set_status = tk_status_callback(self.root, lambda text: self.status_label.config(text=f"Status: {text}"))
 
     def create_input(self, label_text, variable, row):
         tk.Label(self.root, text=label_text).grid(row=row, column=0)
@@ -55,10 +66,14 @@ class TimelapseApp:
             self.save_directory.set(directory)
 
     def start_capture(self):
+        # After Stop the previous session still flushes its queued frames before releasing the camera
+        if self.capture_thread and self.capture_thread.is_alive():
+            messagebox.showwarning("Warning", "The previous capture is still finishing. Try again in a moment.")
+            return
         inputs = self.validate_inputs()
         if not inputs:
             return
-        capture_interval, waiting_time, calibration_time, width, height, image_format = inputs
+        capture_interval, waiting_time, calibration_time, width, height, image_format, rois, columns = inputs
         cap = self.init_camera()
         if not cap:
             return
@@ -66,16 +81,20 @@ class TimelapseApp:
         self.capturing = True
         self.capture_thread = threading.Thread(
             target=self.capture_images,
-            args=(cap, capture_interval, waiting_time, calibration_time, width, height, image_format),
+            args=(cap, capture_interval, waiting_time, calibration_time, width, height, image_format, rois, columns,
+                  self.profile_capture.get()),
             daemon=True
         )
         self.capture_thread.start()
 
     def stop_capture(self):
+        # Never join the capture thread here: it reports back through the Tk event loop,
+        # so blocking the main thread would deadlock. The thread reports its final statistics.
         self.capturing = False
         if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join()
-        self.update_status("Capture stopped.")
+            self.update_status("Stopping capture...")
+        else:
+            self.update_status("Capture stopped.")
 
     def init_camera(self):
         cap = cv2.VideoCapture(0)
@@ -84,50 +103,126 @@ class TimelapseApp:
             return None
         return cap
 
-    def capture_images(self, cap, interval, waiting_time, calibration_time, width, height, image_format):
+    def capture_images(self, cap, interval, waiting_time, calibration_time, width, height, image_format, rois=(), columns=(),
+                       profile=False):
         save_dir = Path(self.save_directory.get()) / datetime.now().strftime("%Y%m%d_%H%M%S")
-        save_dir.mkdir(parents=True, exist_ok=True)
 
-        self.update_status("Calibrating camera...")
-        start_time = time.time()
-        while time.time() - start_time < calibration_time:
-            ret, _ = cap.read()  # Discard initial frames to adjust settings
-            if not ret:
-                break
-
-        self.update_status("Waiting before capture...")
-        time.sleep(waiting_time)
+        # Per-stage timing of the capture loop and the writer threads; the run log (and the
+        # optional profile of this thread) is saved into the session folder
+        params = {"interval": interval, "width": width, "height": height, "image_format": image_format}
+        recorder = RunRecorder("capture", str(save_dir), params, profile=profile)
+        recorder.start()
 
+        analytics = None
+        writer = None
+        schedule = None
+        count = 0
+        error = None
         try:
-            count = 0
-            while self.capturing:
-                ret, frame = cap.read()
+            save_dir.mkdir(parents=True, exist_ok=True)
+
+            # Analyze frames while they are still in memory so nothing has to re-decode the saved files
+            if rois or columns:
+                try:
+                    analytics = CaptureAnalytics(save_dir, (width, height), rois, columns)
+                except ValueError as e:
+                    self.update_status(f"Analytics disabled: {e}")
+
+            self.update_status("Calibrating camera...")
+            with recorder.stage("calibration"):
+                start_time = time.time()
+                while time.time() - start_time < calibration_time:
+                    ret, _ = cap.read()  # Discard initial frames to adjust settings
+                    if not ret:
+                        break
+
+            self.update_status("Waiting before capture...")
+            with recorder.stage("wait"):
+                time.sleep(waiting_time)
+
+            # Capture runs on a fixed monotonic schedule; encoding and writing happen on a
+            # separate pool so they no longer stretch the capture period
+            writer = FrameWriterPool(
+                lambda frame, path: self.save_image(frame, path, image_format, recorder),
+                workers=min(4, os.cpu_count() or 1),
+                max_queue=8,
+            )
+            schedule = PeriodicSchedule(interval)
+            last_report = 0.0
+            while True:
+                with recorder.stage("idle"):
+                    if not schedule.wait(lambda: self.capturing):
+                        break
+                with recorder.stage("capture"):
+                    ret, frame = cap.read()
                 if not ret:
                     break
-                frame = cv2.resize(frame, (width, height))
-                filename = save_dir / f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{count}.{image_format.lower()}"
-                self.save_image(frame, str(filename), image_format)
+                schedule.mark_capture()
+                recorder.add("capture", items=1, bytes_read=frame.nbytes)
+                with recorder.stage("resize"):
+                    frame = cv2.resize(frame, (width, height))
+                now = datetime.now()
+                filename = save_dir / f"{now.strftime('%Y%m%d%H%M%S')}_{count}.{image_format.lower()}"
+                with recorder.stage("queue"):
+                    writer.submit(frame, str(filename))
+                if analytics:
+                    with recorder.stage("analytics"):
+                        analytics.process(frame, filename.stem, now.isoformat(timespec="seconds"))
                 count += 1
-                cv2.imshow("Preview", frame)
-                if cv2.waitKey(1) & 0xFF == 27:
-                    self.stop_capture()
+                if time.monotonic() - last_report >= 1.0:
+                    self.update_status(self.pipeline_status(count, interval, schedule, writer) + "\n" + recorder.status_text())
+                    last_report = time.monotonic()
+                with recorder.stage("preview"):
+                    cv2.imshow("Preview", frame)
+                    key = cv2.waitKey(1) & 0xFF
+                if key == 27:
+                    self.capturing = False
                     break
-                time.sleep(interval)
+        except Exception as e:
+            error = e
+            raise
         finally:
+            with recorder.stage("flush"):
+                if writer:
+                    writer.close()
+                if analytics:
+                    analytics.close()
             cap.release()
             cv2.destroyAllWindows()
+            self.capturing = False
+            recorder.finish(error)
+            if schedule:
+                summary = "Capture finished. " + self.pipeline_status(count, interval, schedule, writer)
+            else:
+                summary = f"Capture failed: {error}"
+            self.update_status(summary + "\n" + recorder.status_text(final=True))
+
+    def pipeline_status(self, count, interval, schedule, writer):
+        actual = schedule.actual_period
+        period = f"{actual:.3f}s" if actual is not None else "-"
+        status = (
+            f"{count} frames | period {period} (target {interval:.3f}s) | "
+            f"queue {writer.depth}/{writer.max_queue} | dropped {writer.dropped} | missed slots {schedule.missed}"
+        )
+        if writer.errors:
+            status += f" | write errors {writer.errors}: {writer.last_error}"
+        return status
 
-    def save_image(self, frame, path, image_format):
+    def save_image(self, frame, path, image_format, recorder):
         encode_param = []
         if image_format == "JPG":
             encode_param = [cv2.IMWRITE_JPEG_QUALITY, 95]
         elif image_format == "PNG":
             encode_param = [cv2.IMWRITE_PNG_COMPRESSION, 3]
 
-        success, buffer = cv2.imencode(f".{image_format.lower()}", frame, encode_param)
+        # Runs on the writer threads, so these stages overlap the capture loop in time
+        with recorder.stage("encode"):
+            success, buffer = cv2.imencode(f".{image_format.lower()}", frame, encode_param)
         if success:
-            with open(path, 'wb') as f:
-                f.write(buffer)
+            with recorder.stage("image_write"):
+                with open(path, 'wb') as f:
+                    f.write(buffer)
+            recorder.add("image_write", items=1, bytes_written=buffer.nbytes)
 
     def validate_inputs(self):
         try:
@@ -140,17 +235,26 @@ class TimelapseApp:
                 int(self.calibration_time.get()),
                 int(self.width.get()),
                 int(self.height.get()),
-                image_format
+                image_format,
+                parse_rois(self.analytics_rois.get()),
+                parse_columns(self.analytics_columns.get())
             )
         except ValueError as e:
             messagebox.showerror("Error", f"Invalid inputs: {e}")
             return None
 
     def update_status(self, message):
-        self.status_label.config(text=f"Status: {message}")
+        self.set_status(message)
 
     def cleanup(self):
         self.stop_capture()
+        self.wait_for_capture()
+
+    def wait_for_capture(self):
+        # Poll instead of joining so the capture thread can still deliver its status updates
+        if self.capture_thread and self.capture_thread.is_alive():
+            self.root.after(100, self.wait_for_capture)
+            return
         cv2.destroyAllWindows()
         self.root.quit()
 
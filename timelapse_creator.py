@@ -1,39 +1,8 @@
 import os
-import cv2
-import glob
-import numpy as np
 import tkinter as tk
 from tkinter import filedialog, messagebox
-
-def create_timelapse(image_folder, output_video_path, fps=30):
-    image_paths = glob.glob(os.path.join(image_folder, '*.bmp'))
-    image_paths.sort()
-
-    if not image_paths:
-        messagebox.showerror("Error", "No BMP images found in the directory.")
-        return
-
-    first_image_path = image_paths[0]
-    first_image = cv2.imdecode(np.fromfile(first_image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-    
-    if first_image is None:
-        messagebox.showerror("Error", f"Failed to read the image file: {first_image_path}")
-        return
-    
-    height, width, layers = first_image.shape
-    size = (width, height)
-
-    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'DIVX'), fps, size)
-
-    for image_path in image_paths:
-        img = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
-        if img is None:
-            messagebox.showerror("Error", f"Failed to read the image file: {image_path}")
-            return
-        out.write(img)
-    
-    out.release()
-    messagebox.showinfo("Success", f"Timelapse video saved as {output_video_path}")
+from timelapse_video import create_timelapse
+from run_metrics import RunRecorder, tk_status_callback
 
 def select_image_folder():
     folder_selected = filedialog.askdirectory()
@@ -60,6 +29,11 @@ def create_timelapse_from_gui():
     except ValueError:
         messagebox.showerror("Error", "FPS must be an integer.")
         return
+    try:
+        workers = int(workers_entry.get())
+    except ValueError:
+        messagebox.showerror("Error", "Decode threads must be an integer.")
+        return
 
     if not os.path.exists(image_folder):
         messagebox.showerror("Error", "Image folder does not exist.")
@@ -69,28 +43,48 @@ def create_timelapse_from_gui():
         messagebox.showerror("Error", "Output video path cannot be empty.")
         return
 
-    create_timelapse(image_folder, output_video_path, fps)
+    params = {"folder": image_folder, "fps": fps, "workers": workers}
+    try:
+        with RunRecorder("timelapse", output_video_path, params, on_update=tk_status_callback(root, run_status.set), profile=profile_var.get()):
+            create_timelapse(image_folder, output_video_path, fps, workers)
+    except ValueError as e:
+        messagebox.showerror("Error", str(e))
+        return
+    messagebox.showinfo("Success", f"Timelapse video saved as {output_video_path}")
+
+if __name__ == "__main__":
+    # GUI Setup
+    root = tk.Tk()
+    root.title("Timelapse Creator")
+
+    # Input Fields
+    tk.Label(root, text="Image Folder:").grid(row=0, column=0, padx=10, pady=5, sticky="e")
+    image_folder_entry = tk.Entry(root, width=50)
+    image_folder_entry.grid(row=0, column=1, padx=10, pady=5)
+    tk.Button(root, text="Browse", command=select_image_folder).grid(row=0, column=2, padx=10, pady=5)
+
+    tk.Label(root, text="Output File:").grid(row=1, column=0, padx=10, pady=5, sticky="e")
+    output_file_entry = tk.Entry(root, width=50)
+    output_file_entry.grid(row=1, column=1, padx=10, pady=5)
+    tk.Button(root, text="Browse", command=select_output_file).grid(row=1, column=2, padx=10, pady=5)
 
-# GUI Setup
-root = tk.Tk()
-root.title("Timelapse Creator")
+    tk.Label(root, text="FPS:").grid(row=2, column=0, padx=10, pady=5, sticky="e")
+    fps_entry = tk.Entry(root, width=10)
+    fps_entry.insert(0, "30")
+    fps_entry.grid(row=2, column=1, padx=10, pady=5, sticky="w")
 
-# Input Fields
-tk.Label(root, text="Image Folder:").grid(row=0, column=0, padx=10, pady=5, sticky="e")
-image_folder_entry = tk.Entry(root, width=50)
-image_folder_entry.grid(row=0, column=1, padx=10, pady=5)
-tk.Button(root, text="Browse", command=select_image_folder).grid(row=0, column=2, padx=10, pady=5)
+    tk.Label(root, text="Decode Threads:").grid(row=3, column=0, padx=10, pady=5, sticky="e")
+    workers_entry = tk.Entry(root, width=10)
+    workers_entry.insert(0, str(min(8, os.cpu_count() or 1)))
+    workers_entry.grid(row=3, column=1, padx=10, pady=5, sticky="w")
 
-tk.Label(root, text="Output File:").grid(row=1, column=0, padx=10, pady=5, sticky="e")
-output_file_entry = tk.Entry(root, width=50)
-output_file_entry.grid(row=1, column=1, padx=10, pady=5)
-tk.Button(root, text="Browse", command=select_output_file).grid(row=1, column=2, padx=10, pady=5)
+    profile_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(root, text="Profile run (save .prof next to output)", variable=profile_var).grid(row=4, column=1, padx=10, sticky="w")
 
-tk.Label(root, text="FPS:").grid(row=2, column=0, padx=10, pady=5, sticky="e")
-fps_entry = tk.Entry(root, width=10)
-fps_entry.insert(0, "30")
-fps_entry.grid(row=2, column=1, padx=10, pady=5, sticky="w")
+    tk.Button(root, text="Create Timelapse", command=create_timelapse_from_gui).grid(row=5, column=1, pady=20)
 
-tk.Button(root, text="Create Timelapse", command=create_timelapse_from_gui).grid(row=3, column=1, pady=20)
+    # Per-stage timing and memory of the last run
+    run_status = tk.StringVar(value="")
+    tk.Label(root, textvariable=run_status).grid(row=6, column=0, columnspan=3, padx=10, pady=5)
 
-root.mainloop()
+    root.mainloop()
@@ -0,0 +1,103 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import run_metrics
+
+IMAGE_EXTENSIONS = ('.bmp', '.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+def frame_sort_key(image_path):
+    """Order frames by the capture time and counter in TimelapseApp file names (%Y%m%d%H%M%S_count)."""
+    name = os.path.basename(image_path)
+    match = re.match(r"(\d{14})_(\d+)", name)
+    if match:
+        return (0, match.group(1), int(match.group(2)), name)
+    return (1, "", 0, name)
+
+def list_frames(image_folder):
+    image_paths = [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    return sorted(image_paths, key=frame_sort_key)
+
+def read_frame(image_path):
+    return cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def iter_frames(image_paths, workers=1, prefetch=16):
+    """
+    Yield (path, image) in order. With several workers, frames are read and decoded ahead
+    on a thread pool into a bounded reorder buffer of at most `prefetch` frames, so the
+    decoder and the video writer run at the same time.
+    """
+    if workers <= 1:
+        for image_path in image_paths:
+            yield image_path, read_frame(image_path)
+        return
+
+    paths = iter(image_paths)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        buffer = deque()
+        for image_path in paths:
+            buffer.append((image_path, executor.submit(read_frame, image_path)))
+            if len(buffer) >= prefetch:
+                break
+        while buffer:
+            image_path, future = buffer.popleft()
+            next_path = next(paths, None)
+            if next_path is not None:
+                buffer.append((next_path, executor.submit(read_frame, next_path)))
+            yield image_path, future.result()
+
+def create_timelapse(image_folder, output_video_path, fps=30, workers=None, prefetch=None):
+    """
+    Encode the frames of a folder, in capture order, into a DIVX video.
+
+    Raises:
+        ValueError: If the folder has no images, a frame cannot be decoded, or a frame's size
+            differs from the first frame (VideoWriter would silently drop it).
+
+    Returns:
+        int: Number of frames written.
+    """
+    image_paths = list_frames(image_folder)
+
+    if not image_paths:
+        raise ValueError("No images found in the directory.")
+
+    first_image_path = image_paths[0]
+    first_image = read_frame(first_image_path)
+
+    if first_image is None:
+        raise ValueError(f"Failed to read the image file: {first_image_path}")
+
+    height, width, layers = first_image.shape
+    size = (width, height)
+
+    workers = workers or min(8, os.cpu_count() or 1)
+    prefetch = prefetch or workers * 4
+
+    out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'DIVX'), fps, size)
+
+    metrics = run_metrics.current()
+    count = 0
+    try:
+        for image_path, img in metrics.timed("read_decode", iter_frames(image_paths, workers, prefetch)):
+            metrics.add("read_decode", bytes_read=os.path.getsize(image_path))
+            if img is None:
+                raise ValueError(f"Failed to read the image file: {image_path}")
+            if img.shape[:2] != (height, width):
+                raise ValueError(
+                    f"Frame size {img.shape[1]}x{img.shape[0]} of {image_path} differs from "
+                    f"the first frame ({width}x{height})."
+                )
+            with metrics.stage("video_write"):
+                out.write(img)
+            count += 1
+    finally:
+        with metrics.stage("video_write"):
+            out.release()
+    if os.path.exists(output_video_path):
+        metrics.add("video_write", bytes_written=os.path.getsize(output_video_path))
+    return count
@@ -0,0 +1,101 @@
+import tkinter as tk
+from tkinter import ttk
+
+import numpy as np
+
+
+class VirtualTable(tk.Frame):
+    """
+    Sortable table for column arrays with many rows.
+
+    Only the rows that fit in the visible area exist as Treeview items; scrolling moves a
+    window over the data and rewrites those few items, so showing 100k rows costs the
+    same as showing ten. Clicking a heading sorts by that column (again to reverse).
+
+    Args:
+        master: Parent widget.
+        columns (list): (key, heading, format) tuples; format is a str.format spec.
+        height (int): Number of visible rows.
+    """
+
+    def __init__(self, master, columns, height=10, **kwargs):
+        super().__init__(master, **kwargs)
+        self.columns = columns
+        self.height = height
+        self.data = {}
+        self.order = np.zeros(0, np.intp)
+        self.offset = 0
+        self.sort_key = None
+        self.sort_descending = False
+
+        keys = [key for key, _, _ in columns]
+        self.tree = ttk.Treeview(self, columns=keys, show="headings", height=height, selectmode="browse")
+        for key, heading, _ in columns:
+            self.tree.heading(key, text=heading, command=lambda k=key: self.sort_by(k))
+            self.tree.column(key, width=90, anchor="e")
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.columnconfigure(0, weight=1)
+
+        self.items = [self.tree.insert("", tk.END, values=()) for _ in range(height)]
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self.on_wheel)
+        self.tree.bind("<Up>", lambda event: self.scroll_to(self.offset - 1) or "break")
+        self.tree.bind("<Down>", lambda event: self.scroll_to(self.offset + 1) or "break")
+        self.tree.bind("<Prior>", lambda event: self.scroll_to(self.offset - self.height) or "break")
+        self.tree.bind("<Next>", lambda event: self.scroll_to(self.offset + self.height) or "break")
+
+    def __len__(self):
+        return len(self.order)
+
+    def set_data(self, data):
+        """Show a dict of equally long arrays keyed like the columns."""
+        self.data = data
+        count = len(next(iter(data.values()))) if data else 0
+        self.order = np.arange(count)
+        if self.sort_key is not None:
+            self._apply_sort()
+        self.scroll_to(0)
+
+    def sort_by(self, key):
+        self.sort_descending = not self.sort_descending if self.sort_key == key else False
+        self.sort_key = key
+        self._apply_sort()
+        self.scroll_to(0)
+
+    def _apply_sort(self):
+        if self.sort_key not in self.data:
+            return
+        self.order = np.argsort(self.data[self.sort_key], kind="stable")
+        if self.sort_descending:
+            self.order = self.order[::-1]
+        for key, heading, _ in self.columns:
+            arrow = (" ▼" if self.sort_descending else " ▲") if key == self.sort_key else ""
+            self.tree.heading(key, text=heading + arrow)
+
+    def scroll_to(self, offset):
+        self.offset = int(max(0, min(offset, len(self) - self.height)))
+        rows = self.order[self.offset:self.offset + self.height]
+        for item, row in zip(self.items, rows):
+            self.tree.item(item, values=[fmt.format(self.data[key][row]) for key, _, fmt in self.columns])
+        for item in self.items[len(rows):]:
+            self.tree.item(item, values=())
+        if len(self):
+            self.scrollbar.set(self.offset / len(self), (self.offset + len(rows)) / len(self))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(float(amount) * len(self))
+        elif action == "scroll":
+            step = self.height if unit == "pages" else 1
+            self.scroll_to(self.offset + int(amount) * step)
+
+    def on_wheel(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"